@@ -0,0 +1,38 @@
+"""Add mail sync cursors
+
+Revision ID: 4d9a6c2e8f10
+Revises: b83f0d6e51a7
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '4d9a6c2e8f10'
+down_revision: Union[str, Sequence[str], None] = 'b83f0d6e51a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mail_sync_cursors',
+    sa.Column('mail_sync_cursor_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('user_mail_account_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('cursor_txt', sa.Text(), nullable=False),
+    sa.Column('synced_at_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at_utc', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('modified_at_utc', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_mail_account_id'], ['user_mail_accounts.user_mail_account_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('mail_sync_cursor_id'),
+    sa.UniqueConstraint('user_mail_account_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('mail_sync_cursors')
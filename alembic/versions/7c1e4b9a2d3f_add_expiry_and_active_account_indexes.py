@@ -0,0 +1,53 @@
+"""Add expiry and active account indexes
+
+Revision ID: 7c1e4b9a2d3f
+Revises: 2f222905f433
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4b9a2d3f'
+down_revision: Union[str, Sequence[str], None] = '2f222905f433'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built CONCURRENTLY so large tables stay writable; this cannot run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_oauth_tokens_expires_at_utc',
+            'oauth_tokens',
+            ['expires_at_utc', 'oauth_token_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_user_mail_accounts_active_provider',
+            'user_mail_accounts',
+            ['provider_cd', 'user_mail_account_id'],
+            unique=False,
+            postgresql_where=sa.text('is_active_flg'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_mail_accounts_active_provider',
+            table_name='user_mail_accounts',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_oauth_tokens_expires_at_utc',
+            table_name='oauth_tokens',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,42 @@
+"""Add auth events
+
+Revision ID: 9e3b7d5a1c42
+Revises: 4d9a6c2e8f10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3b7d5a1c42'
+down_revision: Union[str, Sequence[str], None] = '4d9a6c2e8f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Partitioned by month; the monthly partitions are created by the app (see
+    # `AuthEventRepository.ensure_partitions`), the default one catches anything outside them.
+    op.create_table('auth_events',
+    sa.Column('auth_event_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('occurred_at_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('event_type_txt', sa.String(length=50), nullable=False),
+    sa.Column('email_address_txt', sa.String(length=255), nullable=True),
+    sa.Column('provider_cd', sa.Integer(), nullable=True),
+    sa.Column('detail_txt', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('auth_event_id', 'occurred_at_utc'),
+    postgresql_partition_by='RANGE (occurred_at_utc)'
+    )
+    op.create_index('ix_auth_events_email_occurred', 'auth_events', ['email_address_txt', 'occurred_at_utc'], unique=False)
+    op.execute('CREATE TABLE auth_events_default PARTITION OF auth_events DEFAULT')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_auth_events_email_occurred', table_name='auth_events')
+    op.drop_table('auth_events')
@@ -0,0 +1,43 @@
+"""Widen token columns for encryption
+
+Revision ID: b83f0d6e51a7
+Revises: 7c1e4b9a2d3f
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83f0d6e51a7'
+down_revision: Union[str, Sequence[str], None] = '7c1e4b9a2d3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Fernet ciphertext is roughly 4/3 of the plaintext plus overhead, which can exceed
+    # 4096 characters for long Microsoft access tokens.
+    op.alter_column('oauth_tokens', 'access_token_txt',
+               existing_type=sa.String(length=4096),
+               type_=sa.Text(),
+               existing_nullable=False)
+    op.alter_column('oauth_tokens', 'refresh_token_txt',
+               existing_type=sa.String(length=4096),
+               type_=sa.Text(),
+               existing_nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('oauth_tokens', 'refresh_token_txt',
+               existing_type=sa.Text(),
+               type_=sa.String(length=4096),
+               existing_nullable=True)
+    op.alter_column('oauth_tokens', 'access_token_txt',
+               existing_type=sa.Text(),
+               type_=sa.String(length=4096),
+               existing_nullable=False)
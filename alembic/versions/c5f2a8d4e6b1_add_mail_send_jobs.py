@@ -0,0 +1,45 @@
+"""Add mail send jobs
+
+Revision ID: c5f2a8d4e6b1
+Revises: 9e3b7d5a1c42
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f2a8d4e6b1'
+down_revision: Union[str, Sequence[str], None] = '9e3b7d5a1c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mail_send_jobs',
+    sa.Column('mail_send_job_id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('user_mail_account_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('raw_message_txt', sa.Text(), nullable=True),
+    sa.Column('status_txt', sa.String(length=20), nullable=False),
+    sa.Column('attempt_cnt', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_error_txt', sa.Text(), nullable=True),
+    sa.Column('sent_at_utc', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at_utc', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('modified_at_utc', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['user_mail_account_id'], ['user_mail_accounts.user_mail_account_id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('mail_send_job_id')
+    )
+    op.create_index('ix_mail_send_jobs_due', 'mail_send_jobs', ['next_attempt_at_utc'], unique=False, postgresql_where=sa.text("status_txt IN ('queued', 'sending')"))
+    op.create_index('ix_mail_send_jobs_account_unfinished', 'mail_send_jobs', ['user_mail_account_id', 'mail_send_job_id'], unique=False, postgresql_where=sa.text("status_txt IN ('queued', 'sending')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_mail_send_jobs_account_unfinished', table_name='mail_send_jobs', postgresql_where=sa.text("status_txt IN ('queued', 'sending')"))
+    op.drop_index('ix_mail_send_jobs_due', table_name='mail_send_jobs', postgresql_where=sa.text("status_txt IN ('queued', 'sending')"))
+    op.drop_table('mail_send_jobs')
@@ -0,0 +1,31 @@
+"""Add token refresh failure columns
+
+Revision ID: e1a4c7b9d2f3
+Revises: c5f2a8d4e6b1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a4c7b9d2f3'
+down_revision: Union[str, Sequence[str], None] = 'c5f2a8d4e6b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('oauth_tokens', sa.Column('refresh_failure_cnt', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.add_column('oauth_tokens', sa.Column('next_refresh_at_utc', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('oauth_tokens', sa.Column('refresh_revoked_flg', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('oauth_tokens', 'refresh_revoked_flg')
+    op.drop_column('oauth_tokens', 'next_refresh_at_utc')
+    op.drop_column('oauth_tokens', 'refresh_failure_cnt')
@@ -0,0 +1,33 @@
+"""Add OAuth state nonces
+
+Revision ID: f2b5d8e1a9c4
+Revises: e1a4c7b9d2f3
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b5d8e1a9c4'
+down_revision: Union[str, Sequence[str], None] = 'e1a4c7b9d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('oauth_state_nonces',
+    sa.Column('nonce_txt', sa.String(length=64), nullable=False),
+    sa.Column('expires_at_utc', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('nonce_txt')
+    )
+    op.create_index('ix_oauth_state_nonces_expires_at_utc', 'oauth_state_nonces', ['expires_at_utc'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_oauth_state_nonces_expires_at_utc', table_name='oauth_state_nonces')
+    op.drop_table('oauth_state_nonces')
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.core.security import encryption_helper
+from api.repositories.oauth_token import OAuthTokenRepository
+
+logger = logging.getLogger(__name__)
+
+
+def _load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"after": None, "scanned": 0, "rewritten": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+# Writes the checkpoint atomically so a crash never leaves a half-written file.
+def _save_checkpoint(path: str, checkpoint: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+# Moves every stored token to the newest encryption key (and encrypts legacy plaintext rows).
+# Rows are processed `batch_size` at a time in primary key order, with crypto on a worker thread.
+# After each batch the last processed id is saved to `checkpoint_path`, so an interrupted run
+# resumes where it stopped; the checkpoint is removed once the whole table has been processed.
+# Returns the checkpoint of the finished run.
+async def reencrypt_tokens(
+    session_factory: async_sessionmaker[AsyncSession],
+    batch_size: int,
+    checkpoint_path: str,
+) -> dict:
+    checkpoint = _load_checkpoint(checkpoint_path)
+    after = uuid.UUID(checkpoint["after"]) if checkpoint["after"] else None
+    if after is not None:
+        logger.info("Resuming re-encryption after %s", after)
+
+    async with session_factory() as session:
+        repo = OAuthTokenRepository(session)
+        async for rows in repo.iter_encrypted(batch_size, after):
+            ids = [row[0] for row in rows]
+            access_tokens = [row[1] for row in rows]
+            refresh_tokens = [row[2] for row in rows]
+            new_access = await encryption_helper.rotate_many(access_tokens)
+            new_refresh = await encryption_helper.rotate_many(refresh_tokens)
+
+            swaps = [
+                {
+                    "b_id": token_id,
+                    "b_old_access": old_access,
+                    "b_new_access": rotated_access or old_access,
+                    "b_old_refresh": old_refresh,
+                    "b_new_refresh": rotated_refresh or old_refresh,
+                }
+                for token_id, old_access, rotated_access, old_refresh, rotated_refresh in zip(
+                    ids, access_tokens, new_access, refresh_tokens, new_refresh
+                )
+                if rotated_access is not None or rotated_refresh is not None
+            ]
+            await repo.bulk_swap_encrypted(swaps)
+
+            checkpoint["after"] = str(ids[-1])
+            checkpoint["scanned"] += len(rows)
+            checkpoint["rewritten"] += len(swaps)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            logger.info(
+                "Re-encrypted %d of %d tokens scanned so far",
+                checkpoint["rewritten"],
+                checkpoint["scanned"],
+            )
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return checkpoint
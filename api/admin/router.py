@@ -0,0 +1,143 @@
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.admin.schemas import (
+    AuditStats,
+    EndpointHealth,
+    ImportSummary,
+    MailSendQueueStats,
+    ProfileSummary,
+    ProviderList,
+    RateLimitStats,
+    WarmupReport,
+)
+from api.admin.transfer import export_accounts_ndjson, import_accounts_ndjson
+from api.auth.registry import provider_registry
+from api.core.audit import audit_log
+from api.core.config import settings
+from api.core.http import http_clients
+from api.core.profiler import profile_store
+from api.core.ratelimit import rate_limiter
+from api.core.resilience import resilience
+from api.core.database import get_session_factory
+from api.core.dependencies import require_api_key
+from api.repositories.mail_send_job import MailSendJobRepository
+from api.warmup import warm_up
+
+# Admin router for operational endpoints such as bulk account export/import.
+# Every route requires the internal API key.
+router = APIRouter(
+    prefix="/admin", tags=["Admin"], dependencies=[Depends(require_api_key)]
+)
+
+
+# Streams all mail accounts and their tokens as NDJSON (one account per line).
+@router.get("/accounts/export")
+async def export_accounts(
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+) -> StreamingResponse:
+    return StreamingResponse(
+        export_accounts_ndjson(session_factory, settings.TRANSFER_BATCH_SIZE),
+        media_type="application/x-ndjson",
+    )
+
+
+# Imports mail accounts from a streamed NDJSON request body, upserting them in batches.
+# The body is consumed chunk by chunk, so only one batch is held in memory; the response lists
+# per-batch throughput. An invalid line stops the import after the batches already applied.
+@router.post("/accounts/import")
+async def import_accounts(
+    request: Request,
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+) -> ImportSummary:
+    batches = []
+    started = time.perf_counter()
+    try:
+        async for report in import_accounts_ndjson(
+            session_factory, request.stream(), settings.TRANSFER_BATCH_SIZE
+        ):
+            batches.append(report)
+    except ValidationError as e:
+        imported = batches[-1].total_rows if batches else 0
+        raise HTTPException(
+            status_code=422,
+            detail=f"Invalid account record after {imported} imported rows: {e}",
+        )
+
+    seconds = time.perf_counter() - started
+    total_rows = batches[-1].total_rows if batches else 0
+    return ImportSummary(
+        total_rows=total_rows,
+        seconds=round(seconds, 6),
+        rows_per_second=round(total_rows / seconds, 1) if seconds else 0.0,
+        batches=batches,
+    )
+
+
+# Rebuilds the provider registry from configuration (re-reading `OIDC_PROVIDERS_FILE`),
+# so providers and tenants can be added or changed without a redeploy.
+@router.post("/providers/reload")
+async def reload_providers() -> ProviderList:
+    names = await provider_registry.load()
+    http_clients.open(names)
+    return ProviderList(providers=names)
+
+
+# Opens the database and provider connections ahead of traffic (see `api.warmup`), e.g. from a
+# deploy hook or scheduler, so the next requests served by this instance skip the setup.
+@router.post("/warmup")
+async def warmup() -> WarmupReport:
+    return WarmupReport(**await warm_up())
+
+
+# Reports the audit log queue: depth and how many events were written, dropped or failed.
+@router.get("/audit")
+async def audit_stats() -> AuditStats:
+    return AuditStats(
+        queued=audit_log.depth,
+        recorded=audit_log.recorded,
+        dropped=audit_log.dropped,
+        written=audit_log.written,
+        failed=audit_log.failed,
+    )
+
+
+# Counts the jobs of the outbound mail send queue by status; `dead` are the dead letters.
+@router.get("/mail-send-queue")
+async def mail_send_queue_stats(
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+) -> MailSendQueueStats:
+    async with session_factory() as session:
+        return MailSendQueueStats(**await MailSendJobRepository(session).count_by_status())
+
+
+# Reports each provider's rate limit: current (adaptive) rate, queued callers and wait times.
+@router.get("/rate-limits")
+async def rate_limits() -> list[RateLimitStats]:
+    return [RateLimitStats(**stats) for stats in rate_limiter.stats()]
+
+
+# Reports each provider endpoint's circuit breaker state, retries, hedges and p95 latency.
+@router.get("/circuit-breakers")
+async def circuit_breakers() -> list[EndpointHealth]:
+    return [EndpointHealth(**stats) for stats in resilience.stats()]
+
+
+# Lists the slow-request profiles kept by the profiler (`PROFILER_ENABLED`), newest first.
+@router.get("/profiles")
+async def list_profiles() -> list[ProfileSummary]:
+    return [ProfileSummary(**profile.summary()) for profile in profile_store.list()]
+
+
+# Returns one profile as folded stacks ("frame;frame;frame count" lines), which flamegraph.pl,
+# speedscope and similar tools render as a flame graph.
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int) -> str:
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.folded()
@@ -0,0 +1,98 @@
+import datetime
+
+from pydantic import BaseModel, EmailStr
+
+
+# One line of the NDJSON account export/import format.
+class AccountRecord(BaseModel):
+    email: EmailStr
+    provider_cd: int
+    is_active: bool = True
+    access_token: str
+    refresh_token: str | None = None
+    expires_at_utc: datetime.datetime
+
+
+# Progress line emitted after each imported batch.
+class ImportBatchReport(BaseModel):
+    batch: int
+    rows: int
+    total_rows: int
+    seconds: float
+    rows_per_second: float
+
+
+# Result of an import: overall throughput plus one report per batch.
+class ImportSummary(BaseModel):
+    total_rows: int
+    seconds: float
+    rows_per_second: float
+    batches: list[ImportBatchReport]
+
+
+# Providers available after a registry reload.
+class ProviderList(BaseModel):
+    providers: list[str]
+
+
+# Current state and counters of one provider rate limit bucket.
+class RateLimitStats(BaseModel):
+    name: str
+    rate: float
+    max_rate: float
+    queue_depth: int
+    calls: int
+    queued: int
+    throttled: int
+    avg_wait_seconds: float
+    max_wait_seconds: float
+
+
+# Circuit breaker state and retry/hedging counters of one provider endpoint.
+class EndpointHealth(BaseModel):
+    provider: str
+    endpoint: str
+    state: str
+    consecutive_failures: int
+    calls: int
+    failures: int
+    retries: int
+    hedges: int
+    opened: int
+    short_circuited: int
+    p95_seconds: float | None
+
+
+# A slow request whose stack samples were kept by the profiler.
+class ProfileSummary(BaseModel):
+    profile_id: int
+    method: str
+    path: str
+    started_at: datetime.datetime
+    duration_seconds: float
+    samples: int
+
+
+# Outcome of a warm-up: seconds taken per target ("database", "provider:<name>") and the
+# targets that failed.
+class WarmupReport(BaseModel):
+    seconds: dict[str, float]
+    failed: list[str]
+
+
+# Audit log queue state of this process: events waiting to be written and event outcomes
+# since startup.
+class AuditStats(BaseModel):
+    queued: int
+    recorded: int
+    dropped: int
+    written: int
+    failed: int
+
+
+# Jobs in the outbound mail send queue by status (`MailSendStatus` values).
+class MailSendQueueStats(BaseModel):
+    queued: int = 0
+    sending: int = 0
+    sent: int = 0
+    dead: int = 0
@@ -0,0 +1,110 @@
+import datetime
+import logging
+import time
+from typing import AsyncIterable, AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.admin.schemas import AccountRecord, ImportBatchReport
+from api.repositories.user_mail_account import UserMailAccountRepository
+
+logger = logging.getLogger(__name__)
+
+
+# Streams every account and its token as NDJSON, one encoded line per account.
+# Rows are fetched from a server-side cursor `batch_size` at a time and encoded as they arrive,
+# so memory use does not depend on the number of accounts.
+async def export_accounts_ndjson(
+    session_factory: async_sessionmaker[AsyncSession], batch_size: int
+) -> AsyncIterator[bytes]:
+    async with session_factory() as session:
+        repo = UserMailAccountRepository(session)
+        async for rows in repo.stream_export_rows(batch_size):
+            yield b"".join(
+                AccountRecord(
+                    email=row["email_address_txt"],
+                    provider_cd=row["provider_cd"],
+                    is_active=row["is_active_flg"],
+                    access_token=row["access_token_txt"],
+                    refresh_token=row["refresh_token_txt"],
+                    expires_at_utc=row["expires_at_utc"],
+                ).model_dump_json().encode()
+                + b"\n"
+                for row in rows
+            )
+
+
+# Stored timestamps are naive UTC; normalise aware input to match.
+def _to_naive_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc)
+    return value.replace(tzinfo=None)
+
+
+# Splits a stream of byte chunks into complete lines, holding back only a partial last line.
+async def _iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+# Reads NDJSON account records from a stream of byte chunks and upserts them in batches of
+# `batch_size`, yielding a throughput report after each batch. Only one batch is held in memory.
+async def import_accounts_ndjson(
+    session_factory: async_sessionmaker[AsyncSession],
+    chunks: AsyncIterable[bytes],
+    batch_size: int,
+) -> AsyncIterator[ImportBatchReport]:
+    batch_number = 0
+    total_rows = 0
+
+    async def flush(batch: list[dict]) -> ImportBatchReport:
+        nonlocal batch_number, total_rows
+        started = time.perf_counter()
+        async with session_factory() as session:
+            await UserMailAccountRepository(session).bulk_upsert(batch)
+        seconds = time.perf_counter() - started
+
+        batch_number += 1
+        total_rows += len(batch)
+        report = ImportBatchReport(
+            batch=batch_number,
+            rows=len(batch),
+            total_rows=total_rows,
+            seconds=round(seconds, 6),
+            rows_per_second=round(len(batch) / seconds, 1) if seconds else 0.0,
+        )
+        logger.info(
+            "Imported batch %d: %d rows in %.3fs (%.1f rows/s)",
+            report.batch,
+            report.rows,
+            report.seconds,
+            report.rows_per_second,
+        )
+        return report
+
+    batch: list[dict] = []
+    async for line in _iter_lines(chunks):
+        record = AccountRecord.model_validate_json(line)
+        batch.append(
+            {
+                "email_address_txt": record.email,
+                "provider_cd": record.provider_cd,
+                "is_active_flg": record.is_active,
+                "access_token_txt": record.access_token,
+                "refresh_token_txt": record.refresh_token,
+                "expires_at_utc": _to_naive_utc(record.expires_at_utc),
+            }
+        )
+        if len(batch) >= batch_size:
+            yield await flush(batch)
+            batch = []
+
+    if batch:
+        yield await flush(batch)
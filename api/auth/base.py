@@ -1,10 +1,22 @@
 from abc import ABC, abstractmethod
 import secrets
-import httpx
+from urllib.parse import urlencode
+from api.auth.oidc import verify_id_token
+from api.auth.state import oauth_state, pkce_challenge
 from api.core.config import settings
+from api.core.http import http_clients
+from api.models.enums import Provider
 
 
+# OAuth2/OIDC client for one provider.
+# Provider-specific behaviour lives in subclasses (extra login parameters, token request fields,
+# where the email is read from), so instances are configured once and reused for every request.
 class BaseOAuth2(ABC):
+    # Extra static query parameters added to the login URL.
+    LOGIN_PARAMS: dict[str, str] = {}
+    # Mail API used for linked accounts ("gmail" or "graph"), if any.
+    MAIL_API: str | None = None
+
     def __init__(
         self,
         client_id: str,
@@ -15,6 +27,11 @@ class BaseOAuth2(ABC):
         userinfo_url: str,
         scopes: list[str],
         provider: str,
+        jwks_uri: str | None = None,
+        issuers: list[str] | None = None,
+        provider_cd: int | None = None,
+        login_params: dict[str, str] | None = None,
+        mail_api: str | None = None,
     ):
         self.client_id = client_id
         self.client_secret = client_secret
@@ -24,63 +41,135 @@ class BaseOAuth2(ABC):
         self.userinfo_url = userinfo_url
         self.scopes = scopes
         self.provider = provider
+        self.jwks_uri = jwks_uri
+        self.issuers = issuers or []
+        # Stored `provider_cd` value for accounts linked through this provider.
+        self.provider_cd = provider_cd
+        self.mail_api = mail_api or self.MAIL_API
 
-    def get_login_url(self, request) -> str:
-        state = secrets.token_hex(16)
-        request.session["state"] = state
-
+        # Everything in the login URL except the per-request state is static, so it is
+        # URL-encoded once here and only the state is appended per request.
         params = {
             "client_id": self.client_id,
             "redirect_uri": self.redirect_uri,
             "response_type": "code",
             "scope": " ".join(self.scopes),
-            "state": state,
+            **self.LOGIN_PARAMS,
+            **(login_params or {}),
         }
+        separator = "&" if "?" in self.authorization_url else "?"
+        self.login_url_base = f"{self.authorization_url}{separator}{urlencode(params)}"
 
-        if self.provider == "google":
-            params.update(
-                {
-                    "access_type": "offline",
-                    "prompt": "consent",
-                }
-            )
-        elif self.provider == "microsoft":
-            params.update({"prompt": "consent"})
-
-        return f"{self.authorization_url}?{'&'.join([f'{k}={v}' for k, v in params.items()])}"
-
-    async def exchange_code_for_tokens(self, code: str) -> dict:
-        async with httpx.AsyncClient() as client:
-            payload = {
-                "code": code,
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "redirect_uri": self.redirect_uri,
-                "grant_type": "authorization_code",
+    # Builds the provider login URL with a fresh stateless `state` (see `api.auth.state`).
+    # With PKCE enabled, the code verifier travels inside the encrypted state and only its
+    # S256 challenge is sent to the provider.
+    def get_login_url(self) -> str:
+        if settings.OAUTH_PKCE_ENABLED:
+            code_verifier = secrets.token_urlsafe(48)
+            params = {
+                "state": oauth_state.issue(self.provider, code_verifier),
+                "code_challenge": pkce_challenge(code_verifier),
+                "code_challenge_method": "S256",
             }
-            if self.provider == "microsoft":
-                payload["scope"] = " ".join(self.scopes)
+        else:
+            params = {"state": oauth_state.issue(self.provider)}
+        return f"{self.login_url_base}&{urlencode(params)}"
+
+    # Extra fields sent with authorization-code and refresh-token requests.
+    def token_request_params(self) -> dict[str, str]:
+        return {}
+
+    async def exchange_code_for_tokens(self, code: str, code_verifier: str | None = None) -> dict:
+        client = http_clients.get(self.provider)
+        payload = {
+            "code": code,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "redirect_uri": self.redirect_uri,
+            "grant_type": "authorization_code",
+            **self.token_request_params(),
+        }
+        if code_verifier is not None:
+            payload["code_verifier"] = code_verifier
 
-            response = await client.post(self.token_url, data=payload)
-            response.raise_for_status()
-            return response.json()
+        response = await client.post(self.token_url, data=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def refresh_access_token(self, refresh_token: str) -> dict:
+        client = http_clients.get(self.provider)
+        payload = {
+            "refresh_token": refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "refresh_token",
+            **self.token_request_params(),
+        }
+
+        response = await client.post(self.token_url, data=payload)
+        response.raise_for_status()
+        return response.json()
+
+    # Validates the id_token returned with the tokens and returns its claims,
+    # so the callback can read the user's identity without a userinfo round trip.
+    async def verify_id_token(self, id_token: str) -> dict:
+        return await verify_id_token(
+            id_token,
+            client=http_clients.get(self.provider),
+            jwks_uri=self.jwks_uri,
+            issuers=self.issuers,
+            audience=self.client_id,
+        )
 
     async def get_user_info(self, access_token: str) -> dict:
-        async with httpx.AsyncClient() as client:
-            headers = {"Authorization": f"Bearer {access_token}"}
-            response = await client.get(self.userinfo_url, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        client = http_clients.get(self.provider)
+        headers = {"Authorization": f"Bearer {access_token}"}
+        response = await client.get(self.userinfo_url, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    # Reads the account email from verified id_token claims, or None if they carry none.
+    def email_from_claims(self, claims: dict) -> str | None:
+        return claims.get("email")
+
+    # Reads the account email from a userinfo response.
+    def email_from_userinfo(self, payload: dict) -> str | None:
+        return payload.get("email")
+
+
+class GoogleOAuth2(BaseOAuth2):
+    # Ask for offline access and force consent so a refresh token is always issued.
+    LOGIN_PARAMS = {"access_type": "offline", "prompt": "consent"}
+    MAIL_API = "gmail"
+
+
+class MicrosoftOAuth2(BaseOAuth2):
+    LOGIN_PARAMS = {"prompt": "consent"}
+    MAIL_API = "graph"
+
+    # The Microsoft identity platform requires the scopes on token requests too.
+    def token_request_params(self) -> dict[str, str]:
+        return {"scope": " ".join(self.scopes)}
+
+    # `preferred_username` is not always an email address, so it is only used when it looks like one.
+    def email_from_claims(self, claims: dict) -> str | None:
+        email = claims.get("email") or claims.get("preferred_username")
+        return email if email and "@" in email else None
+
+    def email_from_userinfo(self, payload: dict) -> str | None:
+        return payload.get("mail") or payload.get("userPrincipalName")
 
 
 def get_google_oauth_client() -> BaseOAuth2:
-    return BaseOAuth2(
+    return GoogleOAuth2(
         client_id=settings.GOOGLE_CLIENT_ID,
         client_secret=settings.GOOGLE_CLIENT_SECRET,
         redirect_uri=settings.GOOGLE_REDIRECT_URI,
         authorization_url="https://accounts.google.com/o/oauth2/v2/auth",
         token_url="https://oauth2.googleapis.com/token",
         userinfo_url="https://www.googleapis.com/oauth2/v1/userinfo",
+        jwks_uri="https://www.googleapis.com/oauth2/v3/certs",
+        issuers=["https://accounts.google.com", "accounts.google.com"],
         scopes=[
             "openid",
             "email",
@@ -89,17 +178,28 @@ def get_google_oauth_client() -> BaseOAuth2:
             "https://www.googleapis.com/auth/gmail.send",
         ],
         provider="google",
+        provider_cd=Provider.GOOGLE.value,
     )
 
 
 def get_microsoft_oauth_client() -> BaseOAuth2:
-    return BaseOAuth2(
+    return MicrosoftOAuth2(
         client_id=settings.MICROSOFT_CLIENT_ID,
         client_secret=settings.MICROSOFT_CLIENT_SECRET,
         redirect_uri=settings.MICROSOFT_REDIRECT_URI,
         authorization_url="https://login.microsoftonline.com/common/oauth2/v2.0/authorize",
         token_url="https://login.microsoftonline.com/common/oauth2/v2.0/token",
         userinfo_url="https://graph.microsoft.com/v1.0/me",
-        scopes=["openid", "offline_access", "User.Read", "Mail.Read", "Mail.Send"],
+        jwks_uri="https://login.microsoftonline.com/common/discovery/v2.0/keys",
+        issuers=["https://login.microsoftonline.com/{tenantid}/v2.0"],
+        scopes=[
+            "openid",
+            "email",
+            "offline_access",
+            "User.Read",
+            "Mail.Read",
+            "Mail.Send",
+        ],
         provider="microsoft",
+        provider_cd=Provider.MICROSOFT.value,
     )
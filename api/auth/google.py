@@ -1,6 +1,10 @@
 from api.auth.base import get_google_oauth_client
 
-# Initializes the Google OAuth client by calling the `get_google_oauth_client` function
-# from `api.auth.base`. This function encapsulates the logic for creating and configuring
-# the Google OAuth client instance using settings from `api.core.config`.
-google_oauth_client = get_google_oauth_client()
+
+# `google_oauth_client` is built by `get_google_oauth_client` from `api.auth.base` when first
+# accessed rather than at import, so importing this module does no settings-dependent work.
+# The app itself looks providers up in `api.auth.registry`.
+def __getattr__(name: str):
+    if name == "google_oauth_client":
+        return get_google_oauth_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,154 @@
+import base64
+import json
+import time
+
+import httpx
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey, RSAPublicNumbers
+
+from api.core.config import settings
+
+
+# Raised when an id_token is malformed, has a bad signature or fails a claim check.
+class IdTokenError(ValueError):
+    pass
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64url_uint(segment: str) -> int:
+    return int.from_bytes(_b64url_decode(segment), "big")
+
+
+# In-process cache of provider signing keys (JWKS), keyed by JWKS URL.
+# Key sets are reused for `OIDC_JWKS_TTL_SECONDS`; a token signed with an unknown `kid` triggers
+# an early refetch (providers rotate keys), at most once per `OIDC_JWKS_MIN_REFETCH_SECONDS`
+# so tokens with made-up key ids cannot force a fetch per request.
+class JWKSCache:
+    def __init__(self):
+        self._entries: dict[str, tuple[float, dict[str, RSAPublicKey]]] = {}
+
+    async def _fetch(self, client: httpx.AsyncClient, jwks_uri: str) -> dict[str, RSAPublicKey]:
+        response = await client.get(jwks_uri)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            if jwk.get("kty") != "RSA" or "kid" not in jwk:
+                continue
+            keys[jwk["kid"]] = RSAPublicNumbers(
+                _b64url_uint(jwk["e"]), _b64url_uint(jwk["n"])
+            ).public_key()
+        self._entries[jwks_uri] = (time.monotonic(), keys)
+        return keys
+
+    async def get_key(self, client: httpx.AsyncClient, jwks_uri: str, kid: str) -> RSAPublicKey:
+        entry = self._entries.get(jwks_uri)
+        if entry is not None:
+            fetched_at, keys = entry
+            age = time.monotonic() - fetched_at
+            if kid in keys and age < settings.OIDC_JWKS_TTL_SECONDS:
+                return keys[kid]
+            if kid not in keys and age < settings.OIDC_JWKS_MIN_REFETCH_SECONDS:
+                raise IdTokenError(f"Unknown signing key '{kid}'")
+
+        keys = await self._fetch(client, jwks_uri)
+        if kid not in keys:
+            raise IdTokenError(f"Unknown signing key '{kid}'")
+        return keys[kid]
+
+    # Fetches a key set ahead of its first use (see `api.warmup`).
+    async def prefetch(self, client: httpx.AsyncClient, jwks_uri: str) -> None:
+        await self._fetch(client, jwks_uri)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Process-wide JWKS cache shared by all providers.
+jwks_cache = JWKSCache()
+
+
+# In-process cache of OIDC discovery documents (`.well-known/openid-configuration`), keyed by
+# issuer. Documents are reused for `OIDC_DISCOVERY_TTL_SECONDS`, so reloading the provider
+# registry does not refetch them.
+class DiscoveryCache:
+    def __init__(self):
+        self._entries: dict[str, tuple[float, dict]] = {}
+
+    async def get(self, client: httpx.AsyncClient, issuer: str) -> dict:
+        issuer = issuer.rstrip("/")
+        entry = self._entries.get(issuer)
+        if entry is not None and time.monotonic() - entry[0] < settings.OIDC_DISCOVERY_TTL_SECONDS:
+            return entry[1]
+
+        response = await client.get(f"{issuer}/.well-known/openid-configuration")
+        response.raise_for_status()
+        document = response.json()
+        if document.get("issuer", "").rstrip("/") != issuer:
+            raise ValueError(f"Discovery document issuer does not match '{issuer}'")
+        self._entries[issuer] = (time.monotonic(), document)
+        return document
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Process-wide discovery document cache.
+discovery_cache = DiscoveryCache()
+
+
+# Verifies an OIDC id_token locally and returns its claims.
+# Checks the RS256 signature against the provider's JWKS, then the issuer, audience and expiry.
+# Issuers may contain a `{tenantid}` placeholder (Microsoft multi-tenant), which is filled in
+# from the token's `tid` claim before comparison.
+async def verify_id_token(
+    id_token: str,
+    client: httpx.AsyncClient,
+    jwks_uri: str,
+    issuers: list[str],
+    audience: str,
+) -> dict:
+    try:
+        header_segment, payload_segment, signature_segment = id_token.split(".")
+        header = json.loads(_b64url_decode(header_segment))
+        claims = json.loads(_b64url_decode(payload_segment))
+        signature = _b64url_decode(signature_segment)
+    except ValueError as e:
+        raise IdTokenError("Malformed id_token") from e
+
+    if header.get("alg") != "RS256":
+        raise IdTokenError(f"Unsupported id_token algorithm '{header.get('alg')}'")
+
+    key = await jwks_cache.get_key(client, jwks_uri, header.get("kid", ""))
+    try:
+        key.verify(
+            signature,
+            f"{header_segment}.{payload_segment}".encode(),
+            padding.PKCS1v15(),
+            hashes.SHA256(),
+        )
+    except InvalidSignature as e:
+        raise IdTokenError("Invalid id_token signature") from e
+
+    tenant_id = claims.get("tid", "")
+    if claims.get("iss") not in [issuer.format(tenantid=tenant_id) for issuer in issuers]:
+        raise IdTokenError("Unexpected id_token issuer")
+
+    audiences = claims.get("aud")
+    if isinstance(audiences, str):
+        audiences = [audiences]
+    if audience not in (audiences or []):
+        raise IdTokenError("Unexpected id_token audience")
+
+    now = time.time()
+    leeway = settings.OIDC_CLOCK_SKEW_SECONDS
+    if not isinstance(claims.get("exp"), (int, float)) or claims["exp"] + leeway < now:
+        raise IdTokenError("Expired id_token")
+    if isinstance(claims.get("nbf"), (int, float)) and claims["nbf"] - leeway > now:
+        raise IdTokenError("id_token not yet valid")
+
+    return claims
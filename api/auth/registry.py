@@ -0,0 +1,136 @@
+import json
+import logging
+
+from pydantic import TypeAdapter
+
+from api.auth.base import (
+    BaseOAuth2,
+    get_google_oauth_client,
+    get_microsoft_oauth_client,
+)
+from api.auth.oidc import discovery_cache
+from api.auth.schemas import OIDCProviderConfig
+from api.core.config import settings
+from api.core.http import http_clients
+
+logger = logging.getLogger(__name__)
+
+_provider_configs = TypeAdapter(list[OIDCProviderConfig])
+
+
+# Reads the generic OIDC provider entries from `OIDC_PROVIDERS_FILE`.
+def _read_provider_configs() -> list[OIDCProviderConfig]:
+    if not settings.OIDC_PROVIDERS_FILE:
+        return []
+    with open(settings.OIDC_PROVIDERS_FILE) as f:
+        return _provider_configs.validate_python(json.load(f))
+
+
+# Builds a client for a generic OIDC provider from its issuer's discovery document.
+async def build_oidc_client(config: OIDCProviderConfig) -> BaseOAuth2:
+    document = await discovery_cache.get(http_clients.get(config.name), config.issuer)
+    return BaseOAuth2(
+        client_id=config.client_id,
+        client_secret=config.client_secret,
+        redirect_uri=config.redirect_uri,
+        authorization_url=document["authorization_endpoint"],
+        token_url=document["token_endpoint"],
+        userinfo_url=document.get("userinfo_endpoint", ""),
+        jwks_uri=document.get("jwks_uri"),
+        issuers=[document["issuer"]],
+        scopes=config.scopes,
+        provider=config.name,
+        provider_cd=config.provider_cd,
+        login_params=config.login_params,
+        mail_api=config.mail_api,
+    )
+
+
+# Registry of configured OAuth providers, looked up by route name or stored `provider_cd`.
+# Clients are built once, at startup or on reload, and shared by every request and background
+# job. The built-in Google and Microsoft providers are always present; generic OIDC providers
+# come from `OIDC_PROVIDERS_FILE`. A reload builds the new set first and swaps it in whole,
+# so lookups never see a partially loaded registry.
+class ProviderRegistry:
+    def __init__(self):
+        self._by_name: dict[str, BaseOAuth2] = {}
+        self._by_code: dict[int, BaseOAuth2] = {}
+
+    def _builtin(self) -> list[BaseOAuth2]:
+        return [get_google_oauth_client(), get_microsoft_oauth_client()]
+
+    # The built-in providers need no I/O, so entry points that never call `load()`
+    # (CLI jobs, tests) get them on first lookup.
+    def _ensure_loaded(self) -> None:
+        if not self._by_name:
+            self._swap(self._builtin())
+
+    def _swap(self, clients: list[BaseOAuth2]) -> None:
+        self._by_name = {client.provider: client for client in clients}
+        self._by_code = {client.provider_cd: client for client in clients}
+
+    # (Re)builds every provider. A generic provider whose discovery fails keeps its previous
+    # client if it had one, and is otherwise skipped, so one bad issuer cannot block startup.
+    async def load(self) -> list[str]:
+        clients = self._builtin()
+        names = {client.provider for client in clients}
+        codes = {client.provider_cd for client in clients}
+
+        for config in _read_provider_configs():
+            if config.name in names or config.provider_cd in codes:
+                logger.error(
+                    "Skipping OIDC provider '%s': name or provider_cd %d already in use",
+                    config.name,
+                    config.provider_cd,
+                )
+                continue
+            try:
+                client = await build_oidc_client(config)
+            except Exception as e:
+                client = self._by_name.get(config.name)
+                logger.error("OIDC discovery failed for provider '%s': %s", config.name, e)
+                if client is None:
+                    continue
+            clients.append(client)
+            names.add(client.provider)
+            codes.add(client.provider_cd)
+
+        self._swap(clients)
+        return self.names()
+
+    # Adds or replaces a single provider.
+    def register(self, client: BaseOAuth2) -> None:
+        self._ensure_loaded()
+        self._swap(
+            [
+                existing
+                for existing in self._by_name.values()
+                if existing.provider != client.provider
+                and existing.provider_cd != client.provider_cd
+            ]
+            + [client]
+        )
+
+    def names(self) -> list[str]:
+        self._ensure_loaded()
+        return list(self._by_name)
+
+    def get(self, name: str) -> BaseOAuth2 | None:
+        self._ensure_loaded()
+        return self._by_name.get(name)
+
+    def get_by_code(self, provider_cd: int) -> BaseOAuth2:
+        self._ensure_loaded()
+        if provider_cd not in self._by_code:
+            raise ValueError(f"Unsupported provider code: {provider_cd}")
+        return self._by_code[provider_cd]
+
+
+# Process-wide provider registry, loaded on application startup.
+provider_registry = ProviderRegistry()
+
+
+# Returns the OAuth client for a stored `provider_cd` value (see `Provider`).
+# Used by background jobs that start from database rows rather than a request path.
+def get_oauth_client_for_provider(provider_cd: int) -> BaseOAuth2:
+    return provider_registry.get_by_code(provider_cd)
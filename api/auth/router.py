@@ -1,57 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+import math
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-# Import base OAuth classes and provider-specific client getters.
-from api.auth.base import (
-    BaseOAuth2,
-    get_google_oauth_client,
-    get_microsoft_oauth_client,
-)
+# Import the base OAuth class and the registry of configured providers.
+from api.auth.base import BaseOAuth2
+from api.auth.registry import provider_registry
+
+# Import the id_token verification error raised for invalid provider tokens.
+from api.auth.oidc import IdTokenError
+
+# Import the stateless OAuth state manager and its validation error.
+from api.auth.state import StateError, oauth_state
 
 # Import Pydantic schemas for authentication responses and data transfer.
 from api.auth.schemas import AuthResponse, TokenData, UserInfo
 
+# Import the authentication audit log.
+from api.core.audit import audit_log
+
 # Import database dependency.
 from api.core.database import get_db
 
-# Import the repository for user mail account operations.
-from api.repositories.user_mail_account import UserMailAccountRepository
+# Import the callback latency metrics.
+from api.core.metrics import callback_finished, callback_phase, callback_started
+
+# Import the audit event types.
+from api.models.enums import AuditEventType
 
-# Import the Provider enum for distinguishing OAuth providers.
-from api.models.enums import Provider
+# Import the rate limiter's call priorities and Retry-After parsing.
+from api.core.ratelimit import Priority, parse_retry_after, request_priority
+
+# Import the error raised while a provider endpoint's circuit breaker is open.
+from api.core.resilience import CircuitOpenError
+
+# Import the repository for user mail account operations and its provider mismatch error.
+from api.repositories.user_mail_account import (
+    ProviderMismatchError,
+    UserMailAccountRepository,
+)
+
+# Import the access token cache so a new login replaces any cached token.
+from api.tokens.service import token_cache
 
 # Initialize an API router specifically for authentication routes.
 # All routes defined in this router will be prefixed with "/auth" and tagged for documentation.
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-# A dictionary mapiing provider names (strings) to their respective OAuth client getters
-# and the corresponding Provider enum value. This allows for dynamic selection of OAuth clients.
-PROVIDER_MAP = {
-    "google": {
-        "client": get_google_oauth_client,  # Function to get the Google OAuth client instance
-        "provider_enum": Provider.GOOGLE,  # Enum value for Google provider
-    },
-    "microsoft": {
-        "client": get_microsoft_oauth_client,  # Function to get the Microsoft OAuth client instance
-        "provider_enum": Provider.MICROSOFT,  # Enum value for Microsoft provider
-    },
-}
-
-
 # Defines the login endpoint for a given OAuth provider.
 # When a user navigates to /auth/{provider}/login, they are redirected to the OAuth provider's
 # authorization page.
 @router.get("/{provider}/login")
-async def login(provider: str, request: Request):
-    # Check if the requested provider is supported.
-    if provider not in PROVIDER_MAP:
+async def login(provider: str):
+    # Look up the provider's client, built once at startup.
+    oauth_client: BaseOAuth2 | None = provider_registry.get(provider)
+    if oauth_client is None:
         raise HTTPException(status_code=404, detail="Provider not found")
 
-    # Get the apiropriate OAuth client based on the provider.
-    oauth_client: BaseOAuth2 = PROVIDER_MAP[provider]["client"]()
     # Generate the authorization URL for the OAuth provider.
-    login_url = oauth_client.get_login_url(request)
+    login_url = oauth_client.get_login_url()
     # Redirect the user to the provider's login URL.
     return RedirectResponse(login_url)
 
@@ -62,29 +71,46 @@ async def login(provider: str, request: Request):
 @router.get("/{provider}/callback")
 async def callback(
     provider: str,
-    request: Request,
     code: str,
     state: str,
     db: AsyncSession = Depends(get_db),  # Inject an asynchronous database session.
 ) -> AuthResponse:
-    # Check if the requested provider is supported.
-    if provider not in PROVIDER_MAP:
+    # Look up the provider's client, built once at startup.
+    oauth_client: BaseOAuth2 | None = provider_registry.get(provider)
+    if oauth_client is None:
         raise HTTPException(status_code=404, detail="Provider not found")
 
     # Validate the 'state' parameter to prevent CSRF attacks.
-    # The 'state' parameter is generated by the client and sent to the OAuth provider,
-    # then returned to the callback. It must match the original state stored in the session.
-    if "state" not in request.session or request.session["state"] != state:
+    # The 'state' parameter is issued by the login endpoint and sent to the OAuth provider,
+    # then returned to the callback. It must be an unexpired state issued by this server for
+    # this provider, and is consumed here so it cannot be reused.
+    try:
+        login_state = await oauth_state.consume(state, provider, db)
+    except StateError as e:
+        await audit_log.record(
+            AuditEventType.LOGIN_FAILED,
+            provider_cd=oauth_client.provider_cd,
+            detail=f"Invalid state parameter: {e}",
+        )
         raise HTTPException(status_code=400, detail="Invalid state parameter")
 
-    # Remove the state from the session after successful validation to prevent reuse.
-    del request.session["state"]
+    # Provider calls made for this request (a user is waiting) are served before background
+    # refresh and sync traffic. The value is scoped to the request's own context.
+    request_priority.set(Priority.INTERACTIVE)
 
+    # Each phase below is recorded in the `oauth_callback_phase_seconds` histogram.
+    # Every outcome is also recorded in the audit log (queued, written in the background).
+    started = callback_started(provider)
+    email = None
     try:
-        # Get the apiropriate OAuth client based on the provider.
-        oauth_client: BaseOAuth2 = PROVIDER_MAP[provider]["client"]()
         # Exchange the authorization code for access and refresh tokens.
-        token_payload = await oauth_client.exchange_code_for_tokens(code)
+        with callback_phase(provider, "token_exchange"):
+            token_payload = await oauth_client.exchange_code_for_tokens(
+                code, login_state.code_verifier
+            )
+        await audit_log.record(
+            AuditEventType.TOKEN_EXCHANGE, provider_cd=oauth_client.provider_cd
+        )
 
         # Extract token details from the payload.
         access_token = token_payload.get("access_token")
@@ -100,17 +126,25 @@ async def callback(
                 status_code=400, detail=f"Invalid token data from {provider}"
             )
 
-        # Use the access token to fetch user information from the OAuth provider.
-        user_info_payload = await oauth_client.get_user_info(access_token)
-
-        # Extract the user's email based on the provider.
-        email = None
-        if provider == "google":
-            email = user_info_payload.get("email")
-        elif provider == "microsoft":
-            email = user_info_payload.get("mail") or user_info_payload.get(
-                "userPrincipalName"
-            )
+        # Read the user's email from the signed id_token when the provider returned one.
+        # It is verified locally against the provider's cached signing keys, which saves a
+        # network round trip compared to calling the userinfo endpoint.
+        id_token = token_payload.get("id_token")
+        if id_token and oauth_client.jwks_uri:
+            try:
+                with callback_phase(provider, "id_token"):
+                    claims = await oauth_client.verify_id_token(id_token)
+            except IdTokenError as e:
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid id_token from {provider}: {e}"
+                )
+            email = oauth_client.email_from_claims(claims)
+
+        # Fall back to the userinfo endpoint when the id_token did not carry an email.
+        if not email:
+            with callback_phase(provider, "userinfo"):
+                user_info_payload = await oauth_client.get_user_info(access_token)
+            email = oauth_client.email_from_userinfo(user_info_payload)
 
         # Validate that the user's email was successfully retrieved.
         if not email:
@@ -129,8 +163,14 @@ async def callback(
         # Initialize the UserMailAccountRepository to interact with the database.
         repo = UserMailAccountRepository(db)
         # Create or update the user's mail account in the database with the new token information.
-        await repo.create_or_update_user_with_token(
-            user_info, token_data, PROVIDER_MAP[provider]["provider_enum"].value
+        with callback_phase(provider, "upsert"):
+            await repo.create_or_update_user_with_token(
+                user_info, token_data, oauth_client.provider_cd
+            )
+        # Drop any cached access token for this account so the new one is served next.
+        token_cache.pop(email)
+        await audit_log.record(
+            AuditEventType.LOGIN, email=email, provider_cd=oauth_client.provider_cd
         )
 
         # Return the authentication response containing user info and token data.
@@ -138,10 +178,56 @@ async def callback(
 
     # Catch specific HTTP exceptions and re-raise them.
     except HTTPException as e:
-        raise e
+        error = e
+    # The email is registered with another provider. The repository already recorded this
+    # in the audit log.
+    except ProviderMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    # The provider is still throttling after the rate limiter's retries: ask the client to retry.
+    # Other provider server errors, after retries, become 502s.
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code in (429, 503):
+            retry_after = parse_retry_after(e.response.headers.get("retry-after"))
+            error = HTTPException(
+                status_code=503,
+                detail=f"{provider} is rate limiting requests, please retry later",
+                headers={"Retry-After": str(math.ceil(retry_after or 1))},
+            )
+        elif e.response.status_code >= 500:
+            error = HTTPException(
+                status_code=502, detail=f"{provider} failed to process the request: {e}"
+            )
+        else:
+            error = HTTPException(
+                status_code=500,
+                detail=f"An unexpected error occurred during {provider} OAuth callback: {e}",
+            )
+    # The provider endpoint is failing and its circuit breaker is open: fail fast.
+    except CircuitOpenError as e:
+        error = HTTPException(
+            status_code=503,
+            detail=f"{provider} is currently unavailable, please retry later",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    # The provider could not be reached or did not answer in time, after retries.
+    except httpx.TimeoutException:
+        error = HTTPException(status_code=504, detail=f"{provider} did not respond in time")
+    except httpx.TransportError as e:
+        error = HTTPException(status_code=502, detail=f"Could not reach {provider}: {e}")
     # Catch any other unexpected exceptions and return a generic 500 error.
     except Exception as e:
-        raise HTTPException(
+        error = HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred during {provider} OAuth callback: {e}",
         )
+    finally:
+        callback_finished(provider, started)
+
+    # Every failure handled above ends here: record it in the audit log, then answer with it.
+    await audit_log.record(
+        AuditEventType.LOGIN_FAILED,
+        email=email,
+        provider_cd=oauth_client.provider_cd,
+        detail=str(error.detail),
+    )
+    raise error
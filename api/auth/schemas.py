@@ -11,3 +11,19 @@ class TokenData(BaseModel):
 class AuthResponse(BaseModel):
     user: UserInfo
     token: TokenData
+
+
+# A generic OIDC provider entry from `OIDC_PROVIDERS_FILE`.
+# `provider_cd` is stored on linked accounts and must not clash with another provider.
+# `mail_api` ("gmail" or "graph") enables mail operations for its accounts, e.g. for a
+# tenant-specific Microsoft entry.
+class OIDCProviderConfig(BaseModel):
+    name: str
+    provider_cd: int
+    issuer: str
+    client_id: str
+    client_secret: str
+    redirect_uri: str
+    scopes: list[str] = ["openid", "email", "offline_access"]
+    login_params: dict[str, str] = {}
+    mail_api: str | None = None
@@ -0,0 +1,90 @@
+import base64
+import datetime
+import hashlib
+import json
+import secrets
+from typing import NamedTuple
+
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.core.config import settings
+from api.core.security import derive_fernet_key
+from api.repositories.oauth_state_nonce import OAuthStateNonceRepository
+
+# Used nonces are kept this much longer than their state's TTL, so that API processes whose
+# clocks run behind still find them (Fernet itself tolerates 60 seconds of skew).
+CLOCK_SKEW_SECONDS = 60
+# Expired nonces are purged by every this many consumed states of a process.
+PURGE_EVERY = 100
+
+
+# Raised when an OAuth `state` parameter is forged, expired, meant for another provider or reused.
+class StateError(ValueError):
+    pass
+
+
+# What the login request recorded for its callback.
+class OAuthState(NamedTuple):
+    nonce: str
+    provider: str
+    code_verifier: str | None
+
+
+# Derives the S256 PKCE code challenge for a code verifier.
+def pkce_challenge(code_verifier: str) -> str:
+    digest = hashlib.sha256(code_verifier.encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+# Issues and checks stateless OAuth `state` tokens, replacing server-side session storage.
+# A state is a Fernet token (AES plus HMAC-SHA256, timestamped) holding a random nonce, the
+# provider and, with PKCE, the code verifier, which stays confidential even though the state
+# travels through the browser. The callback accepts a state only for its own provider, within
+# `OAUTH_STATE_TTL_SECONDS` of issue, and only once: used nonces are recorded in the database
+# (`oauth_state_nonces`) until the state would have expired anyway, so a state cannot be
+# replayed on another API process either.
+class StateManager:
+    def __init__(self, key: bytes, ttl_seconds: int):
+        self.fernet = Fernet(key)
+        self.ttl_seconds = ttl_seconds
+        self._consumed = 0
+
+    def issue(self, provider: str, code_verifier: str | None = None) -> str:
+        payload = {"n": secrets.token_urlsafe(16), "p": provider}
+        if code_verifier is not None:
+            payload["v"] = code_verifier
+        return self.fernet.encrypt(json.dumps(payload).encode()).decode()
+
+    # Checks `state` for `provider` and records its nonce as used through `session` (commits).
+    async def consume(self, state: str, provider: str, session: AsyncSession) -> OAuthState:
+        try:
+            token = state.encode()
+            payload = json.loads(self.fernet.decrypt(token, ttl=self.ttl_seconds))
+            issued_at = self.fernet.extract_timestamp(token)
+        except (InvalidToken, ValueError) as e:
+            raise StateError("Invalid or expired state") from e
+
+        if payload.get("p") != provider:
+            raise StateError("State was issued for another provider")
+        nonce = payload["n"]
+        expires_at = datetime.datetime.fromtimestamp(
+            issued_at + self.ttl_seconds + CLOCK_SKEW_SECONDS, datetime.timezone.utc
+        ).replace(tzinfo=None)
+        repo = OAuthStateNonceRepository(session)
+        if not await repo.claim(nonce, expires_at):
+            raise StateError("State has already been used")
+
+        self._consumed += 1
+        if self._consumed % PURGE_EVERY == 0:
+            await repo.purge_expired(
+                datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            )
+        return OAuthState(nonce=nonce, provider=provider, code_verifier=payload.get("v"))
+
+
+# Process-wide state manager, keyed from SECRET_KEY (separately from token encryption).
+oauth_state = StateManager(
+    derive_fernet_key(f"oauth-state:{settings.SECRET_KEY}"),
+    settings.OAUTH_STATE_TTL_SECONDS,
+)
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import sys
+
+from api.admin.reencrypt import reencrypt_tokens
+from api.admin.transfer import export_accounts_ndjson, import_accounts_ndjson
+from api.core.config import settings
+from api.core.database import SessionLocal
+from api.repositories.auth_event import AuthEventRepository
+
+
+# Reads a binary file in fixed-size chunks, yielding control to the event loop between chunks.
+async def _read_chunks(stream, chunk_size: int = 64 * 1024):
+    while chunk := stream.read(chunk_size):
+        yield chunk
+        await asyncio.sleep(0)
+
+
+async def export_accounts(output) -> None:
+    async for data in export_accounts_ndjson(SessionLocal, settings.TRANSFER_BATCH_SIZE):
+        output.write(data)
+    output.flush()
+
+
+async def import_accounts(source) -> None:
+    async for report in import_accounts_ndjson(
+        SessionLocal, _read_chunks(source), settings.TRANSFER_BATCH_SIZE
+    ):
+        print(report.model_dump_json(), file=sys.stderr)
+
+
+async def reencrypt(batch_size: int) -> None:
+    result = await reencrypt_tokens(
+        SessionLocal, batch_size, settings.REENCRYPT_CHECKPOINT_PATH
+    )
+    print(json.dumps(result), file=sys.stderr)
+
+
+# Creates the upcoming audit log partitions and drops those past `AUDIT_RETENTION_DAYS`.
+async def audit_partitions() -> None:
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    async with SessionLocal() as session:
+        repo = AuthEventRepository(session)
+        result = {
+            "ensured": await repo.ensure_partitions(today, settings.AUDIT_PARTITION_MONTHS_AHEAD),
+            "dropped": [],
+        }
+        if settings.AUDIT_RETENTION_DAYS is not None:
+            cutoff = today - datetime.timedelta(days=settings.AUDIT_RETENTION_DAYS)
+            result["dropped"] = await repo.drop_partitions_before(cutoff)
+    print(json.dumps(result), file=sys.stderr)
+
+
+# Command-line entry point for bulk account operations:
+#   python -m api.cli export > accounts.ndjson
+#   python -m api.cli import < accounts.ndjson
+#   python -m api.cli reencrypt        (move all tokens to the newest encryption key)
+#   python -m api.cli audit-partitions (audit log partition maintenance, e.g. daily from cron)
+# Per-batch progress is reported on stderr.
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mail account bulk export/import")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export_parser = subcommands.add_parser("export", help="Write accounts as NDJSON")
+    export_parser.add_argument("--output", type=argparse.FileType("wb"), default=sys.stdout.buffer)
+    import_parser = subcommands.add_parser("import", help="Read accounts from NDJSON")
+    import_parser.add_argument("--input", type=argparse.FileType("rb"), default=sys.stdin.buffer)
+    reencrypt_parser = subcommands.add_parser(
+        "reencrypt", help="Re-encrypt stored tokens with the newest key (resumable)"
+    )
+    reencrypt_parser.add_argument("--batch-size", type=int, default=settings.TRANSFER_BATCH_SIZE)
+    subcommands.add_parser(
+        "audit-partitions", help="Create upcoming audit log partitions, drop expired ones"
+    )
+    options = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    if options.command == "export":
+        asyncio.run(export_accounts(options.output))
+    elif options.command == "import":
+        asyncio.run(import_accounts(options.input))
+    elif options.command == "reencrypt":
+        asyncio.run(reencrypt(options.batch_size))
+    else:
+        asyncio.run(audit_partitions())
+
+
+if __name__ == "__main__":
+    main()
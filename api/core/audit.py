@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import logging
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.core.config import settings
+from api.core.database import SessionLocal
+from api.core.metrics import count_audit_events
+from api.models.enums import AuditEventType
+from api.repositories.auth_event import AuthEventRepository
+
+logger = logging.getLogger(__name__)
+
+# Queued after the last event by `aclose` to stop the writer.
+_STOP = object()
+
+
+# Authentication audit log. `record` puts the event on a bounded in-memory queue and returns
+# without touching the database; one background writer per event loop drains the queue in
+# batches (COPY on PostgreSQL, see `AuthEventRepository.insert_many`), so a login costs no
+# extra round trip. When the queue is full, `AUDIT_QUEUE_POLICY` either drops an event or
+# makes the caller wait for room. Audit writes never fail a request: a batch that cannot be
+# written is logged and counted as failed.
+# `aclose` writes what is still queued; the app lifespan and the worker call it on shutdown.
+class AuditLog:
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession] = SessionLocal):
+        self.session_factory = session_factory
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.Queue | None = None
+        self._writer: asyncio.Task | None = None
+        # First day of the month up to which partitions were last ensured.
+        self._partitions_month: datetime.date | None = None
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    # Queue and writer of the running loop, started on first use (the queue is bound to it).
+    def _running_queue(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(settings.AUDIT_QUEUE_MAX_SIZE)
+            self._writer = None
+        if self._writer is None or self._writer.done():
+            self._writer = loop.create_task(self._run(self._queue))
+        return self._queue
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def record(
+        self,
+        event_type: AuditEventType,
+        email: str | None = None,
+        provider_cd: int | None = None,
+        detail: str | None = None,
+    ) -> None:
+        if not settings.AUDIT_ENABLED:
+            return
+        event = {
+            "auth_event_id": uuid.uuid4(),
+            "occurred_at_utc": datetime.datetime.now(datetime.timezone.utc),
+            "event_type_txt": event_type.value,
+            "email_address_txt": email,
+            "provider_cd": provider_cd,
+            "detail_txt": detail,
+        }
+        queue = self._running_queue()
+        self.recorded += 1
+        try:
+            queue.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if settings.AUDIT_QUEUE_POLICY == "block":
+            await queue.put(event)
+            return
+        if settings.AUDIT_QUEUE_POLICY == "drop_oldest":
+            queue.get_nowait()
+            queue.put_nowait(event)
+        self.dropped += 1
+        count_audit_events("dropped")
+        if self.dropped == 1 or self.dropped % 1000 == 0:
+            logger.warning("Audit queue full, %d events dropped so far", self.dropped)
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            event = await queue.get()
+            if event is _STOP:
+                return
+            batch = [event]
+            deadline = loop.time() + settings.AUDIT_FLUSH_INTERVAL_SECONDS
+            while len(batch) < settings.AUDIT_BATCH_SIZE:
+                try:
+                    event = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        event = await asyncio.wait_for(queue.get(), timeout)
+                    except TimeoutError:
+                        break
+                if event is _STOP:
+                    stopping = True
+                    break
+                batch.append(event)
+            await self._write(batch)
+
+    async def _write(self, batch: list[dict]) -> None:
+        try:
+            async with self.session_factory() as session:
+                repo = AuthEventRepository(session)
+                await self._ensure_partitions(repo)
+                await repo.insert_many(batch)
+        except Exception:
+            logger.exception("Writing %d audit events failed", len(batch))
+            self.failed += len(batch)
+            count_audit_events("failed", len(batch))
+            return
+        self.written += len(batch)
+        count_audit_events("written", len(batch))
+
+    # Creates upcoming partitions once per process and month, so events of a new month never
+    # fall into the default partition.
+    async def _ensure_partitions(self, repo: AuthEventRepository) -> None:
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        month = today.replace(day=1)
+        if self._partitions_month == month:
+            return
+        await repo.ensure_partitions(today, settings.AUDIT_PARTITION_MONTHS_AHEAD)
+        self._partitions_month = month
+
+    # Writes every queued event and stops the writer (called on shutdown).
+    async def aclose(self) -> None:
+        writer, queue = self._writer, self._queue
+        self._writer = None
+        if writer is None or writer.done() or self._loop is not asyncio.get_running_loop():
+            return
+        await queue.put(_STOP)
+        await writer
+
+
+# Process-wide audit log used by the auth router and repositories.
+audit_log = AuditLog()
@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import PositiveFloat, PositiveInt
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Define a Settings class that inherits from Pydantic's BaseSettings.
@@ -6,6 +9,32 @@ class Settings(BaseSettings):
     # Database connection URL.
     DATABASE_URL: str
 
+    # Database connection strategy (see `api.core.database`).
+    # "queue" keeps a pool per process: `DB_POOL_SIZE` connections plus up to `DB_MAX_OVERFLOW`
+    # extra ones under load, waiting at most `DB_POOL_TIMEOUT` seconds for a free one. Connections
+    # older than `DB_POOL_RECYCLE` seconds are replaced (-1: never), and `DB_POOL_PRE_PING` tests
+    # each connection on checkout. "null" opens a connection per session and closes it afterwards,
+    # for serverless instances whose idle pools would otherwise hold connections open.
+    # `DB_PGBOUNCER` makes asyncpg usable behind PgBouncer in transaction mode: no prepared
+    # statement caching, and prepared statements get unique names.
+    DB_POOL_MODE: Literal["queue", "null"] = "queue"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_PGBOUNCER: bool = False
+
+    # Optional read replica (see `api.core.replica`). Repository reads that allow it go to the
+    # replica, except reads of an account this process wrote in the last
+    # `REPLICA_READ_YOUR_WRITES_SECONDS`. The replica is health-checked every
+    # `REPLICA_HEALTH_CHECK_SECONDS`; while it is unreachable or lags by more than
+    # `REPLICA_MAX_LAG_SECONDS`, reads fall back to the primary.
+    DATABASE_REPLICA_URL: str | None = None
+    REPLICA_READ_YOUR_WRITES_SECONDS: float = 5.0
+    REPLICA_HEALTH_CHECK_SECONDS: float = 10.0
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+
     # Google OAuth client ID, client secret, and redirect URI.
     # These are used for authenticating users via Google.
     GOOGLE_CLIENT_ID: str
@@ -18,13 +47,224 @@ class Settings(BaseSettings):
     MICROSOFT_CLIENT_SECRET: str
     MICROSOFT_REDIRECT_URI: str
 
-    # Secret key for signing session cookies and other security-related operations.
+    # Secret key for signing OAuth state tokens and other security-related operations.
     SECRET_KEY: str
 
+    # OAuth login `state` handling. States are stateless encrypted tokens (keyed from SECRET_KEY)
+    # accepted for `OAUTH_STATE_TTL_SECONDS` and only once; used states are recorded in the
+    # database (`oauth_state_nonces`) to reject replays on any process.
+    # With `OAUTH_PKCE_ENABLED`, logins also use a PKCE (S256) code challenge.
+    OAUTH_STATE_TTL_SECONDS: int = 600
+    OAUTH_PKCE_ENABLED: bool = True
+
+    # Keys for encrypting OAuth tokens at rest: comma-separated Fernet keys, newest first.
+    # New data is encrypted with the first key; older keys stay usable for decryption until
+    # `python -m api.cli reencrypt` has moved every row to the newest key.
+    # A key derived from SECRET_KEY is used when none are configured.
+    TOKEN_ENCRYPTION_KEYS: str | None = None
+    # Batches of at least this many values are encrypted/decrypted on a worker thread.
+    CRYPTO_THREAD_THRESHOLD: int = 64
+    # File where the re-encryption job records its progress, so an interrupted run can resume.
+    REENCRYPT_CHECKPOINT_PATH: str = ".reencrypt-checkpoint.json"
+
+    # API key required (as the `X-API-Key` header) by internal endpoints such as token vending.
+    # Internal endpoints are disabled while this is unset.
+    INTERNAL_API_KEY: str | None = None
+
+    # Outbound HTTP connection pool used for calls to the OAuth providers.
+    # Each provider gets its own long-lived pool, opened and closed with the app lifespan.
+    # `HTTP_MAX_CONNECTIONS` caps concurrent connections per provider, and
+    # `HTTP_MAX_KEEPALIVE_CONNECTIONS` caps how many idle connections are kept open for reuse.
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    # Seconds an idle keep-alive connection is kept before it is closed.
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    # Enable HTTP/2 for provider calls (requires the optional `h2` package).
+    HTTP_HTTP2: bool = False
+    # Overall timeout (seconds) for read/write/pool waits, and a separate connect timeout.
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+
+    # Outbound rate limiting, per provider HTTP pool ("google", "microsoft", "gmail", "graph", ...).
+    # Each pool gets a token bucket of `RATE_LIMITS[pool]` (JSON object) or
+    # `RATE_LIMIT_DEFAULT_RATE` requests per second, bursting up to `RATE_LIMIT_BURST_SECONDS`
+    # worth of requests. Throttled responses halve the rate (not below `RATE_LIMIT_MIN_RATE`)
+    # and pause the pool for their Retry-After; requests are resent up to
+    # `RATE_LIMIT_THROTTLE_RETRIES` times when Retry-After is at most
+    # `RATE_LIMIT_MAX_RETRY_AFTER_SECONDS` (503s only for idempotent requests). Rates must be
+    # positive; leave a limit out rather than setting it to 0.
+    RATE_LIMITS: dict[str, PositiveFloat] = {}
+    RATE_LIMIT_DEFAULT_RATE: PositiveFloat = 50.0
+    RATE_LIMIT_BURST_SECONDS: float = 1.0
+    RATE_LIMIT_MIN_RATE: PositiveFloat = 1.0
+    RATE_LIMIT_THROTTLE_RETRIES: int = 2
+    RATE_LIMIT_MAX_RETRY_AFTER_SECONDS: float = 30.0
+    # Optional additional limit per account and pool (requests per second), for provider quotas
+    # that apply per user; up to `RATE_LIMIT_MAX_ACCOUNTS` account buckets are kept.
+    RATE_LIMIT_ACCOUNT_RATE: PositiveFloat | None = None
+    RATE_LIMIT_MAX_ACCOUNTS: int = 10000
+
+    # Retries, hedging and circuit breaking of provider calls (defaults for every HTTP pool).
+    # Idempotent calls are attempted up to `HTTP_RETRY_MAX_ATTEMPTS` times with decorrelated
+    # jitter between `HTTP_RETRY_BASE_DELAY_SECONDS` and `HTTP_RETRY_MAX_DELAY_SECONDS`; calls
+    # that may have been processed (token exchanges) are only retried if they never reached the
+    # provider.
+    HTTP_RETRY_MAX_ATTEMPTS: int = 3
+    HTTP_RETRY_BASE_DELAY_SECONDS: float = 0.05
+    HTTP_RETRY_MAX_DELAY_SECONDS: float = 1.0
+    # When set (e.g. 0.95), an idempotent call still running after that latency percentile of its
+    # endpoint is sent a second time and the first answer wins; never earlier than
+    # `HTTP_HEDGE_MIN_DELAY_SECONDS`.
+    HTTP_HEDGE_PERCENTILE: float | None = None
+    HTTP_HEDGE_MIN_DELAY_SECONDS: float = 0.05
+    # An endpoint failing `CIRCUIT_BREAKER_FAILURE_THRESHOLD` times in a row fails fast for
+    # `CIRCUIT_BREAKER_RESET_SECONDS`, after which a single trial call decides whether it recovered.
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0
+    # Per-pool overrides of the settings above as a JSON object of objects, keyed by the
+    # lowercase setting name without any `HTTP_` prefix, e.g.
+    # {"microsoft": {"retry_max_attempts": 5, "circuit_breaker_reset_seconds": 60}}.
+    HTTP_RESILIENCE: dict[str, dict[str, float | int | None]] = {}
+
+    # Local OIDC id_token verification.
+    # Provider signing keys (JWKS) are cached for `OIDC_JWKS_TTL_SECONDS`; a token with an unknown
+    # key id triggers a refetch at most every `OIDC_JWKS_MIN_REFETCH_SECONDS`.
+    # `OIDC_CLOCK_SKEW_SECONDS` is the tolerance applied to `exp`/`nbf` checks.
+    OIDC_JWKS_TTL_SECONDS: int = 3600
+    OIDC_JWKS_MIN_REFETCH_SECONDS: int = 60
+    OIDC_CLOCK_SKEW_SECONDS: int = 60
+
+    # Additional OIDC providers (e.g. per-tenant Microsoft or any standard OIDC issuer), as a
+    # JSON file holding a list of provider entries (see `OIDCProviderConfig`). Endpoints are
+    # resolved from each issuer's discovery document, cached for `OIDC_DISCOVERY_TTL_SECONDS`.
+    # The file is re-read on startup and by `POST /admin/providers/reload`.
+    OIDC_PROVIDERS_FILE: str | None = None
+    OIDC_DISCOVERY_TTL_SECONDS: int = 86400
+
+    # Background token refresh.
+    # When enabled, the API process runs the refresh engine as a lifespan task; it can also be
+    # run on its own with `python -m api.worker`. Tokens expiring within the horizon are refreshed
+    # every interval, with at most `TOKEN_REFRESH_CONCURRENCY` provider calls in flight and
+    # results written back `TOKEN_REFRESH_BATCH_SIZE` rows at a time.
+    TOKEN_REFRESH_ENABLED: bool = False
+    TOKEN_REFRESH_HORIZON_SECONDS: int = 600
+    TOKEN_REFRESH_INTERVAL_SECONDS: float = 60.0
+    TOKEN_REFRESH_CONCURRENCY: int = 10
+    TOKEN_REFRESH_BATCH_SIZE: int = 100
+    # A token whose background refresh failed is retried after `TOKEN_REFRESH_RETRY_BASE_SECONDS`,
+    # doubling with each further failure up to `TOKEN_REFRESH_RETRY_MAX_SECONDS`. One whose
+    # refresh token the provider rejects (`invalid_grant`) is not retried until the next login.
+    TOKEN_REFRESH_RETRY_BASE_SECONDS: PositiveFloat = 60.0
+    TOKEN_REFRESH_RETRY_MAX_SECONDS: PositiveFloat = 3600.0
+    # On PostgreSQL, serialise refreshes of an account (on-demand and sweeps) across processes
+    # with an advisory lock keyed on `user_mail_account_id` (within a process they are always
+    # coalesced).
+    TOKEN_REFRESH_ADVISORY_LOCK: bool = False
+    # Write refresh results behind (see `api.tokens.write_behind`): coalesced per token for up to
+    # `TOKEN_WRITE_BEHIND_WINDOW_SECONDS` or `TOKEN_WRITE_BEHIND_MAX_ROWS` tokens, then written
+    # with one statement and commit. Refreshes under `TOKEN_REFRESH_ADVISORY_LOCK` are always
+    # written before the lock is released.
+    TOKEN_WRITE_BEHIND_ENABLED: bool = False
+    TOKEN_WRITE_BEHIND_WINDOW_SECONDS: float = 0.05
+    TOKEN_WRITE_BEHIND_MAX_ROWS: int = 500
+
+    # In-process cache of valid access tokens served by the token-vending endpoint.
+    # Entries are evicted least-recently-used beyond `TOKEN_CACHE_MAX_SIZE`, and expire
+    # `TOKEN_MIN_TTL_SECONDS` before the token itself, at which point it is refreshed.
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    TOKEN_MIN_TTL_SECONDS: int = 60
+
+    # Mail API access. Individual calls per account are collected for up to
+    # `MAIL_BATCH_WINDOW_SECONDS` and sent as one Gmail batch / Graph `$batch` request of at most
+    # the given size (Gmail allows 100 but recommends 50; Graph allows 20).
+    GMAIL_API_URL: str = "https://gmail.googleapis.com"
+    GMAIL_BATCH_URL: str = "https://www.googleapis.com/batch/gmail/v1"
+    GRAPH_API_URL: str = "https://graph.microsoft.com/v1.0"
+    GMAIL_BATCH_SIZE: int = 50
+    GRAPH_BATCH_SIZE: int = 20
+    MAIL_BATCH_WINDOW_SECONDS: float = 0.01
+    # Changes requested per page by incremental mailbox sync (Gmail history / Graph delta).
+    MAIL_SYNC_PAGE_SIZE: int = 500
+
+    # Rows per batch for bulk account export/import (server-side cursor fetch size and
+    # multi-row upsert size).
+    TRANSFER_BATCH_SIZE: int = 1000
+
+    # Serve Prometheus metrics at `/metrics`. For multi-process servers also set the
+    # `PROMETHEUS_MULTIPROC_DIR` environment variable (see `api.core.metrics`).
+    METRICS_ENABLED: bool = True
+
+    # Slow-request profiler (off by default). A `PROFILER_SAMPLE_RATE` share of requests is
+    # profiled by sampling its task (running stack or await chain) every
+    # `PROFILER_INTERVAL_SECONDS`; the profiles of those taking at least
+    # `PROFILER_SLOW_THRESHOLD_SECONDS` are kept, newest `PROFILER_MAX_PROFILES` only, at most
+    # `PROFILER_MAX_SAMPLES` samples each.
+    # Served as folded stacks by `GET /admin/profiles`.
+    PROFILER_ENABLED: bool = False
+    PROFILER_SAMPLE_RATE: float = 0.01
+    PROFILER_INTERVAL_SECONDS: float = 0.005
+    PROFILER_SLOW_THRESHOLD_SECONDS: float = 1.0
+    PROFILER_MAX_PROFILES: int = 50
+    PROFILER_MAX_SAMPLES: int = 10000
+
+    # Cold-start behaviour (serverless deployments). The database engine is always created on
+    # first use; with `LAZY_INIT` the provider HTTP clients are too, instead of on startup.
+    # `WARMUP_ON_STARTUP` opens a database connection and the provider connections during
+    # startup (see `api.warmup`); `POST /admin/warmup` does the same on demand.
+    LAZY_INIT: bool = False
+    WARMUP_ON_STARTUP: bool = False
+
+    # Cross-node cache invalidation (PostgreSQL only, see `api.core.invalidation`). Account
+    # writes NOTIFY `CACHE_INVALIDATION_CHANNEL`, and each API process LISTENs on one dedicated
+    # connection to evict its cached entries for that account. LISTEN does not work through a
+    # transaction-pooling PgBouncer: point `CACHE_INVALIDATION_DATABASE_URL` at the database
+    # directly in that case (defaults to `DATABASE_URL`). The connection is pinged every
+    # `CACHE_INVALIDATION_PING_SECONDS`; reconnects back off up to
+    # `CACHE_INVALIDATION_RECONNECT_MAX_SECONDS`.
+    CACHE_INVALIDATION_ENABLED: bool = False
+    CACHE_INVALIDATION_CHANNEL: str = "account_changes"
+    CACHE_INVALIDATION_DATABASE_URL: str | None = None
+    CACHE_INVALIDATION_PING_SECONDS: float = 30.0
+    CACHE_INVALIDATION_RECONNECT_MAX_SECONDS: float = 30.0
+
+    # Authentication audit log (`auth_events`, see `api.core.audit`). Events are queued in memory,
+    # at most `AUDIT_QUEUE_MAX_SIZE`, and written in the background in batches of up to
+    # `AUDIT_BATCH_SIZE`, waiting at most `AUDIT_FLUSH_INTERVAL_SECONDS` to fill a batch.
+    # `AUDIT_QUEUE_POLICY` decides what happens when the queue is full: drop the new event
+    # ("drop_newest"), drop the oldest queued one ("drop_oldest"), or make the request wait for
+    # room ("block"). On PostgreSQL monthly partitions are created `AUDIT_PARTITION_MONTHS_AHEAD`
+    # months ahead, and `python -m api.cli audit-partitions` drops those older than
+    # `AUDIT_RETENTION_DAYS` (kept forever when unset).
+    AUDIT_ENABLED: bool = True
+    AUDIT_QUEUE_MAX_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    AUDIT_QUEUE_POLICY: Literal["drop_newest", "drop_oldest", "block"] = "drop_newest"
+    AUDIT_PARTITION_MONTHS_AHEAD: int = 2
+    AUDIT_RETENTION_DAYS: int | None = None
+
+    # Durable outbound mail queue (`mail_send_jobs`, see `api.mail.send_queue`). Workers claim up
+    # to `MAIL_SEND_BATCH_SIZE` due jobs at a time (polling every `MAIL_SEND_POLL_SECONDS` when
+    # idle) and hold each for `MAIL_SEND_LEASE_SECONDS`, after which a job left unfinished by a
+    # crashed worker is claimed again. Retryable failures back off exponentially from
+    # `MAIL_SEND_RETRY_BASE_SECONDS` up to `MAIL_SEND_RETRY_MAX_SECONDS`; a job still failing
+    # after `MAIL_SEND_MAX_ATTEMPTS` attempts is dead-lettered. At most
+    # `MAIL_SEND_ACCOUNT_CONCURRENCY` jobs of an account are in flight or waiting on a retry at
+    # any time, taken in enqueue order: 1 sends each account's messages strictly in order.
+    # `MAIL_SEND_WORKER_ENABLED` also runs a worker inside each API process.
+    MAIL_SEND_WORKER_ENABLED: bool = False
+    MAIL_SEND_BATCH_SIZE: PositiveInt = 50
+    MAIL_SEND_POLL_SECONDS: float = 1.0
+    MAIL_SEND_LEASE_SECONDS: float = 300.0
+    MAIL_SEND_MAX_ATTEMPTS: PositiveInt = 8
+    MAIL_SEND_RETRY_BASE_SECONDS: float = 30.0
+    MAIL_SEND_RETRY_MAX_SECONDS: float = 3600.0
+    MAIL_SEND_ACCOUNT_CONCURRENCY: PositiveInt = 1
+
     # Pydantic model configuration.
     # This specifies that settings should be loaded from a `.env` file if present.
     model_config = SettingsConfigDict(env_file=".env")
 
 # Create an instance of the Settings class.
 # This instance will automatically load the configured environment variables.
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,16 +1,113 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import logging
+import uuid
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from api.core.config import settings
+from api.core.metrics import timed_pool
+
+logger = logging.getLogger(__name__)
+
+_engine: AsyncEngine | None = None
+_replica_engine: AsyncEngine | None = None
+
+
+# Unique prepared statement names: behind PgBouncer in transaction mode consecutive
+# transactions may run on different server connections, where asyncpg's default names clash.
+def _prepared_statement_name() -> str:
+    return f"__asyncpg_{uuid.uuid4()}__"
+
 
-# Create an asynchronous SQLAlchemy engine.
+# Engine keyword arguments for the connection strategy selected in settings (`DB_POOL_*`,
+# `DB_PGBOUNCER`). Either pool records how long each checkout waits (`db_pool_checkout_seconds`);
+# with "null" that is the time to open a connection.
+def engine_options(url: str) -> dict:
+    if settings.DB_POOL_MODE == "null":
+        options = {"poolclass": timed_pool(NullPool)}
+    else:
+        options = {
+            "poolclass": timed_pool(AsyncAdaptedQueuePool),
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        }
+
+    if settings.DB_PGBOUNCER:
+        if make_url(url).drivername == "postgresql+asyncpg":
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": _prepared_statement_name,
+            }
+        else:
+            logger.warning("DB_PGBOUNCER only applies to postgresql+asyncpg; ignoring it")
+    return options
+
+
+# Returns the asynchronous SQLAlchemy engine, creating it on first use.
 # This engine is responsible for connecting to the database specified in DATABASE_URL from settings.
-# The `create_async_engine` function enables asynchronous database operations.
-engine = create_async_engine(settings.DATABASE_URL)
+# Creating it lazily keeps the database driver and dialect imports (and the pool) out of the
+# import of the app, which every serverless cold start pays for.
+def get_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            settings.DATABASE_URL, **engine_options(settings.DATABASE_URL)
+        )
+    return _engine
+
+
+# Returns the engine of the read replica (`DATABASE_REPLICA_URL`), creating it on first use,
+# or None when no replica is configured. It uses the same connection strategy as the primary.
+# Which reads go to it is decided by `api.core.replica.read_router`.
+def get_replica_engine() -> AsyncEngine | None:
+    global _replica_engine
+    if _replica_engine is None and settings.DATABASE_REPLICA_URL:
+        _replica_engine = create_async_engine(
+            settings.DATABASE_REPLICA_URL, **engine_options(settings.DATABASE_REPLICA_URL)
+        )
+    return _replica_engine
+
+
+# Closes the pooled connections (called on app shutdown), so an instance going away does not
+# leave its connections for the server to time out. The engines stay usable afterwards.
+async def dispose_engine() -> None:
+    for engine in (_engine, _replica_engine):
+        if engine is not None:
+            await engine.dispose()
+
+
+# `engine` stays importable as a module attribute; it is created when first accessed.
+def __getattr__(name: str):
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Session maker binding itself to an engine (from `engine_getter`) when the first session is
+# opened.
+class LazySessionMaker(async_sessionmaker):
+    def __init__(self, engine_getter=get_engine, **kw):
+        super().__init__(**kw)
+        self.engine_getter = engine_getter
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=self.engine_getter())
+        return super().__call__(**local_kw)
+
 
 # Create an asynchronous session maker.
 # `async_sessionmaker` configures a factory for new AsyncSession objects.
 # `autocommit=False` and `autoflush=False` ensure that transactions are managed explicitly.
-# `bind=engine` links this session maker to our asynchronous database engine.
-SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The engine is bound on first use (see `LazySessionMaker`).
+SessionLocal = LazySessionMaker(autocommit=False, autoflush=False)
+
+# Session maker for the read replica; only used when one is configured.
+ReplicaSessionLocal = LazySessionMaker(get_replica_engine, autocommit=False, autoflush=False)
 
 
 # Dependency for getting an asynchronous database session.
@@ -28,3 +125,9 @@ async def get_db():
             # releasing the database connection.
             await session.close()
 
+
+# Dependency returning the session factory itself.
+# Used by endpoints that open their own sessions, such as streaming responses whose body
+# is produced after the request's dependencies have been cleaned up.
+def get_session_factory() -> async_sessionmaker:
+    return SessionLocal
@@ -0,0 +1,14 @@
+import secrets
+
+from fastapi import Header, HTTPException
+
+from api.core.config import settings
+
+
+# Dependency guarding internal endpoints with a shared API key sent as `X-API-Key`.
+# Endpoints using it are unavailable until `INTERNAL_API_KEY` is configured.
+async def require_api_key(x_api_key: str | None = Header(default=None)) -> None:
+    if not settings.INTERNAL_API_KEY:
+        raise HTTPException(status_code=403, detail="Internal API is not enabled")
+    if x_api_key is None or not secrets.compare_digest(x_api_key, settings.INTERNAL_API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid API key")
@@ -0,0 +1,80 @@
+import functools
+import importlib.util
+import logging
+import ssl
+
+import httpx
+
+from api.core.config import settings
+from api.core.metrics import InstrumentedTransport
+from api.core.ratelimit import RateLimitedTransport
+from api.core.resilience import ResilientTransport
+
+logger = logging.getLogger(__name__)
+
+
+# TLS context shared by every provider client. Loading the CA bundle is the bulk of a client's
+# construction cost, so it is paid once per process rather than once per provider.
+@functools.cache
+def _ssl_context() -> ssl.SSLContext:
+    return httpx.create_ssl_context()
+
+
+# Holds one long-lived `httpx.AsyncClient` per OAuth provider.
+# Reusing a client keeps its connection pool warm, so repeated calls to the same provider
+# skip the TCP/TLS handshake instead of paying it on every token exchange or userinfo lookup.
+class HTTPClientPool:
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    # Builds a new client using the limits, timeouts and HTTP/2 flag from settings.
+    # Every request goes through retries, hedging and circuit breaking (`api.core.resilience`),
+    # and each attempt through the shared per-provider rate limiter (`api.core.ratelimit`) and
+    # the request metrics (`api.core.metrics`).
+    def _build_client(self, provider: str) -> httpx.AsyncClient:
+        http2 = settings.HTTP_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP_HTTP2 is enabled but 'h2' is not installed; using HTTP/1.1")
+            http2 = False
+
+        network = httpx.AsyncHTTPTransport(
+            verify=_ssl_context(),
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        transport = InstrumentedTransport(network, provider)
+        return httpx.AsyncClient(
+            transport=ResilientTransport(RateLimitedTransport(transport, provider), provider),
+            timeout=httpx.Timeout(
+                settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+            ),
+        )
+
+    # Opens clients for the given providers ahead of time (called from the app lifespan,
+    # unless `LAZY_INIT` is set).
+    def open(self, providers: list[str]) -> None:
+        for provider in providers:
+            self.get(provider)
+
+    # Returns the client for a provider, creating it on first use.
+    # Lazy creation keeps the pool usable outside the FastAPI lifespan (scripts, workers, tests).
+    def get(self, provider: str) -> httpx.AsyncClient:
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._build_client(provider)
+            self._clients[provider] = client
+        return client
+
+    # Closes every client and drops it from the pool (called on app shutdown).
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+# Process-wide pool shared by all OAuth provider clients.
+http_clients = HTTPClientPool()
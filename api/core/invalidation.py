@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Hashable
+
+from sqlalchemy import Text, cast, func, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.core.cache import TTLCache
+from api.core.config import settings
+from api.core.metrics import count_cache_invalidation
+
+logger = logging.getLogger(__name__)
+
+NOTIFY = text("SELECT pg_notify(:channel, :payload)")
+
+# Payload asking every node to drop all cached entries (bulk writes).
+FLUSH_PAYLOAD = json.dumps({"flush": True})
+
+
+# Whether writes through `session` publish invalidations with NOTIFY.
+def publishes_invalidations(session: AsyncSession) -> bool:
+    return (
+        settings.CACHE_INVALIDATION_ENABLED
+        and session.get_bind().dialect.name == "postgresql"
+    )
+
+
+# SQL expression notifying that the account with `account_id` and `email` (columns of the row
+# being written) changed, to be selected by the writing statement itself so publishing costs
+# no extra round trip. Notifications are sent in the writing transaction: PostgreSQL delivers
+# them to the listening nodes only once it commits, and drops them on rollback.
+def account_change_notification(account_id, email):
+    payload = func.json_build_object("account_id", account_id, "email", email)
+    return func.pg_notify(settings.CACHE_INVALIDATION_CHANNEL, cast(payload, Text))
+
+
+# Notifies every node to flush its caches, for writes touching too many accounts to list.
+async def publish_flush(session: AsyncSession) -> None:
+    if publishes_invalidations(session):
+        await session.execute(
+            NOTIFY, {"channel": settings.CACHE_INVALIDATION_CHANNEL, "payload": FLUSH_PAYLOAD}
+        )
+
+
+# Evicts committed account changes (account ids and emails) from this process's caches when the
+# database cannot NOTIFY: without LISTEN/NOTIFY (SQLite in development and tests) there is a
+# single process caching, so there is nobody else to tell. Call after the commit.
+def evict_unpublished(session: AsyncSession, *accounts: Hashable) -> None:
+    if settings.CACHE_INVALIDATION_ENABLED and not publishes_invalidations(session):
+        invalidation_bus.evict(*(str(account) for account in accounts))
+
+
+# asyncpg DSN of the listener connection. LISTEN needs a session-pooled or direct connection,
+# so behind a transaction-pooling PgBouncer set `CACHE_INVALIDATION_DATABASE_URL`.
+def listener_dsn() -> str:
+    url = make_url(settings.CACHE_INVALIDATION_DATABASE_URL or settings.DATABASE_URL)
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+# Cross-node invalidation of in-process caches (`CACHE_INVALIDATION_ENABLED`, PostgreSQL only).
+# Repository writes publish the changed account on `CACHE_INVALIDATION_CHANNEL`; every node
+# keeps one dedicated asyncpg connection LISTENing there and evicts the account's entries
+# (by account id and by email) from the caches registered with `watch`.
+# Notifications sent while a node is not listening are lost, so the watched caches are flushed
+# whenever the connection drops and again once it is re-established. A connection that stops
+# answering the `CACHE_INVALIDATION_PING_SECONDS` ping counts as dropped; reconnects back off
+# up to `CACHE_INVALIDATION_RECONNECT_MAX_SECONDS`.
+class InvalidationBus:
+    def __init__(self):
+        self._caches: list[TTLCache] = []
+        self._task: asyncio.Task | None = None
+        self.connected = False
+        self._listened = False
+        self._lost = asyncio.Event()
+        self.reconnects = 0
+
+    def watch(self, cache: TTLCache) -> None:
+        self._caches.append(cache)
+
+    def evict(self, *keys: str) -> None:
+        for cache in self._caches:
+            for key in keys:
+                cache.pop(key)
+        count_cache_invalidation("account")
+
+    def flush(self) -> None:
+        for cache in self._caches:
+            cache.clear()
+        count_cache_invalidation("flush")
+
+    # asyncpg notification callback.
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            change = json.loads(payload)
+            if change.get("flush"):
+                self.flush()
+            else:
+                self.evict(change["account_id"], change["email"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning("Unreadable cache invalidation %r, flushing caches", payload)
+            self.flush()
+
+    def _disconnected(self) -> None:
+        if self.connected:
+            self.connected = False
+            self.flush()
+
+    def _on_termination(self, connection) -> None:
+        self._disconnected()
+        self._lost.set()
+
+    async def _listen(self, connect) -> None:
+        self._lost = asyncio.Event()
+        self._listened = False
+        connection = await connect(listener_dsn())
+        lost = asyncio.ensure_future(self._lost.wait())
+        try:
+            connection.add_termination_listener(self._on_termination)
+            await connection.add_listener(
+                settings.CACHE_INVALIDATION_CHANNEL, self._on_notification
+            )
+            # Anything cached before this point may have missed notifications.
+            self.flush()
+            self.connected = self._listened = True
+            logger.info("Listening for cache invalidations")
+            # `asyncio.wait` rather than `wait_for`, which can swallow a cancellation (`stop`)
+            # racing with the connection loss on Python 3.11.
+            ping = settings.CACHE_INVALIDATION_PING_SECONDS
+            while True:
+                done, _ = await asyncio.wait({lost}, timeout=ping)
+                if done:
+                    raise ConnectionError("listener connection closed")
+                async with asyncio.timeout(ping):
+                    await connection.fetchval("SELECT 1")
+        finally:
+            lost.cancel()
+            self._disconnected()
+            if not connection.is_closed():
+                connection.terminate()
+
+    # Listens until cancelled, reconnecting after failures: promptly when a working connection
+    # dropped, with exponential backoff while connecting keeps failing. `connect` defaults to
+    # `asyncpg.connect`, imported here so that importing the app does not load the driver.
+    async def run_forever(self, connect: Callable[[str], Awaitable] | None = None) -> None:
+        if connect is None:
+            import asyncpg
+
+            connect = asyncpg.connect
+        delay = 0.0
+        while True:
+            try:
+                await self._listen(connect)
+            except Exception as e:
+                logger.warning("Cache invalidation listener failed, reconnecting: %s", e)
+            self.reconnects += 1
+            if self._listened:
+                delay = 0.1
+            else:
+                delay = min(max(delay * 2, 0.1), settings.CACHE_INVALIDATION_RECONNECT_MAX_SECONDS)
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+# Process-wide invalidation bus; `api.tokens.service` registers the access token cache.
+invalidation_bus = InvalidationBus()
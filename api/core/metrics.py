@@ -0,0 +1,234 @@
+import functools
+import os
+import time
+
+import httpx
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Prometheus metrics of the hot paths.
+# With several worker processes, set `PROMETHEUS_MULTIPROC_DIR` to an empty, writable directory
+# (before the app is imported): every process then records into memory-mapped files there and
+# `/metrics` aggregates them. Without it, the metrics of the serving process are exported.
+# Recording stays cheap: labelled children are resolved once and cached, so a measurement is a
+# couple of clock reads plus a lock-protected add.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CALLBACK_PHASE_SECONDS = Histogram(
+    "oauth_callback_phase_seconds",
+    "Duration of each phase of the OAuth callback (token_exchange, id_token, userinfo, upsert, "
+    "total).",
+    ["provider", "phase"],
+    buckets=LATENCY_BUCKETS,
+)
+CALLBACK_PHASE_ERRORS = Counter(
+    "oauth_callback_phase_errors_total",
+    "OAuth callback phases that raised an error.",
+    ["provider", "phase"],
+)
+CALLBACKS_IN_PROGRESS = Gauge(
+    "oauth_callbacks_in_progress",
+    "OAuth callbacks currently being processed.",
+    ["provider"],
+    multiprocess_mode="livesum",
+)
+PROVIDER_REQUEST_SECONDS = Histogram(
+    "provider_request_seconds",
+    "Duration of outbound HTTP requests to providers, up to the response headers.",
+    ["provider"],
+    buckets=LATENCY_BUCKETS,
+)
+PROVIDER_RESPONSES = Counter(
+    "provider_responses_total",
+    "Outbound provider HTTP responses by status code ('error' when no response was received).",
+    ["provider", "status"],
+)
+PROVIDER_REQUESTS_IN_PROGRESS = Gauge(
+    "provider_requests_in_progress",
+    "Outbound provider HTTP requests currently in flight.",
+    ["provider"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting to check a connection out of the database pool.",
+    buckets=DB_BUCKETS,
+)
+DB_COMMIT_SECONDS = Histogram(
+    "db_commit_seconds",
+    "Duration of repository commits.",
+    ["operation"],
+    buckets=DB_BUCKETS,
+)
+DB_READS = Counter(
+    "db_reads_total",
+    "Repository reads by where they ran: primary, replica, or failover (the primary, after the "
+    "replica failed).",
+    ["target"],
+)
+CACHE_INVALIDATIONS = Counter(
+    "cache_invalidations_total",
+    "In-process cache invalidations applied by this node: one account, or a full flush.",
+    ["kind"],
+)
+AUDIT_EVENTS = Counter(
+    "audit_events_total",
+    "Authentication audit events by outcome: written, dropped (queue full) or failed (write error).",
+    ["outcome"],
+)
+MAIL_SEND_JOBS = Counter(
+    "mail_send_jobs_total",
+    "Outbound mail send attempts by outcome: sent, retried or dead (dead-lettered).",
+    ["outcome"],
+)
+
+
+@functools.cache
+def _phase_children(provider: str, phase: str):
+    return (
+        CALLBACK_PHASE_SECONDS.labels(provider, phase),
+        CALLBACK_PHASE_ERRORS.labels(provider, phase),
+    )
+
+
+@functools.cache
+def _callbacks_in_progress(provider: str):
+    return CALLBACKS_IN_PROGRESS.labels(provider)
+
+
+# Times one phase of a callback; an exception leaving the block also counts as a phase error.
+# A plain class rather than `contextlib.contextmanager`, which costs a generator per use.
+class callback_phase:
+    __slots__ = ("histogram", "errors", "started")
+
+    def __init__(self, provider: str, phase: str):
+        self.histogram, self.errors = _phase_children(provider, phase)
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+        if exc_type is not None:
+            self.errors.inc()
+
+
+# Marks a callback as in progress; returns its start time for `callback_finished`.
+def callback_started(provider: str) -> float:
+    _callbacks_in_progress(provider).inc()
+    return time.perf_counter()
+
+
+# Records the total duration of a callback and marks it as no longer in progress.
+def callback_finished(provider: str, started: float) -> None:
+    _phase_children(provider, "total")[0].observe(time.perf_counter() - started)
+    _callbacks_in_progress(provider).dec()
+
+
+# Times a repository commit.
+class timed_commit:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, operation: str):
+        self.histogram = DB_COMMIT_SECONDS.labels(operation)
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+@functools.cache
+def _db_reads(target: str):
+    return DB_READS.labels(target)
+
+
+# Counts a repository read routed to `target` (see `BaseRepository.read`).
+def count_db_read(target: str) -> None:
+    _db_reads(target).inc()
+
+
+# Counts a cache invalidation of `kind` ("account" or "flush", see `api.core.invalidation`).
+def count_cache_invalidation(kind: str) -> None:
+    CACHE_INVALIDATIONS.labels(kind).inc()
+
+
+# Counts `count` audit events that ended with `outcome` (see `api.core.audit`).
+def count_audit_events(outcome: str, count: int = 1) -> None:
+    AUDIT_EVENTS.labels(outcome).inc(count)
+
+
+# Counts `count` mail send attempts that ended with `outcome` (see `api.mail.send_queue`).
+def count_mail_send_jobs(outcome: str, count: int = 1) -> None:
+    MAIL_SEND_JOBS.labels(outcome).inc(count)
+
+
+# Returns a subclass of a SQLAlchemy pool class that records how long each checkout waits.
+@functools.cache
+def timed_pool(pool_class: type) -> type:
+    class TimedPool(pool_class):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+# httpx transport recording the latency, status code and concurrency of provider requests.
+# It sits directly on the network transport, so every attempt (retries, hedges) is counted.
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, provider: str):
+        self.transport = transport
+        self.provider = provider
+        self.seconds = PROVIDER_REQUEST_SECONDS.labels(provider)
+        self.in_progress = PROVIDER_REQUESTS_IN_PROGRESS.labels(provider)
+        self.responses: dict[int | str, Counter] = {}
+
+    def _count(self, status: int | str) -> None:
+        counter = self.responses.get(status)
+        if counter is None:
+            counter = PROVIDER_RESPONSES.labels(self.provider, str(status))
+            self.responses[status] = counter
+        counter.inc()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_progress.inc()
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self._count("error")
+            raise
+        finally:
+            self.in_progress.dec()
+            self.seconds.observe(time.perf_counter() - started)
+        self._count(response.status_code)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+# Renders the metrics exposition (aggregated across processes in multiprocess mode).
+def render_metrics() -> tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,199 @@
+import asyncio
+import collections
+import datetime
+import functools
+import itertools
+import random
+import sys
+import threading
+import time
+from typing import Callable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from api.core.config import settings
+
+
+# Name of a stack frame in folded output: "module:qualified.function".
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+# Folds a stack, outermost frame first, into the "a;b;c" form used by flamegraph tools.
+def fold_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# Leaf of a suspended task's stack: waiting on a future (database, provider, lock, sleep)...
+AWAITING = "<await>"
+# ...or ready to resume but queued behind other work on the event loop.
+READY = "<ready>"
+
+
+# Folds the await chain of a suspended task, from its coroutine down to the innermost Python
+# frame it is waiting in (futures and C or Cython coroutines below it have no frame).
+def fold_task(task: asyncio.Task) -> str:
+    names = []
+    awaited = task.get_coro()
+    while awaited is not None:
+        frame = (
+            getattr(awaited, "cr_frame", None)
+            or getattr(awaited, "gi_frame", None)
+            or getattr(awaited, "ag_frame", None)
+        )
+        if frame is None:
+            break
+        names.append(_frame_name(frame))
+        awaited = (
+            getattr(awaited, "cr_await", None)
+            or getattr(awaited, "gi_yieldfrom", None)
+            or getattr(awaited, "ag_await", None)
+        )
+    waiter = getattr(task, "_fut_waiter", None)
+    names.append(AWAITING if waiter is not None and not waiter.done() else READY)
+    return ";".join(names)
+
+
+# Stack samples of one request's task.
+# While the task runs, a sample is the event loop thread's stack, showing CPU-bound or blocking
+# work of this request. While it is suspended, a sample is its await chain ending in `AWAITING`
+# (time spent on the database, a provider or another wait, named by the frames above it) or
+# `READY` (time spent queued behind other requests on a busy loop). Work done for the request in
+# other tasks or in worker threads shows up as the await on it.
+class Profile:
+    def __init__(self, profile_id: int, method: str, path: str, task: asyncio.Task):
+        self.profile_id = profile_id
+        self.method = method
+        self.path = path
+        self.task = task
+        self.loop = task.get_loop()
+        self.thread_id = threading.get_ident()
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.duration_seconds = 0.0
+        self.samples: collections.Counter[str] = collections.Counter()
+        self.sample_count = 0
+
+    def add(self, stack: str, max_samples: int) -> None:
+        if self.sample_count < max_samples:
+            self.samples[stack] += 1
+            self.sample_count += 1
+
+    # Takes one sample: the loop thread's stack if this request's task is the one running on
+    # it, otherwise the task's await chain. `frames` is `sys._current_frames()`, read lazily.
+    def sample(self, frames: Callable[[], dict], max_samples: int) -> None:
+        if self.task.done():
+            return
+        if asyncio.current_task(self.loop) is self.task:
+            frame = frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = fold_stack(frame)
+        else:
+            stack = fold_task(self.task)
+        self.add(stack, max_samples)
+
+    # Folded stacks ("frame;frame;frame count" per line), for flamegraph.pl or speedscope.
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration_seconds, 6),
+            "samples": self.sample_count,
+        }
+
+
+# Background thread sampling the tasks of profiled requests.
+# It only wakes up while at least one profile is active, so it costs nothing otherwise.
+class StackSampler:
+    def __init__(self):
+        self._active: dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, profile: Profile) -> None:
+        with self._lock:
+            self._active[profile.profile_id] = profile
+            self._wakeup.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="stack-sampler", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self, profile: Profile) -> None:
+        with self._lock:
+            self._active.pop(profile.profile_id, None)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                profiles = list(self._active.values())
+                if not profiles:
+                    self._wakeup.clear()
+                    continue
+
+            frames = functools.cache(sys._current_frames)
+            for profile in profiles:
+                profile.sample(frames, settings.PROFILER_MAX_SAMPLES)
+            del frames
+            time.sleep(settings.PROFILER_INTERVAL_SECONDS)
+
+
+# Ring buffer of the most recent slow-request profiles; memory stays bounded however many
+# slow requests arrive.
+class ProfileStore:
+    def __init__(self, max_profiles: int):
+        self._profiles: collections.deque[Profile] = collections.deque(maxlen=max_profiles)
+
+    def add(self, profile: Profile) -> None:
+        self._profiles.append(profile)
+
+    def list(self) -> list[Profile]:
+        return list(reversed(self._profiles))
+
+    def get(self, profile_id: int) -> Profile | None:
+        return next((p for p in self._profiles if p.profile_id == profile_id), None)
+
+    def clear(self) -> None:
+        self._profiles.clear()
+
+
+stack_sampler = StackSampler()
+profile_store = ProfileStore(settings.PROFILER_MAX_PROFILES)
+_profile_ids = itertools.count(1)
+
+
+# ASGI middleware profiling a sampled share of HTTP requests (see `PROFILER_*` settings) and
+# keeping the profiles of slow ones in `profile_store`. Unsampled requests pay one random draw.
+class SlowRequestProfiler:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or random.random() >= settings.PROFILER_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(
+            next(_profile_ids), scope["method"], scope["path"], asyncio.current_task()
+        )
+        stack_sampler.start(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stack_sampler.stop(profile)
+            profile.duration_seconds = time.perf_counter() - started
+            if profile.duration_seconds >= settings.PROFILER_SLOW_THRESHOLD_SECONDS:
+                profile_store.add(profile)
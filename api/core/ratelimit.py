@@ -0,0 +1,262 @@
+import asyncio
+import contextlib
+import email.utils
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Iterator
+
+import httpx
+
+from api.core.cache import TTLCache
+from api.core.config import settings
+from api.core.resilience import IDEMPOTENT_METHODS
+
+logger = logging.getLogger(__name__)
+
+
+# Scheduling priority of outbound provider calls; lower values are served first.
+class Priority(IntEnum):
+    # A user is waiting on the call (login callback).
+    INTERACTIVE = 0
+    # Internal API calls (token vending, mail operations).
+    NORMAL = 1
+    # Background refresh and sync traffic.
+    BACKGROUND = 2
+
+
+# Priority and (optional) account of the provider calls made in the current context.
+# Set with `call_context()`; inherited by tasks started from that context. A single request can
+# also carry them as the httpx request extensions "priority" and "rate_limit_account", which is
+# what async generators should use, since they cannot scope context variables across yields.
+request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.NORMAL)
+rate_limit_account: ContextVar[str | None] = ContextVar("rate_limit_account", default=None)
+
+
+# Runs the enclosed provider calls with the given priority and/or account.
+@contextlib.contextmanager
+def call_context(
+    priority: Priority | None = None, account: str | None = None
+) -> Iterator[None]:
+    tokens = []
+    if priority is not None:
+        tokens.append((request_priority, request_priority.set(priority)))
+    if account is not None:
+        tokens.append((rate_limit_account, rate_limit_account.set(account)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+# Parses a `Retry-After` header (seconds or an HTTP date) into seconds from now.
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Token bucket with a priority queue of waiting callers.
+# Tokens refill at `rate` per second up to `burst`. When none is available, callers queue and are
+# released in priority order (then arrival order) as tokens refill. The rate adapts to the
+# provider: each throttled response (429/503) halves it, down to `min_rate`, and pauses the
+# bucket for the response's `Retry-After`; successful calls raise it back gradually (AIMD).
+class TokenBucket:
+    def __init__(self, name: str, rate: float, burst: float, min_rate: float):
+        if rate <= 0 or min_rate <= 0:
+            raise ValueError(f"Rate limit of {name!r} must be positive")
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self.calls = 0
+        self.queued = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until a token can be handed out.
+    def _delay(self) -> float:
+        self._refill()
+        delay = max(0.0, self.blocked_until - time.monotonic())
+        if self.tokens < 1:
+            delay = max(delay, (1 - self.tokens) / self.rate)
+        return delay
+
+    # Waits for a token. Returns the seconds spent waiting.
+    async def acquire(self, priority: Priority = Priority.NORMAL) -> float:
+        self.calls += 1
+        if not self._waiters and self._delay() == 0:
+            self.tokens -= 1
+            return 0.0
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.queued += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            if self._waiters[0][2].done():  # cancelled caller
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            self.tokens -= 1
+            future.set_result(None)
+
+    def on_throttled(self, retry_after: float | None) -> None:
+        self.throttled += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+        logger.warning(
+            "%s throttled the client; rate lowered to %.2f/s, paused %.1fs",
+            self.name,
+            self.rate,
+            pause,
+        )
+
+    def on_success(self) -> None:
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def stats(self) -> dict:
+        waited = self.queued or 1
+        return {
+            "name": self.name,
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "queue_depth": sum(1 for _, _, future in self._waiters if not future.done()),
+            "calls": self.calls,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "avg_wait_seconds": round(self.total_wait / waited, 6),
+            "max_wait_seconds": round(self.max_wait, 6),
+        }
+
+
+# Token buckets for every provider HTTP pool, plus optional per-account buckets.
+# Provider rates come from `RATE_LIMITS` (requests per second by pool name), falling back to
+# `RATE_LIMIT_DEFAULT_RATE`; per-account buckets are used when `RATE_LIMIT_ACCOUNT_RATE` is set.
+class RateLimiter:
+    def __init__(self):
+        self._providers: dict[str, TokenBucket] = {}
+        self._accounts = TTLCache(settings.RATE_LIMIT_MAX_ACCOUNTS)
+
+    def _new_bucket(self, name: str, rate: float) -> TokenBucket:
+        return TokenBucket(
+            name, rate, rate * settings.RATE_LIMIT_BURST_SECONDS, settings.RATE_LIMIT_MIN_RATE
+        )
+
+    def provider_bucket(self, provider: str) -> TokenBucket:
+        bucket = self._providers.get(provider)
+        if bucket is None:
+            rate = settings.RATE_LIMITS.get(provider, settings.RATE_LIMIT_DEFAULT_RATE)
+            bucket = self._providers[provider] = self._new_bucket(provider, rate)
+        return bucket
+
+    def account_bucket(self, provider: str, account: str) -> TokenBucket:
+        key = (provider, account)
+        bucket = self._accounts.get(key)
+        if bucket is None:
+            bucket = self._new_bucket(f"{provider}:{account}", settings.RATE_LIMIT_ACCOUNT_RATE)
+        # Idle account buckets expire; refilling a new one is equivalent to an idle full one.
+        self._accounts.set(key, bucket, 3600)
+        return bucket
+
+    # Buckets a call to `provider` for `account` has to pass, account bucket first.
+    def buckets_for(self, provider: str, account: str | None = None) -> list[TokenBucket]:
+        buckets = [self.provider_bucket(provider)]
+        if account is not None and settings.RATE_LIMIT_ACCOUNT_RATE:
+            buckets.insert(0, self.account_bucket(provider, account))
+        return buckets
+
+    def stats(self) -> list[dict]:
+        return [bucket.stats() for bucket in self._providers.values()]
+
+    def reset(self) -> None:
+        self._providers.clear()
+        self._accounts.clear()
+
+
+# Process-wide rate limiter shared by all provider HTTP clients.
+rate_limiter = RateLimiter()
+
+
+# httpx transport that schedules every request through the rate limiter.
+# A throttled response (429/503) lowers the rate and pauses the provider for its `Retry-After`;
+# if that is at most `RATE_LIMIT_MAX_RETRY_AFTER_SECONDS`, the request is queued again, up to
+# `RATE_LIMIT_THROTTLE_RETRIES` times. A 429 rejects the request unprocessed, so it is resent
+# whatever the method. A 503 may come from a gateway after the provider acted on the request,
+# so it is only resent for idempotent requests (not token exchanges or refreshes, which could
+# redeem a code or rotating refresh token twice).
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, provider: str):
+        self.transport = transport
+        self.provider = provider
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        priority = request.extensions.get("priority", request_priority.get())
+        account = request.extensions.get("rate_limit_account", rate_limit_account.get())
+        idempotent = request.extensions.get("idempotent", request.method in IDEMPOTENT_METHODS)
+        attempt = 0
+        while True:
+            buckets = rate_limiter.buckets_for(self.provider, account)
+            for bucket in buckets:
+                await bucket.acquire(priority)
+            response = await self.transport.handle_async_request(request)
+
+            if response.status_code not in (429, 503):
+                for bucket in buckets:
+                    bucket.on_success()
+                return response
+
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            for bucket in buckets:
+                bucket.on_throttled(retry_after)
+            if (
+                attempt >= settings.RATE_LIMIT_THROTTLE_RETRIES
+                or (retry_after or 0) > settings.RATE_LIMIT_MAX_RETRY_AFTER_SECONDS
+                or (response.status_code == 503 and not idempotent)
+            ):
+                return response
+            attempt += 1
+            await response.aclose()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from typing import Hashable
+
+from sqlalchemy import text
+
+from api.core.cache import TTLCache
+from api.core.config import settings
+from api.core.database import get_replica_engine
+
+logger = logging.getLogger(__name__)
+
+# Replication lag in seconds; 0 once the replica has replayed everything it received, since
+# the last replay timestamp alone keeps ageing while the primary is idle.
+LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+# Decides whether a repository read may go to the read replica (`DATABASE_REPLICA_URL`).
+# Reads of an account written by this process within `REPLICA_READ_YOUR_WRITES_SECONDS` stay
+# on the primary, so a login is visible to the requests that follow it despite replication lag.
+# The replica is health-checked in the background every `REPLICA_HEALTH_CHECK_SECONDS` (reachable,
+# lag within `REPLICA_MAX_LAG_SECONDS`); a failed check or read takes it out of rotation until
+# a later check passes.
+class ReadRouter:
+    def __init__(self, max_accounts: int = 100000):
+        self._recent_writes = TTLCache(max_accounts)
+        self.healthy = True
+        self._checked_at = float("-inf")
+        self._check: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.DATABASE_REPLICA_URL is not None
+
+    # Records committed writes of `accounts` (emails or account ids, whichever reads key on).
+    def mark_written(self, *accounts: Hashable) -> None:
+        if not self.enabled:
+            return
+        for account in accounts:
+            self._recent_writes.set(
+                str(account), True, settings.REPLICA_READ_YOUR_WRITES_SECONDS
+            )
+
+    def use_replica(self, account: Hashable | None = None) -> bool:
+        if not self.enabled:
+            return False
+        if account is not None and self._recent_writes.get(str(account)) is not None:
+            return False
+        self._schedule_check()
+        return self.healthy
+
+    # Takes the replica out of rotation after a failed read; the next health check decides
+    # when it comes back.
+    def mark_failed(self, error: BaseException) -> None:
+        if self.healthy:
+            logger.warning("Read replica failed, reading from the primary: %s", error)
+        self.healthy = False
+        self._checked_at = time.monotonic()
+
+    def _schedule_check(self) -> None:
+        if self._check is not None and not self._check.done():
+            return
+        if time.monotonic() - self._checked_at < settings.REPLICA_HEALTH_CHECK_SECONDS:
+            return
+        self._checked_at = time.monotonic()
+        self._check = asyncio.get_running_loop().create_task(self.check())
+
+    async def _lag(self) -> float:
+        async with get_replica_engine().connect() as conn:
+            if conn.dialect.name == "postgresql":
+                return float((await conn.execute(LAG_QUERY)).scalar() or 0.0)
+            await conn.execute(text("SELECT 1"))
+            return 0.0
+
+    # Checks the replica now and updates whether reads may use it.
+    async def check(self) -> bool:
+        try:
+            lag = await asyncio.wait_for(self._lag(), settings.REPLICA_HEALTH_CHECK_SECONDS)
+        except Exception as e:
+            healthy, reason = False, f"health check failed: {e}"
+        else:
+            healthy = lag <= settings.REPLICA_MAX_LAG_SECONDS
+            reason = f"replication lag {lag:.1f}s"
+        if healthy != self.healthy:
+            logger.warning(
+                "Read replica %s (%s)", "back in rotation" if healthy else "out of rotation", reason
+            )
+        self.healthy = healthy
+        return healthy
+
+    # Cancels a running health check (called on shutdown).
+    async def aclose(self) -> None:
+        check, self._check = self._check, None
+        if check is not None and not check.done():
+            check.cancel()
+            await asyncio.gather(check, return_exceptions=True)
+
+    def reset(self) -> None:
+        self._recent_writes.clear()
+        self.healthy = True
+        self._checked_at = float("-inf")
+
+
+# Process-wide read routing policy used by `BaseRepository.read`.
+read_router = ReadRouter()
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Iterator, NamedTuple
+
+import httpx
+
+from api.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Methods that can be sent twice without changing the outcome. Other requests can opt in (or
+# out) with the httpx request extension "idempotent".
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Server errors worth another attempt. 429 and 503 are throttling, handled (and already
+# retried) by the rate limiter underneath.
+RETRYABLE_STATUS_CODES = frozenset({500, 502, 504})
+
+# Errors raised before the request reached the provider, so retrying is always safe.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Latency samples kept per endpoint, and how many are needed before hedging starts.
+LATENCY_WINDOW_SIZE = 200
+LATENCY_MIN_SAMPLES = 20
+
+
+# Retry, hedging and circuit breaker settings of one provider HTTP pool.
+class ResiliencePolicy(NamedTuple):
+    retry_max_attempts: int
+    retry_base_delay_seconds: float
+    retry_max_delay_seconds: float
+    hedge_percentile: float | None
+    hedge_min_delay_seconds: float
+    circuit_breaker_failure_threshold: int
+    circuit_breaker_reset_seconds: float
+
+
+# Returns the policy of a pool: the `HTTP_*`/`CIRCUIT_BREAKER_*` defaults with the pool's
+# `HTTP_RESILIENCE` overrides applied.
+def policy_for(provider: str) -> ResiliencePolicy:
+    policy = ResiliencePolicy(
+        retry_max_attempts=settings.HTTP_RETRY_MAX_ATTEMPTS,
+        retry_base_delay_seconds=settings.HTTP_RETRY_BASE_DELAY_SECONDS,
+        retry_max_delay_seconds=settings.HTTP_RETRY_MAX_DELAY_SECONDS,
+        hedge_percentile=settings.HTTP_HEDGE_PERCENTILE,
+        hedge_min_delay_seconds=settings.HTTP_HEDGE_MIN_DELAY_SECONDS,
+        circuit_breaker_failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        circuit_breaker_reset_seconds=settings.CIRCUIT_BREAKER_RESET_SECONDS,
+    )
+    return policy._replace(**settings.HTTP_RESILIENCE.get(provider, {}))
+
+
+# "Decorrelated jitter" backoff: each delay is drawn between the base and three times the
+# previous delay, capped. Spreads out retries of many callers that failed at the same moment.
+def backoff_delays(base: float, cap: float) -> Iterator[float]:
+    delay = base
+    while True:
+        delay = min(cap, random.uniform(base, delay * 3))
+        yield delay
+
+
+# Raised instead of calling an endpoint whose circuit breaker is open.
+class CircuitOpenError(httpx.TransportError):
+    def __init__(self, endpoint: str, retry_after: float, request: httpx.Request | None = None):
+        super().__init__(f"Circuit open for {endpoint}", request=request)
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+# Circuit breaker of one provider endpoint.
+# After `failure_threshold` consecutive failures (transport errors or 5xx answers) the circuit
+# opens and calls fail fast with CircuitOpenError for `reset_seconds`. Then it is half-open: a
+# single trial call goes through, closing the circuit on success and reopening it on failure.
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, endpoint: str, failure_threshold: int, reset_seconds: float):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.opened = 0
+        self.short_circuited = 0
+
+    # Admits a call or raises CircuitOpenError.
+    def before_call(self, request: httpx.Request | None = None) -> None:
+        if self.state == self.CLOSED:
+            return
+        remaining = self.opened_at + self.reset_seconds - time.monotonic()
+        if self.state == self.OPEN and remaining <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return
+        self.short_circuited += 1
+        raise CircuitOpenError(self.endpoint, max(remaining, 1.0), request=request)
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened += 1
+                logger.warning(
+                    "Circuit opened for %s after %d failures",
+                    self.endpoint,
+                    self.consecutive_failures,
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    # A call was abandoned (e.g. the losing half of a hedge) without an outcome.
+    def record_cancelled(self) -> None:
+        self.trial_in_flight = False
+
+
+# Recent successful latencies of one endpoint, used to pick the hedging delay.
+class LatencyWindow:
+    def __init__(self, size: int = LATENCY_WINDOW_SIZE):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> float | None:
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Health of one endpoint ("host/path") of a pool.
+class Endpoint:
+    def __init__(self, provider: str, name: str, policy: ResiliencePolicy):
+        self.provider = provider
+        self.name = name
+        self.breaker = CircuitBreaker(
+            name, policy.circuit_breaker_failure_threshold, policy.circuit_breaker_reset_seconds
+        )
+        self.latency = LatencyWindow()
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+
+    def stats(self) -> dict:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "provider": self.provider,
+            "endpoint": self.name,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "opened": self.breaker.opened,
+            "short_circuited": self.breaker.short_circuited,
+            "p95_seconds": round(p95, 6) if p95 is not None else None,
+        }
+
+
+# Per-endpoint breakers and latency windows of every provider pool. Provider calls use a fixed
+# set of URLs (token, userinfo, JWKS, batch and sync endpoints), so this stays small.
+class Resilience:
+    def __init__(self):
+        self._endpoints: dict[tuple[str, str], Endpoint] = {}
+
+    def endpoint(
+        self, provider: str, request: httpx.Request, policy: ResiliencePolicy
+    ) -> Endpoint:
+        name = f"{request.url.host}{request.url.path}"
+        endpoint = self._endpoints.get((provider, name))
+        if endpoint is None:
+            endpoint = self._endpoints[(provider, name)] = Endpoint(provider, name, policy)
+        return endpoint
+
+    def stats(self) -> list[dict]:
+        return [endpoint.stats() for endpoint in self._endpoints.values()]
+
+    def reset(self) -> None:
+        self._endpoints.clear()
+
+
+# Process-wide endpoint health shared by all provider HTTP clients.
+resilience = Resilience()
+
+
+# httpx transport adding retries, hedging and circuit breaking around provider calls.
+# Every attempt passes the endpoint's circuit breaker. Failed attempts are retried with
+# decorrelated jitter, up to the policy's attempt count, when that is safe: idempotent requests
+# on transport errors and 500/502/504 answers, any request when it never reached the provider.
+# With a hedge percentile, an idempotent attempt still running after that percentile of the
+# endpoint's recent latency is duplicated, and the first good answer is used.
+class ResilientTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport: httpx.AsyncBaseTransport, provider: str):
+        self.transport = transport
+        self.provider = provider
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        policy = policy_for(self.provider)
+        endpoint = resilience.endpoint(self.provider, request, policy)
+        idempotent = request.extensions.get("idempotent", request.method in IDEMPOTENT_METHODS)
+        delays = backoff_delays(policy.retry_base_delay_seconds, policy.retry_max_delay_seconds)
+        endpoint.calls += 1
+
+        attempt = 1
+        while True:
+            try:
+                if idempotent and policy.hedge_percentile is not None:
+                    response = await self._hedged(request, endpoint, policy)
+                else:
+                    response = await self._attempt(request, endpoint)
+            except CircuitOpenError:
+                raise
+            except httpx.TransportError as e:
+                retryable = idempotent or isinstance(e, NOT_SENT_ERRORS)
+                if not retryable or attempt >= policy.retry_max_attempts:
+                    endpoint.failures += 1
+                    raise
+            else:
+                if (
+                    response.status_code not in RETRYABLE_STATUS_CODES
+                    or not idempotent
+                    or attempt >= policy.retry_max_attempts
+                ):
+                    if response.status_code >= 500:
+                        endpoint.failures += 1
+                    return response
+                await response.aclose()
+
+            attempt += 1
+            endpoint.retries += 1
+            await asyncio.sleep(next(delays))
+
+    # One attempt through the circuit breaker.
+    async def _attempt(self, request: httpx.Request, endpoint: Endpoint) -> httpx.Response:
+        endpoint.breaker.before_call(request)
+        started = time.monotonic()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            endpoint.breaker.record_cancelled()
+            raise
+        except httpx.TransportError:
+            endpoint.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.breaker.record_success()
+            endpoint.latency.add(time.monotonic() - started)
+        return response
+
+    # One attempt, duplicated if it is slower than the hedge percentile.
+    async def _hedged(
+        self, request: httpx.Request, endpoint: Endpoint, policy: ResiliencePolicy
+    ) -> httpx.Response:
+        threshold = endpoint.latency.percentile(policy.hedge_percentile)
+        if threshold is None:
+            return await self._attempt(request, endpoint)
+
+        primary = asyncio.ensure_future(self._attempt(request, endpoint))
+        tasks = [primary]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(
+                tasks, timeout=max(threshold, policy.hedge_min_delay_seconds)
+            )
+            if not done:
+                endpoint.hedges += 1
+                tasks.append(asyncio.ensure_future(self._attempt(request, endpoint)))
+
+            # Use the first good answer; otherwise the outcome of the primary attempt.
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if _succeeded(task)), None)
+            if winner is None:
+                winner = primary
+            return winner.result()
+        finally:
+            for task in tasks:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await task.result().aclose()
+
+
+def _succeeded(task: asyncio.Future) -> bool:
+    return (
+        not task.cancelled()
+        and task.exception() is None
+        and task.result().status_code < 500
+    )
@@ -1,13 +1,29 @@
-from cryptography.fernet import Fernet
-from app.core.config import settings
+import asyncio
+import base64
+import hashlib
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from api.core.config import settings
+
+# Every Fernet token starts with this prefix (version byte 0x80 followed by a timestamp),
+# which lets us tell legacy plaintext tokens apart from encrypted ones.
+FERNET_PREFIX = "gAAAAA"
+
+
+# Derives a valid Fernet key from an arbitrary secret string.
+def derive_fernet_key(secret: str) -> bytes:
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())
+
 
 # Defines a helper class for encryption and decryption using Fernet symmetric encryption.
 # Fernet guarantees that a message encrypted using it cannot be manipulated or read without the key.
+# Several keys are supported for rotation: data is always encrypted with the first (newest) key,
+# and can be decrypted with any of them.
 class EncryptionHelper:
-    # Initializes the EncryptionHelper with a key.
-    # The key is used to create a Fernet instance, which handles the actual encryption/decryption.
-    def __init__(self, key: str):
-        self.fernet = Fernet(key.encode())
+    # Initializes the EncryptionHelper with a list of keys, newest first.
+    def __init__(self, keys: list[bytes]):
+        self.primary = Fernet(keys[0])
+        self.fernet = MultiFernet([Fernet(key) for key in keys])
 
     # Encrypts a given string data.
     # The data is first encoded to bytes, then encrypted by Fernet, and finally decoded back to a string.
@@ -15,10 +31,57 @@ class EncryptionHelper:
         return self.fernet.encrypt(data.encode()).decode()
 
     # Decrypts a given encrypted string data.
-    # The encrypted data is encoded to bytes, decrypted by Fernet, and then decoded back to a string.
+    # Values that were stored before encryption was enabled are returned unchanged.
     def decrypt(self, data: str) -> str:
+        if not data.startswith(FERNET_PREFIX):
+            return data
         return self.fernet.decrypt(data.encode()).decode()
 
-# Creates a global instance of EncryptionHelper using the SECRET_KEY from application settings.
-# This instance can be used throughout the application for consistent encryption/decryption.
-encryption_helper = EncryptionHelper(settings.SECRET_KEY)
\ No newline at end of file
+    # Re-encrypts a stored value with the newest key.
+    # Returns None when the value is already encrypted with the newest key.
+    def rotate(self, data: str) -> str | None:
+        if not data.startswith(FERNET_PREFIX):
+            return self.encrypt(data)
+        try:
+            self.primary.decrypt(data.encode())
+            return None
+        except InvalidToken:
+            return self.fernet.rotate(data.encode()).decode()
+
+    # Batch variants for bulk operations (refresh sweeps, export/import, re-encryption).
+    # Large batches run on a worker thread so the event loop keeps serving requests meanwhile.
+    # `None` values (e.g. missing refresh tokens) pass through unchanged.
+    async def encrypt_many(self, values: list[str | None]) -> list[str | None]:
+        return await self._run_batch(self.encrypt, values)
+
+    async def decrypt_many(self, values: list[str | None]) -> list[str | None]:
+        return await self._run_batch(self.decrypt, values)
+
+    async def rotate_many(self, values: list[str | None]) -> list[str | None]:
+        return await self._run_batch(self.rotate, values)
+
+    async def _run_batch(self, func, values: list[str | None]) -> list[str | None]:
+        def run() -> list[str | None]:
+            return [None if value is None else func(value) for value in values]
+
+        if len(values) < settings.CRYPTO_THREAD_THRESHOLD:
+            return run()
+        return await asyncio.to_thread(run)
+
+
+# Builds the key list from `TOKEN_ENCRYPTION_KEYS` (comma-separated Fernet keys, newest first).
+# A key derived from SECRET_KEY is always kept last, so it is the default when no keys are
+# configured and data encrypted with it stays readable after explicit keys are introduced.
+def _load_keys() -> list[bytes]:
+    keys = [
+        key.strip().encode()
+        for key in (settings.TOKEN_ENCRYPTION_KEYS or "").split(",")
+        if key.strip()
+    ]
+    keys.append(derive_fernet_key(settings.SECRET_KEY))
+    return keys
+
+
+# Creates a global instance of EncryptionHelper from the configured keys.
+# This instance is used by the repositories to encrypt tokens at rest.
+encryption_helper = EncryptionHelper(_load_keys())
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.auth.registry import provider_registry
+from api.core.config import settings
+from api.core.database import SessionLocal
+from api.core.http import http_clients
+from api.core.ratelimit import call_context
+from api.mail.transports import (
+    TRANSPORTS,
+    GmailTransport,
+    GraphTransport,
+    MailRequest,
+    MailRequestError,
+)
+from api.tokens.service import get_valid_access_token
+
+logger = logging.getLogger(__name__)
+
+
+# Multiplexes individual mail API calls into provider batch requests.
+# Calls submitted for the same account within `MAIL_BATCH_WINDOW_SECONDS` are queued together and
+# sent as one Gmail batch or Graph `$batch` request (flushed early once a provider's batch size is
+# reached). Each caller then receives its own response, so one failing call does not fail the
+# others; a failure of the whole batch request is raised to every caller in it.
+class MailBatcher:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = SessionLocal,
+        window_seconds: float | None = None,
+    ):
+        self.session_factory = session_factory
+        self.window_seconds = window_seconds
+        self._pending: dict[str, list[tuple[MailRequest, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.Task] = {}
+        # Strong references to in-flight batch sends, so they are not garbage collected.
+        self._sending: set[asyncio.Task] = set()
+        self.calls = 0
+        self.batches = 0
+
+    # Resolves the transport for an account from its provider.
+    async def transport_for(self, email: str) -> GmailTransport | GraphTransport:
+        token = await get_valid_access_token(self.session_factory, email)
+        mail_api = provider_registry.get_by_code(token.provider_cd).mail_api
+        if mail_api not in TRANSPORTS:
+            raise ValueError(f"Provider {token.provider_cd} has no supported mail API")
+        return TRANSPORTS[mail_api]
+
+    # Queues one call for `email` and returns its response body.
+    # Raises MailRequestError if the provider rejected this call.
+    async def submit(self, email: str, request: MailRequest, transport=None):
+        transport = transport or await self.transport_for(email)
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.setdefault(email, [])
+        pending.append((request, future))
+        self.calls += 1
+
+        if len(pending) >= transport.batch_size:
+            self._take_and_send(email, transport)
+        elif email not in self._timers:
+            self._timers[email] = asyncio.create_task(self._flush_later(email, transport))
+        return await future
+
+    async def _flush_later(self, email: str, transport) -> None:
+        window = self.window_seconds
+        await asyncio.sleep(settings.MAIL_BATCH_WINDOW_SECONDS if window is None else window)
+        self._timers.pop(email, None)
+        if self._pending.get(email):
+            self._take_and_send(email, transport)
+
+    def _take_and_send(self, email: str, transport) -> None:
+        batch = self._pending.pop(email)
+        timer = self._timers.pop(email, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        task = asyncio.create_task(self._send(email, transport, batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def _send(self, email: str, transport, batch: list) -> None:
+        self.batches += 1
+        try:
+            token = await get_valid_access_token(self.session_factory, email)
+            with call_context(account=email):
+                responses = await transport.send_batch(
+                    http_clients.get(transport.name),
+                    token.access_token,
+                    [request for request, _ in batch],
+                )
+        except Exception as e:
+            logger.warning("Mail batch of %d calls for %s failed: %s", len(batch), email, e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), response in zip(batch, responses):
+            if future.done():
+                continue
+            if response.status >= 400:
+                future.set_exception(MailRequestError(response.status, response.body))
+            else:
+                future.set_result(response.body)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "batches": self.batches}
+
+
+# Process-wide batcher shared by every mail operation.
+mail_batcher = MailBatcher()
+
+
+# Fetches a single message.
+async def get_message(email: str, message_id: str) -> dict:
+    transport = await mail_batcher.transport_for(email)
+    return await mail_batcher.submit(email, transport.get_message(message_id), transport)
+
+
+# Lists the account's labels (Gmail) or mail folders (Graph).
+async def list_labels(email: str) -> dict:
+    transport = await mail_batcher.transport_for(email)
+    return await mail_batcher.submit(email, transport.list_labels(), transport)
+
+
+# Sends an RFC 822 message given base64url encoded as `raw`.
+async def send_message(email: str, raw: str) -> dict | None:
+    transport = await mail_batcher.transport_for(email)
+    return await mail_batcher.submit(email, transport.send_message(raw), transport)
@@ -0,0 +1,120 @@
+import math
+from typing import AsyncIterator
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.core.database import get_session_factory
+from api.core.dependencies import require_api_key
+from api.core.resilience import CircuitOpenError
+from api.mail import batcher
+from api.mail.schemas import MailChangeRecord, SendJob, SendMessageRequest
+from api.mail.send_queue import enqueue_message, get_send_job
+from api.mail.sync import MailboxSync, open_mailbox_sync
+from api.mail.transports import MailRequestError
+from api.models.enums import MailSendStatus
+from api.models.schema import MailSendJob
+from api.tokens.service import AccountNotFoundError, TokenUnavailableError
+
+# Internal router for mail operations on linked accounts.
+# Concurrent calls for an account are multiplexed into provider batch requests.
+# Every route requires the internal API key.
+router = APIRouter(prefix="/mail", tags=["Mail"], dependencies=[Depends(require_api_key)])
+
+
+# Runs a mail operation, mapping account and provider errors onto HTTP responses.
+# A provider 404 is passed through; other provider failures become 502s, and calls refused by
+# an open circuit breaker 503s.
+async def _call(operation):
+    try:
+        return await operation
+    except AccountNotFoundError:
+        raise HTTPException(status_code=404, detail="Account not found")
+    except MailRequestError as e:
+        raise HTTPException(
+            status_code=404 if e.status == 404 else 502, detail=e.body or str(e)
+        )
+    except (TokenUnavailableError, ValueError) as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Mail provider request failed: {e}")
+
+
+# Returns one message in the provider's native JSON format.
+@router.get("/{email}/messages/{message_id}")
+async def get_message(email: str, message_id: str) -> dict:
+    return await _call(batcher.get_message(email, message_id))
+
+
+# Returns the account's labels (Gmail) or mail folders (Microsoft Graph).
+@router.get("/{email}/labels")
+async def list_labels(email: str) -> dict:
+    return await _call(batcher.list_labels(email))
+
+
+# Sends a message from the account.
+@router.post("/{email}/send", status_code=202)
+async def send_message(email: str, message: SendMessageRequest) -> dict | None:
+    return await _call(batcher.send_message(email, message.raw))
+
+
+def _send_job(job: MailSendJob) -> SendJob:
+    return SendJob(
+        job_id=job.mail_send_job_id,
+        status=job.status_txt,
+        attempts=job.attempt_cnt,
+        next_attempt_at=(
+            job.next_attempt_at_utc if job.status_txt == MailSendStatus.QUEUED.value else None
+        ),
+        last_error=job.last_error_txt,
+        created_at=job.created_at_utc,
+        sent_at=job.sent_at_utc,
+    )
+
+
+# Queues a message for sending from the account and returns at once; the send queue workers
+# deliver it (see `api.mail.send_queue`). Poll the returned job for the outcome.
+@router.post("/{email}/outbox", status_code=202)
+async def queue_message(
+    email: str,
+    message: SendMessageRequest,
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+) -> SendJob:
+    return _send_job(await _call(enqueue_message(session_factory, email, message.raw)))
+
+
+# Returns the state of a queued message of the account.
+@router.get("/{email}/outbox/{job_id}")
+async def get_queued_message(
+    email: str,
+    job_id: int,
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+) -> SendJob:
+    try:
+        return _send_job(await get_send_job(session_factory, email, job_id))
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Send job not found")
+
+
+async def _change_lines(sync: MailboxSync) -> AsyncIterator[bytes]:
+    async for change in sync.changes():
+        yield MailChangeRecord(**change._asdict()).model_dump_json().encode() + b"\n"
+
+
+# Streams the account's mailbox changes since its last sync as NDJSON, one change per line.
+# The sync cursor advances only once the whole stream has been read.
+@router.get("/{email}/changes")
+async def mailbox_changes(
+    email: str,
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+) -> StreamingResponse:
+    sync = await _call(open_mailbox_sync(session_factory, email))
+    return StreamingResponse(_change_lines(sync), media_type="application/x-ndjson")
@@ -0,0 +1,27 @@
+import datetime
+
+from pydantic import BaseModel
+
+
+# An outgoing message: the full RFC 822 message, base64url encoded.
+class SendMessageRequest(BaseModel):
+    raw: str
+
+
+# A message in the outbound send queue. `status` is a `MailSendStatus` value; `next_attempt_at`
+# is when a queued job is due (again), `last_error` why its last attempt failed.
+class SendJob(BaseModel):
+    job_id: int
+    status: str
+    attempts: int
+    next_attempt_at: datetime.datetime | None = None
+    last_error: str | None = None
+    created_at: datetime.datetime
+    sent_at: datetime.datetime | None = None
+
+
+# One line of the NDJSON mailbox change stream (see `api.mail.sync.MailChange`).
+class MailChangeRecord(BaseModel):
+    kind: str
+    message_id: str | None = None
+    data: dict | None = None
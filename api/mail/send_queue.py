@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+import logging
+import random
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.core.config import settings
+from api.core.database import SessionLocal
+from api.core.metrics import count_mail_send_jobs
+from api.core.ratelimit import Priority, call_context
+from api.mail.batcher import MailBatcher
+from api.mail.transports import MailRequestError
+from api.models.enums import MailSendStatus
+from api.models.schema import MailSendJob
+from api.repositories.mail_send_job import ClaimedJob, MailSendJobRepository
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens.service import AccountNotFoundError
+
+logger = logging.getLogger(__name__)
+
+# Client error answers worth another attempt (timeout, throttling); server errors always are.
+RETRYABLE_STATUS_CODES = frozenset({408, 429})
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# Queues an RFC 822 message (base64url encoded as `raw`) for sending from `email` and returns
+# the job without waiting for the provider.
+async def enqueue_message(
+    session_factory: async_sessionmaker[AsyncSession], email: str, raw: str
+) -> MailSendJob:
+    async with session_factory() as session:
+        account = await UserMailAccountRepository(session).get_by_email(email)
+        if account is None or not account.is_active_flg:
+            raise AccountNotFoundError(email)
+        return await MailSendJobRepository(session).enqueue(account.user_mail_account_id, raw)
+
+
+# Returns the send job `job_id` of `email`.
+async def get_send_job(
+    session_factory: async_sessionmaker[AsyncSession], email: str, job_id: int
+) -> MailSendJob:
+    async with session_factory() as session:
+        account = await UserMailAccountRepository(session).get_by_email(email)
+        job = None
+        if account is not None:
+            job = await MailSendJobRepository(session).get(job_id, account.user_mail_account_id)
+    if job is None:
+        raise LookupError(job_id)
+    return job
+
+
+# Whether a failed send may succeed later: network failures, provider timeouts, throttling and
+# server errors (of the call or of the whole batch request), or an account token that could not
+# be refreshed. A provider rejecting the message or a removed account are final.
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, MailRequestError):
+        status = error.status
+    elif isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+    else:
+        return not isinstance(error, (AccountNotFoundError, ValueError))
+    return status in RETRYABLE_STATUS_CODES or status >= 500
+
+
+# Seconds before retrying after failed attempt number `attempt`: exponential from
+# `MAIL_SEND_RETRY_BASE_SECONDS`, capped at `MAIL_SEND_RETRY_MAX_SECONDS`, jittered down by up to
+# half so that jobs failing together (a provider outage) do not come back together.
+def retry_delay(attempt: int) -> float:
+    delay = min(
+        settings.MAIL_SEND_RETRY_MAX_SECONDS,
+        settings.MAIL_SEND_RETRY_BASE_SECONDS * 2 ** (attempt - 1),
+    )
+    return random.uniform(delay / 2, delay)
+
+
+# Worker of the durable outbound mail queue (`mail_send_jobs`).
+# Each round claims up to `MAIL_SEND_BATCH_SIZE` due jobs (see `MailSendJobRepository.claim`),
+# sends them concurrently with the account's current access token through a `MailBatcher`, so
+# jobs of one account share provider batch requests, and records every outcome with one
+# statement: sent, queued again after a backoff, or dead-lettered once the provider rejected the
+# message or `MAIL_SEND_MAX_ATTEMPTS` attempts failed.
+# Any number of workers can run against one database (`python -m api.worker`); they never claim
+# the same job. Delivery is at least once: a worker stopped between sending a message and
+# recording it leaves the job to be claimed again when its lease runs out.
+class MailSendWorker:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = SessionLocal,
+        batch_size: int | None = None,
+        poll_seconds: float | None = None,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.MAIL_SEND_BATCH_SIZE
+        self.poll_seconds = poll_seconds or settings.MAIL_SEND_POLL_SECONDS
+        self.batcher = MailBatcher(session_factory)
+        self._task: asyncio.Task | None = None
+
+    # Sends one claimed job and returns its outcome for `MailSendJobRepository.finish`.
+    async def _send(self, job: ClaimedJob) -> dict:
+        result = {"mail_send_job_id": job.mail_send_job_id, "attempt": job.attempt}
+        try:
+            if job.email is None:
+                raise AccountNotFoundError(job.mail_send_job_id)
+            transport = await self.batcher.transport_for(job.email)
+            with call_context(Priority.BACKGROUND, job.email):
+                await self.batcher.submit(
+                    job.email, transport.send_message(job.raw_message), transport
+                )
+        except Exception as e:
+            retry = is_retryable(e) and job.attempt < settings.MAIL_SEND_MAX_ATTEMPTS
+            logger.warning(
+                "Mail send job %s failed (attempt %d, %s): %s",
+                job.mail_send_job_id,
+                job.attempt,
+                "retrying" if retry else "dead-lettered",
+                e,
+            )
+            result["last_error_txt"] = f"{type(e).__name__}: {e}"
+            if retry:
+                result["status_txt"] = MailSendStatus.QUEUED.value
+                result["next_attempt_at_utc"] = _utcnow() + datetime.timedelta(
+                    seconds=retry_delay(job.attempt)
+                )
+            else:
+                result["status_txt"] = MailSendStatus.DEAD.value
+            return result
+        result["status_txt"] = MailSendStatus.SENT.value
+        result["sent_at_utc"] = _utcnow()
+        return result
+
+    # Claims and sends one batch of due jobs. Returns the number of jobs claimed.
+    async def run_once(self) -> int:
+        async with self.session_factory() as session:
+            repo = MailSendJobRepository(session)
+            jobs = await repo.claim(
+                _utcnow(),
+                self.batch_size,
+                settings.MAIL_SEND_LEASE_SECONDS,
+                settings.MAIL_SEND_ACCOUNT_CONCURRENCY,
+            )
+            if not jobs:
+                return 0
+            results = await asyncio.gather(*(self._send(job) for job in jobs))
+            await repo.finish(results)
+
+        for status in MailSendStatus:
+            count = sum(1 for result in results if result["status_txt"] == status.value)
+            if count:
+                outcome = "retried" if status is MailSendStatus.QUEUED else status.value
+                count_mail_send_jobs(outcome, count)
+        return len(jobs)
+
+    # Works until cancelled: claims batches back to back while jobs are due, and polls every
+    # `poll_seconds` once a round comes back short of a full batch.
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("Mail send round failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_seconds)
+
+    # Starts the worker as a task on the running event loop (used by the app lifespan).
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+    # Cancels the background task and waits for it to finish.
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+# Shared worker instance used by the in-process lifespan task and the standalone worker.
+mail_send_worker = MailSendWorker()
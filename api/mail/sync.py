@@ -0,0 +1,235 @@
+import logging
+import uuid
+from typing import AsyncIterator, NamedTuple
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.auth.registry import provider_registry
+from api.core.config import settings
+from api.core.http import http_clients
+from api.core.ratelimit import Priority
+from api.repositories.mail_sync_cursor import MailSyncCursorRepository
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens.service import AccountNotFoundError, get_valid_access_token
+
+logger = logging.getLogger(__name__)
+
+
+# One mailbox change. `kind` is "upserted" (new or changed message), "deleted", or "resync",
+# which comes first when the provider could not resume from the stored cursor: the changes that
+# follow list the whole mailbox, and consumers should drop state they hold for it.
+class MailChange(NamedTuple):
+    kind: str
+    message_id: str | None = None
+    data: dict | None = None
+
+
+# The stored cursor is unknown to the provider or too old to resume from.
+class CursorExpiredError(Exception):
+    pass
+
+
+# Sync traffic yields to interactive and internal API calls in the provider rate limiter.
+SYNC_EXTENSIONS = {"priority": Priority.BACKGROUND}
+
+
+# A page of changes plus, on the last page, the cursor to resume from next time.
+Page = tuple[list[MailChange], str | None]
+
+
+# Gmail sync. The cursor is the mailbox `historyId`; `history.list` returns every change after it
+# and answers 404 once that history is no longer available.
+class GmailSync:
+    async def incremental(
+        self, client: httpx.AsyncClient, headers: dict, cursor: str
+    ) -> AsyncIterator[Page]:
+        url = f"{settings.GMAIL_API_URL}/gmail/v1/users/me/history"
+        params = {
+            "startHistoryId": cursor,
+            "historyTypes": ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"],
+            "maxResults": settings.MAIL_SYNC_PAGE_SIZE,
+        }
+        while True:
+            response = await client.get(
+                url, params=params, headers=headers, extensions=SYNC_EXTENSIONS
+            )
+            if response.status_code == 404:
+                raise CursorExpiredError(cursor)
+            response.raise_for_status()
+            body = response.json()
+
+            changes = []
+            for record in body.get("history", []):
+                for key in ("messagesAdded", "labelsAdded", "labelsRemoved"):
+                    for item in record.get(key, []):
+                        changes.append(
+                            MailChange("upserted", item["message"]["id"], item["message"])
+                        )
+                for item in record.get("messagesDeleted", []):
+                    changes.append(MailChange("deleted", item["message"]["id"]))
+
+            page_token = body.get("nextPageToken")
+            yield changes, None if page_token else body["historyId"]
+            if not page_token:
+                return
+            params["pageToken"] = page_token
+
+    async def full(self, client: httpx.AsyncClient, headers: dict) -> AsyncIterator[Page]:
+        # Take the history id before listing, so changes made during the listing are replayed.
+        profile = await client.get(
+            f"{settings.GMAIL_API_URL}/gmail/v1/users/me/profile",
+            headers=headers,
+            extensions=SYNC_EXTENSIONS,
+        )
+        profile.raise_for_status()
+        history_id = str(profile.json()["historyId"])
+
+        url = f"{settings.GMAIL_API_URL}/gmail/v1/users/me/messages"
+        params = {"maxResults": settings.MAIL_SYNC_PAGE_SIZE}
+        while True:
+            response = await client.get(
+                url, params=params, headers=headers, extensions=SYNC_EXTENSIONS
+            )
+            response.raise_for_status()
+            body = response.json()
+            changes = [
+                MailChange("upserted", message["id"], message)
+                for message in body.get("messages", [])
+            ]
+            page_token = body.get("nextPageToken")
+            yield changes, None if page_token else history_id
+            if not page_token:
+                return
+            params["pageToken"] = page_token
+
+
+# Microsoft Graph sync of the inbox. The cursor is the `@odata.deltaLink` of the last round;
+# following it returns every change since, and Graph answers 410 once it has expired.
+class GraphSync:
+    async def _rounds(
+        self, client: httpx.AsyncClient, headers: dict, url: str, cursor: str | None
+    ) -> AsyncIterator[Page]:
+        headers = {**headers, "Prefer": f"odata.maxpagesize={settings.MAIL_SYNC_PAGE_SIZE}"}
+        while True:
+            response = await client.get(url, headers=headers, extensions=SYNC_EXTENSIONS)
+            if cursor is not None and response.status_code in (400, 404, 410):
+                raise CursorExpiredError(cursor)
+            response.raise_for_status()
+            body = response.json()
+
+            changes = [
+                MailChange("deleted", item["id"])
+                if "@removed" in item
+                else MailChange("upserted", item["id"], item)
+                for item in body.get("value", [])
+            ]
+            next_link = body.get("@odata.nextLink")
+            yield changes, None if next_link else body["@odata.deltaLink"]
+            if not next_link:
+                return
+            url = next_link
+
+    def incremental(
+        self, client: httpx.AsyncClient, headers: dict, cursor: str
+    ) -> AsyncIterator[Page]:
+        return self._rounds(client, headers, cursor, cursor)
+
+    def full(self, client: httpx.AsyncClient, headers: dict) -> AsyncIterator[Page]:
+        url = f"{settings.GRAPH_API_URL}/me/mailFolders/inbox/messages/delta"
+        return self._rounds(client, headers, url, None)
+
+
+# Sync implementations by the `mail_api` name of a provider.
+SYNCERS = {"gmail": GmailSync(), "graph": GraphSync()}
+
+
+# One sync pass over an account's mailbox.
+# `changes()` streams everything that changed since the stored cursor (or the whole mailbox when
+# there is no usable cursor), page by page. The new cursor is saved only after the last page has
+# been consumed, so a pass that is interrupted is repeated from the old cursor next time:
+# changes are delivered at least once.
+class MailboxSync:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        user_mail_account_id: uuid.UUID,
+        mail_api: str,
+        access_token: str,
+        cursor: str | None,
+    ):
+        self.session_factory = session_factory
+        self.user_mail_account_id = user_mail_account_id
+        self.mail_api = mail_api
+        self.access_token = access_token
+        self.cursor = cursor
+
+    async def changes(self) -> AsyncIterator[MailChange]:
+        syncer = SYNCERS[self.mail_api]
+        client = http_clients.get(self.mail_api)
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+
+        pages = None
+        if self.cursor is not None:
+            pages = syncer.incremental(client, headers, self.cursor)
+            try:
+                first = await anext(pages)
+            except CursorExpiredError:
+                logger.info(
+                    "Sync cursor of account %s expired; running a full resync",
+                    self.user_mail_account_id,
+                )
+                pages = None
+            except StopAsyncIteration:
+                return
+
+        if pages is None:
+            pages = syncer.full(client, headers)
+            first = await anext(pages)
+            yield MailChange("resync")
+
+        changes, new_cursor = first
+        for change in changes:
+            yield change
+        async for changes, new_cursor in pages:
+            for change in changes:
+                yield change
+
+        async with self.session_factory() as session:
+            await MailSyncCursorRepository(session).save_cursor(
+                self.user_mail_account_id, new_cursor
+            )
+        self.cursor = new_cursor
+
+
+# Prepares a sync pass for `email`: resolves the account, its mail API, a valid access token and
+# the stored cursor (read from a replica when one is configured). Raises AccountNotFoundError /
+# TokenUnavailableError before any change is streamed, and ValueError if the account's provider
+# has no mail API.
+async def open_mailbox_sync(
+    session_factory: async_sessionmaker[AsyncSession], email: str
+) -> MailboxSync:
+    async with session_factory() as session:
+        account = await UserMailAccountRepository(session, read_replica=True).get_by_email(email)
+        if account is None or not account.is_active_flg:
+            raise AccountNotFoundError(email)
+        cursor = await MailSyncCursorRepository(session, read_replica=True).get_cursor(
+            account.user_mail_account_id
+        )
+
+    mail_api = provider_registry.get_by_code(account.provider_cd).mail_api
+    if mail_api not in SYNCERS:
+        raise ValueError(f"Provider {account.provider_cd} has no supported mail API")
+    token = await get_valid_access_token(session_factory, email)
+    return MailboxSync(
+        session_factory, account.user_mail_account_id, mail_api, token.access_token, cursor
+    )
+
+
+# Streams the changes in `email`'s mailbox since its last sync (see `MailboxSync`).
+async def sync_mailbox(
+    session_factory: async_sessionmaker[AsyncSession], email: str
+) -> AsyncIterator[MailChange]:
+    sync = await open_mailbox_sync(session_factory, email)
+    async for change in sync.changes():
+        yield change
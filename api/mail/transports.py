@@ -0,0 +1,161 @@
+import base64
+import json
+import secrets
+from typing import Any, NamedTuple
+
+import httpx
+
+from api.core.config import settings
+
+
+# One mail API call, relative to the provider's API root.
+class MailRequest(NamedTuple):
+    method: str
+    path: str
+    body: Any = None
+    content_type: str = "application/json"
+
+
+# The demultiplexed result of one call inside a batch.
+class MailResponse(NamedTuple):
+    status: int
+    body: Any
+
+
+# Raised to a caller whose individual call in a batch failed.
+class MailRequestError(RuntimeError):
+    def __init__(self, status: int, body: Any):
+        super().__init__(f"Mail API call failed with status {status}: {body}")
+        self.status = status
+        self.body = body
+
+
+# Gmail API transport. Calls are grouped into one `multipart/mixed` batch request, each part an
+# embedded HTTP request; the outer Authorization header applies to every part.
+class GmailTransport:
+    name = "gmail"
+    # Gmail accepts up to 100 calls per batch.
+    MAX_BATCH_SIZE = 100
+
+    @property
+    def batch_size(self) -> int:
+        return min(settings.GMAIL_BATCH_SIZE, self.MAX_BATCH_SIZE)
+
+    def get_message(self, message_id: str) -> MailRequest:
+        return MailRequest("GET", f"/gmail/v1/users/me/messages/{message_id}")
+
+    def list_labels(self) -> MailRequest:
+        return MailRequest("GET", "/gmail/v1/users/me/labels")
+
+    # `raw` is the RFC 822 message, base64url encoded.
+    def send_message(self, raw: str) -> MailRequest:
+        return MailRequest("POST", "/gmail/v1/users/me/messages/send", {"raw": raw})
+
+    def _encode(self, requests: list[MailRequest], boundary: str) -> bytes:
+        parts = []
+        for index, request in enumerate(requests):
+            lines = [
+                f"--{boundary}",
+                "Content-Type: application/http",
+                f"Content-ID: <item-{index}>",
+                "",
+                f"{request.method} {request.path} HTTP/1.1",
+            ]
+            if request.body is not None:
+                lines += [f"Content-Type: {request.content_type}", "", json.dumps(request.body)]
+            parts.append("\r\n".join(lines) + "\r\n")
+        return ("\r\n".join(parts) + f"\r\n--{boundary}--\r\n").encode()
+
+    def _decode(self, content_type: str, payload: bytes, count: int) -> list[MailResponse]:
+        boundary = content_type.split("boundary=", 1)[1].split(";", 1)[0].strip('"')
+        responses: list[MailResponse | None] = [None] * count
+        for part in payload.replace(b"\r\n", b"\n").split(f"--{boundary}".encode()):
+            part_headers, _, http = part.strip(b"\n").partition(b"\n\n")
+            content_id = next(
+                (
+                    line.split(b":", 1)[1].strip().strip(b"<>").decode()
+                    for line in part_headers.split(b"\n")
+                    if line.lower().startswith(b"content-id:")
+                ),
+                None,
+            )
+            if content_id is None:
+                continue
+            status_line, _, rest = http.partition(b"\n")
+            _, _, body = rest.partition(b"\n\n")
+            index = int(content_id.rsplit("-", 1)[1])
+            responses[index] = MailResponse(
+                status=int(status_line.split()[1]),
+                body=json.loads(body) if body.strip() else None,
+            )
+        return [
+            response or MailResponse(502, {"error": "Missing from batch response"})
+            for response in responses
+        ]
+
+    async def send_batch(
+        self, client: httpx.AsyncClient, access_token: str, requests: list[MailRequest]
+    ) -> list[MailResponse]:
+        boundary = f"batch_{secrets.token_hex(12)}"
+        response = await client.post(
+            settings.GMAIL_BATCH_URL,
+            content=self._encode(requests, boundary),
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": f"multipart/mixed; boundary={boundary}",
+            },
+        )
+        response.raise_for_status()
+        return self._decode(response.headers["content-type"], response.content, len(requests))
+
+
+# Microsoft Graph transport. Calls are grouped into one JSON `$batch` request.
+class GraphTransport:
+    name = "graph"
+    # Graph accepts up to 20 calls per batch.
+    MAX_BATCH_SIZE = 20
+
+    @property
+    def batch_size(self) -> int:
+        return min(settings.GRAPH_BATCH_SIZE, self.MAX_BATCH_SIZE)
+
+    def get_message(self, message_id: str) -> MailRequest:
+        return MailRequest("GET", f"/me/messages/{message_id}")
+
+    # Graph has no labels; mail folders are the equivalent.
+    def list_labels(self) -> MailRequest:
+        return MailRequest("GET", "/me/mailFolders")
+
+    # Graph takes the MIME message standard-base64 encoded as a text/plain body.
+    def send_message(self, raw: str) -> MailRequest:
+        mime = base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4))
+        return MailRequest(
+            "POST", "/me/sendMail", base64.b64encode(mime).decode(), "text/plain"
+        )
+
+    async def send_batch(
+        self, client: httpx.AsyncClient, access_token: str, requests: list[MailRequest]
+    ) -> list[MailResponse]:
+        batch = []
+        for index, request in enumerate(requests):
+            item = {"id": str(index), "method": request.method, "url": request.path}
+            if request.body is not None:
+                item["body"] = request.body
+                item["headers"] = {"Content-Type": request.content_type}
+            batch.append(item)
+
+        response = await client.post(
+            f"{settings.GRAPH_API_URL}/$batch",
+            json={"requests": batch},
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        response.raise_for_status()
+
+        responses = [MailResponse(502, {"error": "Missing from batch response"})] * len(requests)
+        for item in response.json().get("responses", []):
+            responses[int(item["id"])] = MailResponse(item["status"], item.get("body"))
+        return responses
+
+
+# Transports by the `mail_api` name of a provider.
+TRANSPORTS = {transport.name: transport for transport in (GmailTransport(), GraphTransport())}
@@ -1,10 +1,63 @@
+from contextlib import asynccontextmanager
+
 # Import necessary modules from FastAPI and Starlette.
 from fastapi import FastAPI
-from starlette.middleware.sessions import SessionMiddleware
+from fastapi.responses import Response
 
 # Import the authentication router and apilication settings.
+from api.admin.router import router as admin_router
+from api.auth.registry import provider_registry
 from api.auth.router import router as auth_router
+from api.mail.router import router as mail_router
+from api.mail.send_queue import mail_send_worker
+from api.tokens.router import router as tokens_router
+from api.core.audit import audit_log
 from api.core.config import settings
+from api.core.database import dispose_engine
+from api.core.http import http_clients
+from api.core.invalidation import invalidation_bus
+from api.core.metrics import render_metrics
+from api.core.replica import read_router
+from api.core.profiler import SlowRequestProfiler
+from api.tokens.refresh import token_refresh_engine
+from api.tokens.write_behind import token_write_behind
+from api.warmup import warm_up
+
+
+# Application lifespan.
+# Opens the long-lived provider HTTP connection pools on startup so the first callback
+# does not pay for client construction, and closes them and the database pool cleanly on
+# shutdown, after writing out buffered token updates and queued audit events.
+# The provider registry is built here, once, before any request is served.
+# With `LAZY_INIT` the HTTP clients are instead created on first use, keeping cold starts short;
+# `WARMUP_ON_STARTUP` goes further and also opens the database and provider connections.
+# If enabled, the background token refresh engine, the mail send queue worker and the cache
+# invalidation listener run alongside the app.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    providers = await provider_registry.load()
+    if not settings.LAZY_INIT:
+        http_clients.open(providers)
+    if settings.WARMUP_ON_STARTUP:
+        await warm_up()
+    if settings.TOKEN_REFRESH_ENABLED:
+        token_refresh_engine.start()
+    if settings.MAIL_SEND_WORKER_ENABLED:
+        mail_send_worker.start()
+    if settings.CACHE_INVALIDATION_ENABLED:
+        invalidation_bus.start()
+    try:
+        yield
+    finally:
+        await invalidation_bus.stop()
+        await mail_send_worker.stop()
+        await token_refresh_engine.stop()
+        await token_write_behind.aclose()
+        await audit_log.aclose()
+        await http_clients.aclose()
+        await read_router.aclose()
+        await dispose_engine()
+
 
 # Initialize the FastAPI apilication.
 # Set the title, description, and version for API documentation (e.g., OpenAPI/Swagger UI).
@@ -12,18 +65,27 @@ app = FastAPI(
     title="NJMTech Mail OAuth API",
     description="An API for authenticating with Google and managing mail accounts.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
-# Add SessionMiddleware to the apilication.
-# This middleware is used for managing user sessions, essential for OAuth flows.
-# The `secret_key` is used to sign the session cookies, ensuring their integrity.
-app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
+# Profile a sample of requests and keep the stacks of slow ones (see `PROFILER_*` settings).
+if settings.PROFILER_ENABLED:
+    app.add_middleware(SlowRequestProfiler)
 
 # Include the authentication router in the main apilication.
 # This registers all the authentication-related endpoints (e.g., login, callback)
 # defined in `api/auth/router.py` with the FastAPI apilication.
 app.include_router(auth_router)
 
+# Include the internal token-vending router (requires the internal API key).
+app.include_router(tokens_router)
+
+# Include the mail router (batched Gmail/Graph operations; requires the internal API key).
+app.include_router(mail_router)
+
+# Include the admin router (bulk export/import; requires the internal API key).
+app.include_router(admin_router)
+
 
 # Define a root endpoint for the API.
 # This simple endpoint can be used to check if the API is running.
@@ -31,3 +93,12 @@ app.include_router(auth_router)
 async def root():
     return {"message": "API is running."}
 
+
+
+# Prometheus scrape endpoint (callback phase latencies, provider calls, DB pool waits).
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        body, content_type = render_metrics()
+        return Response(body, media_type=content_type)
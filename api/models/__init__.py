@@ -1,4 +1,19 @@
 from api.models.base import Base
-from api.models.schema import UserMailAccount, OAuthToken
+from api.models.schema import (
+    AuthEvent,
+    MailSendJob,
+    OAuthStateNonce,
+    UserMailAccount,
+    OAuthToken,
+    MailSyncCursor,
+)
 
-__all__ = ["Base", "UserMailAccount", "OAuthToken"]
+__all__ = [
+    "Base",
+    "UserMailAccount",
+    "OAuthToken",
+    "MailSyncCursor",
+    "AuthEvent",
+    "MailSendJob",
+    "OAuthStateNonce",
+]
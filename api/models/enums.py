@@ -9,3 +9,27 @@ class Provider(Enum):
     GOOGLE = 0
     # Represents Microsoft as an OAuth provider.
     MICROSOFT = 1
+
+
+# Kinds of authentication events recorded in the audit log (`auth_events.event_type_txt`).
+class AuditEventType(Enum):
+    # An authorization code was exchanged for tokens.
+    TOKEN_EXCHANGE = "token_exchange"
+    # A login completed and the account's token was stored.
+    LOGIN = "login"
+    # A login or callback failed (invalid state, provider error, ...).
+    LOGIN_FAILED = "login_failed"
+    # The email is already registered with a different provider.
+    PROVIDER_MISMATCH = "provider_mismatch"
+
+
+# States of an outbound mail send job (`mail_send_jobs.status_txt`).
+class MailSendStatus(Enum):
+    # Waiting to be sent, or to be retried once `next_attempt_at_utc` has passed.
+    QUEUED = "queued"
+    # Claimed by a worker; claimable again if its lease (`next_attempt_at_utc`) runs out.
+    SENDING = "sending"
+    # Accepted by the provider.
+    SENT = "sent"
+    # Rejected by the provider, or out of attempts (dead letter).
+    DEAD = "dead"
@@ -1,7 +1,19 @@
 import datetime
 import uuid
 
-from sqlalchemy import String, Boolean, DateTime, ForeignKey, func, Integer
+from sqlalchemy import (
+    BigInteger,
+    String,
+    Text,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    false,
+    func,
+    Integer,
+    Index,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -54,6 +66,23 @@ class UserMailAccount(Base):
         cascade="all, delete-orphan",
     )
 
+    # one-to-one; created on the first mailbox sync
+    sync_cursor: Mapped["MailSyncCursor"] = relationship(
+        back_populates="user_mail_account",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
+
+    __table_args__ = (
+        # Active accounts by provider, in keyset order.
+        Index(
+            "ix_user_mail_accounts_active_provider",
+            "provider_cd",
+            "user_mail_account_id",
+            postgresql_where=text("is_active_flg"),
+        ),
+    )
+
 
 class OAuthToken(Base):
     __tablename__ = "oauth_tokens"
@@ -71,13 +100,14 @@ class OAuthToken(Base):
         unique=True,  # 🔑 enforces one-to-one at DB level
     )
 
+    # Encrypted at rest (see `api.core.security`); ciphertext is longer than the token.
     access_token_txt: Mapped[str] = mapped_column(
-        String(4096),
+        Text,
         nullable=False,
     )
 
     refresh_token_txt: Mapped[str | None] = mapped_column(
-        String(4096),
+        Text,
         nullable=True,
     )
 
@@ -86,6 +116,28 @@ class OAuthToken(Base):
         nullable=False,
     )
 
+    # Consecutive failed background refreshes, and the earliest time the next one is tried.
+    refresh_failure_cnt: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default=text("0"),
+        nullable=False,
+    )
+
+    next_refresh_at_utc: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+    # Set when the provider rejected the refresh token (`invalid_grant`: consent revoked or
+    # token expired); cleared when a login stores a new one.
+    refresh_revoked_flg: Mapped[bool] = mapped_column(
+        Boolean,
+        default=False,
+        server_default=false(),
+        nullable=False,
+    )
+
     created_at_utc: Mapped[datetime.datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -103,3 +155,204 @@ class OAuthToken(Base):
         back_populates="oauth_token",
     )
 
+    __table_args__ = (
+        # Tokens in expiry order, for "expiring soon" sweeps with keyset pagination.
+        Index("ix_oauth_tokens_expires_at_utc", "expires_at_utc", "oauth_token_id"),
+    )
+
+
+
+# Where the last incremental mailbox sync of an account left off:
+# a Gmail `historyId` or a Microsoft Graph `@odata.deltaLink`.
+class MailSyncCursor(Base):
+    __tablename__ = "mail_sync_cursors"
+
+    mail_sync_cursor_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+    )
+
+    user_mail_account_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("user_mail_accounts.user_mail_account_id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+
+    cursor_txt: Mapped[str] = mapped_column(
+        Text,
+        nullable=False,
+    )
+
+    synced_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+    created_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    modified_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    user_mail_account: Mapped["UserMailAccount"] = relationship(
+        back_populates="sync_cursor",
+    )
+
+
+# Nonces of consumed OAuth login states (see `api.auth.state`). A nonce is kept until its state
+# would have expired anyway, so every API process rejects a second use of the state.
+class OAuthStateNonce(Base):
+    __tablename__ = "oauth_state_nonces"
+
+    nonce_txt: Mapped[str] = mapped_column(
+        String(64),
+        primary_key=True,
+    )
+
+    expires_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        # Expired nonces, for the periodic purge.
+        Index("ix_oauth_state_nonces_expires_at_utc", "expires_at_utc"),
+    )
+
+
+# Audit log of authentication events, written in bulk by `api.core.audit`.
+# On PostgreSQL the table is range-partitioned by month on `occurred_at_utc` (see the migration
+# and `AuthEventRepository`), so old events are removed by dropping whole partitions; the
+# partition key is therefore part of the primary key.
+class AuthEvent(Base):
+    __tablename__ = "auth_events"
+
+    auth_event_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+    )
+
+    occurred_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+    )
+
+    # An `AuditEventType` value.
+    event_type_txt: Mapped[str] = mapped_column(
+        String(50),
+        nullable=False,
+    )
+
+    email_address_txt: Mapped[str | None] = mapped_column(
+        String(255),
+        nullable=True,
+    )
+
+    provider_cd: Mapped[int | None] = mapped_column(
+        Integer,
+        nullable=True,
+    )
+
+    detail_txt: Mapped[str | None] = mapped_column(
+        Text,
+        nullable=True,
+    )
+
+    __table_args__ = (
+        # An account's events in time order.
+        Index("ix_auth_events_email_occurred", "email_address_txt", "occurred_at_utc"),
+        {"postgresql_partition_by": "RANGE (occurred_at_utc)"},
+    )
+
+
+# Outbound mail queued by `POST /mail/{email}/outbox` and sent by the workers of
+# `api.mail.send_queue`. Ids are allocated in enqueue order and double as each account's send
+# order.
+class MailSendJob(Base):
+    __tablename__ = "mail_send_jobs"
+
+    # SQLite only autoincrements INTEGER primary keys.
+    mail_send_job_id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+
+    user_mail_account_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("user_mail_accounts.user_mail_account_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+
+    # The RFC 822 message, base64url encoded; cleared once sent.
+    raw_message_txt: Mapped[str | None] = mapped_column(
+        Text,
+        nullable=True,
+    )
+
+    # A `MailSendStatus` value.
+    status_txt: Mapped[str] = mapped_column(
+        String(20),
+        nullable=False,
+    )
+
+    attempt_cnt: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        nullable=False,
+    )
+
+    # When a queued job is due, or when the lease of a job being sent runs out.
+    next_attempt_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+    last_error_txt: Mapped[str | None] = mapped_column(
+        Text,
+        nullable=True,
+    )
+
+    sent_at_utc: Mapped[datetime.datetime | None] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+    created_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    modified_at_utc: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        # Unfinished jobs by due time, for claims.
+        Index(
+            "ix_mail_send_jobs_due",
+            "next_attempt_at_utc",
+            postgresql_where=text("status_txt IN ('queued', 'sending')"),
+        ),
+        # An account's unfinished jobs in send order, for per-account ordering and caps.
+        Index(
+            "ix_mail_send_jobs_account_unfinished",
+            "user_mail_account_id",
+            "mail_send_job_id",
+            postgresql_where=text("status_txt IN ('queued', 'sending')"),
+        ),
+    )
@@ -0,0 +1,94 @@
+import datetime
+import re
+
+from sqlalchemy import insert, text
+
+from api.core.metrics import timed_commit
+from api.models.schema import AuthEvent
+from api.repositories.base import BaseRepository
+
+# Columns written by `insert_many`, in COPY order.
+COLUMNS = [column.name for column in AuthEvent.__table__.columns]
+
+# Monthly partitions of `auth_events` are named `auth_events_pYYYY_MM`.
+PARTITION_NAME = re.compile(r"^auth_events_p(\d{4})_(\d{2})$")
+
+PARTITIONS_QUERY = text(
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+    "WHERE parent.relname = 'auth_events'"
+)
+
+
+def _month_start(day: datetime.date, months_ahead: int = 0) -> datetime.date:
+    month = day.year * 12 + day.month - 1 + months_ahead
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+
+# Name and `[start, end)` bounds of the monthly partition holding `day`.
+def monthly_partition(day: datetime.date) -> tuple[str, datetime.date, datetime.date]:
+    start = _month_start(day)
+    return f"auth_events_p{start:%Y_%m}", start, _month_start(start, 1)
+
+
+# Writes and maintains the authentication audit log (`auth_events`).
+# On PostgreSQL the table is range-partitioned by month: `ensure_partitions` creates upcoming
+# months ahead of time and retention drops whole expired partitions, which costs no more than
+# dropping a table (no bulk DELETE, no vacuum). Rows outside every monthly partition land in
+# `auth_events_default`.
+class AuthEventRepository(BaseRepository):
+    # Inserts `events` (dicts keyed by column name) and commits. On PostgreSQL the rows are
+    # streamed with COPY over the session's asyncpg connection; elsewhere they are written by
+    # one executemany INSERT.
+    async def insert_many(self, events: list[dict]) -> None:
+        if not events:
+            return
+        if self.session.get_bind().dialect.name == "postgresql":
+            connection = await (await self.session.connection()).get_raw_connection()
+            await connection.driver_connection.copy_records_to_table(
+                AuthEvent.__tablename__,
+                records=[tuple(event.get(name) for name in COLUMNS) for event in events],
+                columns=COLUMNS,
+            )
+        else:
+            await self.session.execute(
+                insert(AuthEvent), [{name: event.get(name) for name in COLUMNS} for event in events]
+            )
+        with timed_commit("audit_insert"):
+            await self.session.commit()
+
+    # Creates the monthly partitions from the month of `today` through `months_ahead` months
+    # later, if missing (PostgreSQL only). Returns the partition names.
+    async def ensure_partitions(self, today: datetime.date, months_ahead: int) -> list[str]:
+        if self.session.get_bind().dialect.name != "postgresql":
+            return []
+        names = []
+        for offset in range(months_ahead + 1):
+            name, start, end = monthly_partition(_month_start(today, offset))
+            await self.session.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF auth_events "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                )
+            )
+            names.append(name)
+        await self.session.commit()
+        return names
+
+    # Drops the monthly partitions whose events are all older than `cutoff` (PostgreSQL only).
+    # Returns the dropped partition names.
+    async def drop_partitions_before(self, cutoff: datetime.date) -> list[str]:
+        if self.session.get_bind().dialect.name != "postgresql":
+            return []
+        dropped = []
+        for name in sorted((await self.session.execute(PARTITIONS_QUERY)).scalars()):
+            match = PARTITION_NAME.match(name)
+            if match is None:
+                continue
+            _, _, end = monthly_partition(datetime.date(int(match[1]), int(match[2]), 1))
+            if end <= cutoff:
+                await self.session.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        await self.session.commit()
+        return dropped
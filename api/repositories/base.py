@@ -1,5 +1,70 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, TypeVar
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.core.database import ReplicaSessionLocal
+from api.core.metrics import count_db_read
+from api.core.replica import read_router
+
+T = TypeVar("T")
+
+# Replica failures after which a read is retried on the primary.
+REPLICA_ERRORS = (DBAPIError, OSError, TimeoutError)
+
+
+# Repositories write through `session` (the primary). Reads that go through `read` may run on
+# the read replica instead, if the repository was created with `read_replica=True`: only
+# callers that neither write nor need data newer than the replication lag should opt in.
 class BaseRepository:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, read_replica: bool = False):
         self.session = session
+        self.read_replica = read_replica
+
+    async def read(
+        self, query: Callable[[AsyncSession], Awaitable[T]], account: Hashable | None = None
+    ) -> T:
+        # Runs the read-only `query` on a replica session when allowed and `read_router` sends
+        # reads of `account` there, and on `session` otherwise. Rows read from the replica are
+        # detached once its session closes. If the replica fails, it is taken out of rotation
+        # and the query runs on the primary.
+        if not (self.read_replica and read_router.use_replica(account)):
+            count_db_read("primary")
+            return await query(self.session)
+        try:
+            async with ReplicaSessionLocal() as session:
+                result = await query(session)
+        except REPLICA_ERRORS as e:
+            read_router.mark_failed(e)
+            count_db_read("failover")
+            return await query(self.session)
+        count_db_read("replica")
+        return result
+
+    async def keyset_pages(
+        self,
+        stmt: Select,
+        key_columns: list,
+        key: Callable[[Row], tuple[Any, ...]],
+        page_size: int,
+        after: tuple[Any, ...] | None = None,
+    ) -> AsyncIterator[list[Row]]:
+        # Streams the results of `stmt` page by page using keyset pagination.
+        # Each page continues strictly after the `key` of the previous page's last row, ordered
+        # by `key_columns`, so with a matching index every page costs the same no matter how deep
+        # the sweep is (unlike OFFSET, which rescans all skipped rows).
+        # Pass `after` to resume a previous sweep from a saved key.
+        while True:
+            page_stmt = stmt.order_by(*key_columns).limit(page_size)
+            if after is not None:
+                page_stmt = page_stmt.where(tuple_(*key_columns) > tuple_(*after))
+            rows = (await self.session.execute(page_stmt)).all()
+            if not rows:
+                return
+            # Read the key before yielding: the caller may commit and expire the loaded rows.
+            after = key(rows[-1])
+            yield rows
+            if len(rows) < page_size:
+                return
@@ -0,0 +1,204 @@
+import datetime
+import uuid
+from typing import NamedTuple
+
+from sqlalchemy import DateTime, and_, bindparam, case, exists, func, or_, select, update
+
+from api.core.metrics import timed_commit
+from api.models.enums import MailSendStatus
+from api.models.schema import MailSendJob, UserMailAccount
+from api.repositories.base import BaseRepository
+
+QUEUED = MailSendStatus.QUEUED.value
+SENDING = MailSendStatus.SENDING.value
+SENT = MailSendStatus.SENT.value
+
+
+# A job claimed by a worker: what it needs to send the message, and the attempt it is on.
+class ClaimedJob(NamedTuple):
+    mail_send_job_id: int
+    email: str
+    raw_message: str
+    attempt: int
+
+
+# The outbound mail queue (`mail_send_jobs`).
+# Workers claim due jobs with one UPDATE whose candidate rows are picked with
+# `FOR UPDATE SKIP LOCKED` on PostgreSQL: concurrent workers skip each other's rows instead of
+# waiting on them, so every job goes to exactly one worker and adding workers adds throughput.
+# Other databases serialise writes, which keeps that single statement's claims disjoint too.
+class MailSendJobRepository(BaseRepository):
+    # Queues `raw_message` for sending from the account, due immediately, and commits.
+    async def enqueue(self, user_mail_account_id: uuid.UUID, raw_message: str) -> MailSendJob:
+        job = MailSendJob(
+            user_mail_account_id=user_mail_account_id,
+            raw_message_txt=raw_message,
+            status_txt=QUEUED,
+            attempt_cnt=0,
+            next_attempt_at_utc=datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None),
+        )
+        self.session.add(job)
+        with timed_commit("mail_send_enqueue"):
+            await self.session.commit()
+        await self.session.refresh(job)
+        return job
+
+    async def get(
+        self, mail_send_job_id: int, user_mail_account_id: uuid.UUID
+    ) -> MailSendJob | None:
+        return await self.session.scalar(
+            select(MailSendJob).where(
+                MailSendJob.mail_send_job_id == mail_send_job_id,
+                MailSendJob.user_mail_account_id == user_mail_account_id,
+            )
+        )
+
+    # Claims up to `limit` due jobs for `lease_seconds` and commits. Returns them in id order.
+    async def claim(
+        self,
+        now: datetime.datetime,
+        limit: int,
+        lease_seconds: float,
+        account_concurrency: int,
+    ) -> list[ClaimedJob]:
+        rows = (
+            await self.session.execute(
+                self._build_claim_statement(now, limit, lease_seconds, account_concurrency)
+            )
+        ).all()
+        emails = {}
+        if rows:
+            emails = dict(
+                (
+                    await self.session.execute(
+                        select(
+                            UserMailAccount.user_mail_account_id,
+                            UserMailAccount.email_address_txt,
+                        ).where(
+                            UserMailAccount.user_mail_account_id.in_(
+                                {row.user_mail_account_id for row in rows}
+                            )
+                        )
+                    )
+                ).all()
+            )
+        with timed_commit("mail_send_claim"):
+            await self.session.commit()
+        return [
+            ClaimedJob(
+                row.mail_send_job_id,
+                emails.get(row.user_mail_account_id),
+                row.raw_message_txt,
+                row.attempt_cnt,
+            )
+            for row in sorted(rows, key=lambda row: row.mail_send_job_id)
+        ]
+
+    @staticmethod
+    def _build_claim_statement(
+        now: datetime.datetime, limit: int, lease_seconds: float, account_concurrency: int
+    ):
+        # A job is due once `next_attempt_at_utc` has passed: a queued job at its (retry) time,
+        # a job being sent when its lease ran out. It is only claimable while fewer than
+        # `account_concurrency` other jobs of its account are being sent or queued ahead of it,
+        # so an account never has more jobs in flight than that, taken in enqueue order (its
+        # first unfinished jobs). The check stops after `account_concurrency` matching rows.
+        jobs = MailSendJob.__table__
+        candidate = jobs.alias("candidate")
+        other = jobs.alias("other")
+        blocking = (
+            select(other.c.mail_send_job_id)
+            .where(
+                other.c.user_mail_account_id == candidate.c.user_mail_account_id,
+                other.c.mail_send_job_id != candidate.c.mail_send_job_id,
+                or_(
+                    other.c.status_txt == SENDING,
+                    and_(
+                        other.c.status_txt == QUEUED,
+                        other.c.mail_send_job_id < candidate.c.mail_send_job_id,
+                    ),
+                ),
+            )
+            .offset(account_concurrency - 1)
+            .limit(1)
+        )
+        candidates = (
+            select(candidate.c.mail_send_job_id)
+            .where(
+                candidate.c.status_txt.in_([QUEUED, SENDING]),
+                candidate.c.next_attempt_at_utc <= now,
+                ~exists(blocking),
+            )
+            .order_by(candidate.c.next_attempt_at_utc, candidate.c.mail_send_job_id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return (
+            update(jobs)
+            .where(jobs.c.mail_send_job_id.in_(candidates.scalar_subquery()))
+            .values(
+                status_txt=SENDING,
+                attempt_cnt=jobs.c.attempt_cnt + 1,
+                next_attempt_at_utc=now + datetime.timedelta(seconds=lease_seconds),
+                modified_at_utc=now,
+            )
+            .returning(
+                jobs.c.mail_send_job_id,
+                jobs.c.user_mail_account_id,
+                jobs.c.raw_message_txt,
+                jobs.c.attempt_cnt,
+            )
+        )
+
+    async def finish(self, results: list[dict]) -> None:
+        # Records the outcome of claimed jobs in one executemany round trip and commits.
+        # Each dict holds `mail_send_job_id`, the `attempt` it was claimed for, and the new
+        # `status_txt`, `next_attempt_at_utc`, `last_error_txt` and `sent_at_utc`. A job whose
+        # lease ran out and was claimed again since is left to its new owner. Sent jobs drop
+        # their message; dead letters keep it.
+        if not results:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        jobs = MailSendJob.__table__
+        stmt = (
+            update(jobs)
+            .where(
+                jobs.c.mail_send_job_id == bindparam("b_id"),
+                jobs.c.attempt_cnt == bindparam("b_attempt"),
+                jobs.c.status_txt == SENDING,
+            )
+            .values(
+                status_txt=bindparam("b_status"),
+                next_attempt_at_utc=func.coalesce(
+                    bindparam("b_next", type_=DateTime()), jobs.c.next_attempt_at_utc
+                ),
+                last_error_txt=bindparam("b_error"),
+                sent_at_utc=bindparam("b_sent", type_=DateTime()),
+                raw_message_txt=case(
+                    (bindparam("b_status") == SENT, None), else_=jobs.c.raw_message_txt
+                ),
+                modified_at_utc=now,
+            )
+        )
+        await self.session.execute(
+            stmt,
+            [
+                {
+                    "b_id": result["mail_send_job_id"],
+                    "b_attempt": result["attempt"],
+                    "b_status": result["status_txt"],
+                    "b_next": result.get("next_attempt_at_utc"),
+                    "b_error": result.get("last_error_txt"),
+                    "b_sent": result.get("sent_at_utc"),
+                }
+                for result in results
+            ],
+        )
+        with timed_commit("mail_send_finish"):
+            await self.session.commit()
+
+    async def count_by_status(self) -> dict[str, int]:
+        rows = await self.session.execute(
+            select(MailSendJob.status_txt, func.count()).group_by(MailSendJob.status_txt)
+        )
+        return dict(rows.all())
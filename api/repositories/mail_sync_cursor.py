@@ -0,0 +1,59 @@
+import datetime
+import uuid
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.core.replica import read_router
+from api.models.schema import MailSyncCursor
+from api.repositories.base import BaseRepository
+
+
+class MailSyncCursorRepository(BaseRepository):
+    def __init__(self, session: AsyncSession, read_replica: bool = False):
+        super().__init__(session, read_replica)
+
+    async def get_cursor(self, user_mail_account_id: uuid.UUID) -> str | None:
+        stmt = select(MailSyncCursor.cursor_txt).where(
+            MailSyncCursor.user_mail_account_id == user_mail_account_id
+        )
+
+        async def query(session: AsyncSession) -> str | None:
+            return await session.scalar(stmt)
+
+        return await self.read(query, account=user_mail_account_id)
+
+    async def save_cursor(self, user_mail_account_id: uuid.UUID, cursor: str) -> None:
+        # Inserts or replaces the account's cursor and commits.
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        if self.session.get_bind().dialect.name == "postgresql":
+            stmt = pg_insert(MailSyncCursor).values(
+                mail_sync_cursor_id=uuid.uuid4(),
+                user_mail_account_id=user_mail_account_id,
+                cursor_txt=cursor,
+                synced_at_utc=now,
+            )
+            await self.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[MailSyncCursor.user_mail_account_id],
+                    set_={
+                        "cursor_txt": stmt.excluded.cursor_txt,
+                        "synced_at_utc": stmt.excluded.synced_at_utc,
+                        "modified_at_utc": func.now(),
+                    },
+                )
+            )
+        else:
+            row = await self.session.scalar(
+                select(MailSyncCursor).where(
+                    MailSyncCursor.user_mail_account_id == user_mail_account_id
+                )
+            )
+            if row is None:
+                row = MailSyncCursor(user_mail_account_id=user_mail_account_id)
+                self.session.add(row)
+            row.cursor_txt = cursor
+            row.synced_at_utc = now
+        await self.session.commit()
+        read_router.mark_written(user_mail_account_id)
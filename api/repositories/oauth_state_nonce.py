@@ -0,0 +1,40 @@
+import datetime
+
+from sqlalchemy import delete, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from api.models.schema import OAuthStateNonce
+from api.repositories.base import BaseRepository
+
+
+class OAuthStateNonceRepository(BaseRepository):
+    # Records `nonce` as used until `expires_at` and commits. Returns False, without changing
+    # anything, if it was already recorded: the primary key makes this atomic across processes.
+    async def claim(self, nonce: str, expires_at: datetime.datetime) -> bool:
+        values = {"nonce_txt": nonce, "expires_at_utc": expires_at}
+        if self.session.get_bind().dialect.name == "postgresql":
+            result = await self.session.execute(
+                pg_insert(OAuthStateNonce)
+                .values(**values)
+                .on_conflict_do_nothing(index_elements=[OAuthStateNonce.nonce_txt])
+                .returning(OAuthStateNonce.nonce_txt)
+            )
+            claimed = result.first() is not None
+        else:
+            try:
+                await self.session.execute(insert(OAuthStateNonce).values(**values))
+            except IntegrityError:
+                await self.session.rollback()
+                return False
+            claimed = True
+        await self.session.commit()
+        return claimed
+
+    # Deletes nonces that expired before `now` and commits. Returns how many were deleted.
+    async def purge_expired(self, now: datetime.datetime) -> int:
+        result = await self.session.execute(
+            delete(OAuthStateNonce).where(OAuthStateNonce.expires_at_utc < now)
+        )
+        await self.session.commit()
+        return result.rowcount
@@ -0,0 +1,371 @@
+import datetime
+import uuid
+from typing import AsyncIterator, NamedTuple
+from sqlalchemy import DateTime, bindparam, column, func, or_, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.core.config import settings
+from api.core.invalidation import (
+    account_change_notification,
+    evict_unpublished,
+    publishes_invalidations,
+)
+from api.core.replica import read_router
+from api.core.security import encryption_helper
+from api.models.schema import UserMailAccount, OAuthToken
+from api.repositories.base import BaseRepository
+
+
+# Decrypted view of a stored token together with its account's provider.
+# Returned by read paths instead of ORM rows, so plaintext never sits on a mapped object
+# that could be flushed back to the database. `modified_at_utc` is the row version that was
+# read: writes derived from it (refresh results) are guarded with it. `refresh_failure_cnt` and
+# `refresh_revoked` describe failed refreshes (see `TokenRefreshEngine`).
+class StoredToken(NamedTuple):
+    oauth_token_id: uuid.UUID
+    user_mail_account_id: uuid.UUID
+    provider_cd: int
+    access_token: str
+    refresh_token: str | None
+    expires_at_utc: datetime.datetime
+    modified_at_utc: datetime.datetime | None = None
+    refresh_failure_cnt: int = 0
+    refresh_revoked: bool = False
+
+    @classmethod
+    def from_row(
+        cls, token: OAuthToken, provider_cd: int, access_token: str, refresh_token: str | None
+    ) -> "StoredToken":
+        return cls(
+            oauth_token_id=token.oauth_token_id,
+            user_mail_account_id=token.user_mail_account_id,
+            provider_cd=provider_cd,
+            access_token=access_token,
+            refresh_token=refresh_token,
+            expires_at_utc=token.expires_at_utc,
+            modified_at_utc=token.modified_at_utc,
+            refresh_failure_cnt=token.refresh_failure_cnt,
+            refresh_revoked=token.refresh_revoked_flg,
+        )
+
+
+# Column values written with every successful refresh: the refresh failure state is cleared.
+REFRESH_SUCCEEDED = {
+    "refresh_failure_cnt": 0,
+    "next_refresh_at_utc": None,
+    "refresh_revoked_flg": False,
+}
+
+
+# Maps an account id onto the signed 64-bit key space of PostgreSQL advisory locks.
+def advisory_lock_key(user_mail_account_id: uuid.UUID) -> int:
+    return int.from_bytes(user_mail_account_id.bytes[:8], "big", signed=True)
+
+
+class OAuthTokenRepository(BaseRepository):
+    def __init__(self, session: AsyncSession, read_replica: bool = False):
+        super().__init__(session, read_replica)
+
+    async def lock_account(self, user_mail_account_id: uuid.UUID) -> None:
+        # Takes a transaction-scoped PostgreSQL advisory lock on the account, waiting for any
+        # other process holding it. Released on commit or rollback.
+        await self.session.execute(
+            select(func.pg_advisory_xact_lock(advisory_lock_key(user_mail_account_id)))
+        )
+
+    async def get_stored(self, oauth_token_id: uuid.UUID) -> StoredToken | None:
+        # Re-reads a single token (decrypted), e.g. after waiting on its account lock.
+        row = (
+            await self.session.execute(
+                select(OAuthToken, UserMailAccount.provider_cd)
+                .join(OAuthToken.user_mail_account)
+                .where(OAuthToken.oauth_token_id == oauth_token_id)
+            )
+        ).first()
+        if row is None:
+            return None
+        token, provider_cd = row
+        access_token, refresh_token = await encryption_helper.decrypt_many(
+            [token.access_token_txt, token.refresh_token_txt]
+        )
+        return StoredToken.from_row(token, provider_cd, access_token, refresh_token)
+
+    async def iter_expiring(
+        self,
+        expires_before: datetime.datetime,
+        page_size: int,
+        provider_cd: int | None = None,
+        now: datetime.datetime | None = None,
+    ) -> AsyncIterator[list[StoredToken]]:
+        # Pages of refreshable tokens of active accounts that expire before the given time,
+        # soonest first, decrypted off the event loop. Tokens whose refresh token the provider
+        # rejected are left out, and with `now` so are tokens backing off after failed
+        # refreshes (`next_refresh_at_utc` still ahead).
+        # Keyset-paginated on (expires_at_utc, oauth_token_id), served by the expiry index.
+        stmt = (
+            select(OAuthToken, UserMailAccount.provider_cd)
+            .join(OAuthToken.user_mail_account)
+            .where(
+                OAuthToken.expires_at_utc <= expires_before,
+                OAuthToken.refresh_token_txt.is_not(None),
+                OAuthToken.refresh_revoked_flg.is_(False),
+                UserMailAccount.is_active_flg.is_(True),
+            )
+        )
+        if provider_cd is not None:
+            stmt = stmt.where(UserMailAccount.provider_cd == provider_cd)
+        if now is not None:
+            stmt = stmt.where(
+                or_(
+                    OAuthToken.next_refresh_at_utc.is_(None),
+                    OAuthToken.next_refresh_at_utc <= now,
+                )
+            )
+
+        async for rows in self.keyset_pages(
+            stmt,
+            [OAuthToken.expires_at_utc, OAuthToken.oauth_token_id],
+            lambda row: (row[0].expires_at_utc, row[0].oauth_token_id),
+            page_size,
+        ):
+            access_tokens = await encryption_helper.decrypt_many(
+                [token.access_token_txt for token, _ in rows]
+            )
+            refresh_tokens = await encryption_helper.decrypt_many(
+                [token.refresh_token_txt for token, _ in rows]
+            )
+            yield [
+                StoredToken.from_row(token, provider_cd, access_token, refresh_token)
+                for (token, provider_cd), access_token, refresh_token in zip(
+                    rows, access_tokens, refresh_tokens
+                )
+            ]
+
+    async def iter_encrypted(
+        self, page_size: int, after: uuid.UUID | None = None
+    ) -> AsyncIterator[list[tuple[uuid.UUID, str, str | None]]]:
+        # Pages of raw (still encrypted) token values in primary key order, for re-encryption.
+        # `after` resumes from the last oauth_token_id of an earlier run.
+        stmt = select(
+            OAuthToken.oauth_token_id,
+            OAuthToken.access_token_txt,
+            OAuthToken.refresh_token_txt,
+        )
+        async for rows in self.keyset_pages(
+            stmt,
+            [OAuthToken.oauth_token_id],
+            lambda row: (row.oauth_token_id,),
+            page_size,
+            after=(after,) if after is not None else None,
+        ):
+            yield [tuple(row) for row in rows]
+
+    async def bulk_update_tokens(self, updates: list[dict]) -> None:
+        # Applies many token updates in one executemany round trip.
+        # Each dict must contain `oauth_token_id` plus the columns to change; plaintext
+        # `access_token_txt`/`refresh_token_txt` values are encrypted here before writing.
+        # A dict may also carry `if_unmodified_since`, the `modified_at_utc` its values were
+        # derived from (see `StoredToken`): the row is then left alone if it was modified since
+        # (e.g. by a login while the provider was called or the update was buffered).
+        # `modified_at_utc` is written with the database clock, like every other write. Updates
+        # are refresh results, so they also clear the refresh failure state.
+        updates = [dict(values) for values in updates]
+        for column in ("access_token_txt", "refresh_token_txt"):
+            targets = [values for values in updates if values.get(column) is not None]
+            encrypted = await encryption_helper.encrypt_many(
+                [values[column] for values in targets]
+            )
+            for values, ciphertext in zip(targets, encrypted):
+                values[column] = ciphertext
+        await self.bulk_update_encrypted(updates)
+
+    async def bulk_update_encrypted(self, updates: list[dict]) -> None:
+        # Same as `bulk_update_tokens`, for token values that are already encrypted.
+        # The changed accounts are evicted from every node's caches once this commits, and
+        # read from the primary by this process for a while (see `ReadRouter.mark_written`).
+        if not updates:
+            return
+        changed = []
+        if self.session.get_bind().dialect.name == "postgresql":
+            result = await self.session.execute(
+                self._build_bulk_update_statement(
+                    updates,
+                    notify=publishes_invalidations(self.session),
+                    return_accounts=read_router.enabled,
+                )
+            )
+            if read_router.enabled:
+                changed = [key for row in result for key in row[:2]]
+        else:
+            await self.session.execute(
+                self._build_guarded_update_statement(),
+                [
+                    {
+                        "b_id": values["oauth_token_id"],
+                        "b_access": values.get("access_token_txt"),
+                        "b_refresh": values.get("refresh_token_txt"),
+                        "b_expires": values.get("expires_at_utc"),
+                        "b_since": values.get("if_unmodified_since"),
+                    }
+                    for values in updates
+                ],
+            )
+            changed = await self._accounts_of([values["oauth_token_id"] for values in updates])
+        await self.session.commit()
+        evict_unpublished(self.session, *changed)
+        read_router.mark_written(*changed)
+
+    async def record_refresh_failures(self, failures: list[dict]) -> None:
+        # Records failed refreshes and commits. Each dict holds `oauth_token_id`, the
+        # `if_unmodified_since` of the token that was refreshed, the `next_refresh_at_utc` to
+        # back off to and `refresh_revoked_flg`. A token modified since it was read (a login,
+        # or another process's successful refresh) is left alone. `modified_at_utc` is kept,
+        # so a refresh result guarded with it (e.g. a rotated token still being written by
+        # another process) is not rejected because of this bookkeeping.
+        if not failures:
+            return
+        tokens = OAuthToken.__table__
+        stmt = (
+            update(tokens)
+            .where(
+                tokens.c.oauth_token_id == bindparam("b_id"),
+                or_(
+                    bindparam("b_since", type_=DateTime()).is_(None),
+                    tokens.c.modified_at_utc <= bindparam("b_since", type_=DateTime()),
+                ),
+            )
+            .values(
+                refresh_failure_cnt=tokens.c.refresh_failure_cnt + 1,
+                next_refresh_at_utc=bindparam("b_next", type_=DateTime()),
+                refresh_revoked_flg=bindparam("b_revoked"),
+                modified_at_utc=tokens.c.modified_at_utc,
+            )
+        )
+        await self.session.execute(
+            stmt,
+            [
+                {
+                    "b_id": failure["oauth_token_id"],
+                    "b_since": failure.get("if_unmodified_since"),
+                    "b_next": failure.get("next_refresh_at_utc"),
+                    "b_revoked": failure.get("refresh_revoked_flg", False),
+                }
+                for failure in failures
+            ],
+        )
+        await self.session.commit()
+
+    async def _accounts_of(self, oauth_token_ids: list[uuid.UUID]) -> list:
+        # Account ids and emails of the given tokens, for cache eviction and read routing.
+        if not (settings.CACHE_INVALIDATION_ENABLED or read_router.enabled):
+            return []
+        rows = await self.session.execute(
+            select(UserMailAccount.user_mail_account_id, UserMailAccount.email_address_txt)
+            .join(OAuthToken.user_mail_account)
+            .where(OAuthToken.oauth_token_id.in_(oauth_token_ids))
+        )
+        return [key for row in rows for key in row]
+
+    @staticmethod
+    def _build_bulk_update_statement(
+        updates: list[dict],
+        notify: bool = False,
+        return_accounts: bool = False,
+    ):
+        # One `UPDATE ... FROM (VALUES ...)` statement for all rows. A column missing from a
+        # row keeps its stored value (e.g. `refresh_token_txt` when the provider did not
+        # rotate it), and a row modified after its `if_unmodified_since` is skipped. With
+        # `notify`, each updated row also publishes its account's change to the other nodes'
+        # caches; with `return_accounts`, the id and email of each updated row's account are
+        # returned (both join the account).
+        tokens = OAuthToken.__table__
+        columns = [
+            name
+            for name in ("access_token_txt", "refresh_token_txt", "expires_at_utc")
+            if any(name in values for values in updates)
+        ]
+        guarded = any("if_unmodified_since" in values for values in updates)
+        row_columns = columns + ["if_unmodified_since"] * guarded
+        rows = values(
+            column("oauth_token_id", tokens.c.oauth_token_id.type),
+            *(column(name, tokens.c[name].type) for name in columns),
+            *[column("if_unmodified_since", tokens.c.modified_at_utc.type)] * guarded,
+            name="updates",
+        ).data([(u["oauth_token_id"], *(u.get(name) for name in row_columns)) for u in updates])
+        stmt = (
+            update(tokens)
+            .where(tokens.c.oauth_token_id == rows.c.oauth_token_id)
+            .values(
+                modified_at_utc=func.now(),
+                **REFRESH_SUCCEEDED,
+                **{
+                    name: func.coalesce(rows.c[name], tokens.c[name])
+                    for name in columns
+                },
+            )
+        )
+        if guarded:
+            stmt = stmt.where(
+                or_(
+                    rows.c.if_unmodified_since.is_(None),
+                    tokens.c.modified_at_utc <= rows.c.if_unmodified_since,
+                )
+            )
+        if notify or return_accounts:
+            accounts = UserMailAccount.__table__
+            returned = [accounts.c.user_mail_account_id, accounts.c.email_address_txt]
+            if notify:
+                returned.append(account_change_notification(*returned))
+            stmt = stmt.where(
+                accounts.c.user_mail_account_id == tokens.c.user_mail_account_id
+            ).returning(*returned)
+        return stmt
+
+    @staticmethod
+    def _build_guarded_update_statement():
+        # Per-row UPDATE for executemany on other databases, with the same semantics as
+        # `_build_bulk_update_statement`: missing (None) values keep the stored ones.
+        tokens = OAuthToken.__table__
+        return (
+            update(tokens)
+            .where(
+                tokens.c.oauth_token_id == bindparam("b_id"),
+                or_(
+                    bindparam("b_since", type_=DateTime()).is_(None),
+                    tokens.c.modified_at_utc <= bindparam("b_since", type_=DateTime()),
+                ),
+            )
+            .values(
+                access_token_txt=func.coalesce(bindparam("b_access"), tokens.c.access_token_txt),
+                refresh_token_txt=func.coalesce(
+                    bindparam("b_refresh"), tokens.c.refresh_token_txt
+                ),
+                expires_at_utc=func.coalesce(
+                    bindparam("b_expires", type_=DateTime()), tokens.c.expires_at_utc
+                ),
+                modified_at_utc=func.now(),
+                **REFRESH_SUCCEEDED,
+            )
+        )
+
+    async def bulk_swap_encrypted(self, swaps: list[dict]) -> None:
+        # Compare-and-set rewrite of token ciphertexts, used by re-encryption.
+        # Each dict holds `b_id`, the `b_old_*` values that were read and the `b_new_*` values
+        # to write; rows changed since they were read (a new login or refresh) are left alone.
+        if not swaps:
+            return
+        tokens = OAuthToken.__table__
+        stmt = (
+            update(tokens)
+            .where(
+                tokens.c.oauth_token_id == bindparam("b_id"),
+                tokens.c.access_token_txt == bindparam("b_old_access"),
+                tokens.c.refresh_token_txt.is_not_distinct_from(bindparam("b_old_refresh")),
+            )
+            .values(
+                access_token_txt=bindparam("b_new_access"),
+                refresh_token_txt=bindparam("b_new_refresh"),
+            )
+        )
+        await self.session.execute(stmt, swaps)
+        await self.session.commit()
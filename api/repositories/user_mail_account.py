@@ -1,17 +1,36 @@
 import datetime
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+import uuid
+from typing import AsyncIterator
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import aliased, selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api.core.audit import audit_log
+from api.core.invalidation import (
+    account_change_notification,
+    evict_unpublished,
+    publish_flush,
+    publishes_invalidations,
+)
+from api.core.metrics import timed_commit
+from api.core.replica import read_router
+from api.core.security import encryption_helper
 from api.models.schema import UserMailAccount, OAuthToken
 from api.repositories.base import BaseRepository
+from api.repositories.oauth_token import REFRESH_SUCCEEDED, StoredToken
 from api.auth.schemas import UserInfo, TokenData
-from api.models.enums import Provider
+from api.models.enums import AuditEventType, Provider
+
+
+# Raised when an email is already registered with a different provider.
+class ProviderMismatchError(ValueError):
+    pass
 
 
 class UserMailAccountRepository(BaseRepository):
-    def __init__(self, session: AsyncSession):
-        super().__init__(session)
+    def __init__(self, session: AsyncSession, read_replica: bool = False):
+        super().__init__(session, read_replica)
 
     async def get_by_email(self, email: str) -> UserMailAccount | None:
         stmt = (
@@ -19,30 +38,337 @@ class UserMailAccountRepository(BaseRepository):
             .where(UserMailAccount.email_address_txt == email)
             .options(selectinload(UserMailAccount.oauth_token))
         )
-        result = await self.session.execute(stmt)
-        return result.scalars().first()
+
+        async def query(session: AsyncSession) -> UserMailAccount | None:
+            return (await session.execute(stmt)).scalars().first()
+
+        return await self.read(query, account=email)
+
+    async def get_active_token(self, email: str) -> StoredToken | None:
+        # The decrypted token of an active account, or None if there is none.
+        user = await self.get_by_email(email)
+        if user is None or not user.is_active_flg or user.oauth_token is None:
+            return None
+        token = user.oauth_token
+        return StoredToken.from_row(
+            token,
+            user.provider_cd,
+            encryption_helper.decrypt(token.access_token_txt),
+            encryption_helper.decrypt(token.refresh_token_txt)
+            if token.refresh_token_txt
+            else None,
+        )
+
+    async def iter_active_by_provider(
+        self, provider_cd: int, page_size: int
+    ) -> AsyncIterator[list[UserMailAccount]]:
+        # Pages of active accounts for one provider, keyset-paginated on the primary key
+        # and served by the partial active-accounts index.
+        stmt = select(UserMailAccount).where(
+            UserMailAccount.provider_cd == provider_cd,
+            UserMailAccount.is_active_flg.is_(True),
+        )
+        async for rows in self.keyset_pages(
+            stmt,
+            [UserMailAccount.user_mail_account_id],
+            lambda row: (row[0].user_mail_account_id,),
+            page_size,
+        ):
+            yield [user for (user,) in rows]
+
+    async def stream_export_rows(self, batch_size: int) -> AsyncIterator[list[dict]]:
+        # Streams every account with its decrypted token through a server-side cursor,
+        # `batch_size` rows at a time, so exporting never holds the whole table in memory.
+        stmt = (
+            select(
+                UserMailAccount.email_address_txt,
+                UserMailAccount.provider_cd,
+                UserMailAccount.is_active_flg,
+                OAuthToken.access_token_txt,
+                OAuthToken.refresh_token_txt,
+                OAuthToken.expires_at_utc,
+            )
+            .join(UserMailAccount.oauth_token)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.session.stream(stmt)
+        async for partition in result.partitions():
+            rows = [row._asdict() for row in partition]
+            for column in ("access_token_txt", "refresh_token_txt"):
+                decrypted = await encryption_helper.decrypt_many([row[column] for row in rows])
+                for row, value in zip(rows, decrypted):
+                    row[column] = value
+            yield rows
+
+    async def bulk_upsert(self, records: list[dict]) -> None:
+        # Creates or overwrites many accounts and their tokens, committing once per call.
+        # Each record holds the `user_mail_accounts`/`oauth_tokens` column values keyed by
+        # column name; when an email appears more than once, the last record wins.
+        records = [
+            dict(record)
+            for record in {record["email_address_txt"]: record for record in records}.values()
+        ]
+        if not records:
+            return
+        for column in ("access_token_txt", "refresh_token_txt"):
+            encrypted = await encryption_helper.encrypt_many([record[column] for record in records])
+            for record, value in zip(records, encrypted):
+                record[column] = value
+
+        if self.session.get_bind().dialect.name == "postgresql":
+            await self._bulk_upsert_postgresql(records)
+            await publish_flush(self.session)
+        else:
+            await self._bulk_upsert_generic(records)
+        await self.session.commit()
+        self.session.expunge_all()
+        emails = [record["email_address_txt"] for record in records]
+        evict_unpublished(self.session, *emails)
+        read_router.mark_written(*emails)
+
+    async def _bulk_upsert_postgresql(self, records: list[dict]) -> None:
+        # Two multi-row statements per batch: accounts first, then tokens keyed by the
+        # account ids returned from the first statement.
+        accounts = UserMailAccount.__table__
+        tokens = OAuthToken.__table__
+
+        account_insert = pg_insert(accounts).values(
+            [
+                {
+                    "user_mail_account_id": uuid.uuid4(),
+                    "email_address_txt": record["email_address_txt"],
+                    "provider_cd": record["provider_cd"],
+                    "is_active_flg": record["is_active_flg"],
+                }
+                for record in records
+            ]
+        )
+        account_stmt = account_insert.on_conflict_do_update(
+            index_elements=[accounts.c.email_address_txt],
+            set_={
+                "provider_cd": account_insert.excluded.provider_cd,
+                "is_active_flg": account_insert.excluded.is_active_flg,
+                "modified_at_utc": func.now(),
+            },
+        ).returning(accounts.c.email_address_txt, accounts.c.user_mail_account_id)
+        account_ids = dict((await self.session.execute(account_stmt)).all())
+
+        token_insert = pg_insert(tokens).values(
+            [
+                {
+                    "oauth_token_id": uuid.uuid4(),
+                    "user_mail_account_id": account_ids[record["email_address_txt"]],
+                    "access_token_txt": record["access_token_txt"],
+                    "refresh_token_txt": record["refresh_token_txt"],
+                    "expires_at_utc": record["expires_at_utc"],
+                }
+                for record in records
+            ]
+        )
+        await self.session.execute(
+            token_insert.on_conflict_do_update(
+                index_elements=[tokens.c.user_mail_account_id],
+                set_={
+                    "access_token_txt": token_insert.excluded.access_token_txt,
+                    "refresh_token_txt": token_insert.excluded.refresh_token_txt,
+                    "expires_at_utc": token_insert.excluded.expires_at_utc,
+                    "modified_at_utc": func.now(),
+                    **REFRESH_SUCCEEDED,
+                },
+            )
+        )
+
+    async def _bulk_upsert_generic(self, records: list[dict]) -> None:
+        for record in records:
+            user = await self.get_by_email(record["email_address_txt"])
+            if user is None:
+                user = UserMailAccount(email_address_txt=record["email_address_txt"])
+                self.session.add(user)
+            user.provider_cd = record["provider_cd"]
+            user.is_active_flg = record["is_active_flg"]
+
+            token = user.oauth_token
+            if token is None:
+                token = OAuthToken(user_mail_account=user)
+                self.session.add(token)
+            token.access_token_txt = record["access_token_txt"]
+            token.refresh_token_txt = record["refresh_token_txt"]
+            token.expires_at_utc = record["expires_at_utc"]
+            for name, value in REFRESH_SUCCEEDED.items():
+                setattr(token, name, value)
 
     async def create_or_update_user_with_token(
         self, user_info: UserInfo, token_data: TokenData, provider: int
     ) -> UserMailAccount:
-        user = await self.get_by_email(user_info.email)
-
         expires_at = (
             datetime.datetime.now(datetime.timezone.utc)
             + datetime.timedelta(seconds=token_data.expires_at)
         ).replace(tzinfo=None)
 
+        # Tokens are stored encrypted; the caller keeps its plaintext `token_data`.
+        token_data = token_data.model_copy(
+            update={
+                "access_token": encryption_helper.encrypt(token_data.access_token),
+                "refresh_token": encryption_helper.encrypt(token_data.refresh_token)
+                if token_data.refresh_token
+                else None,
+            }
+        )
+
+        if self.session.get_bind().dialect.name == "postgresql":
+            user = await self._upsert_postgresql(user_info, token_data, provider, expires_at)
+        else:
+            user = await self._upsert_generic(user_info, token_data, provider, expires_at)
+            evict_unpublished(self.session, user.user_mail_account_id, user_info.email)
+        read_router.mark_written(user_info.email, user.user_mail_account_id)
+        return user
+
+    @staticmethod
+    def _provider_name(provider_cd: int) -> str:
+        # Providers configured at runtime (see `OIDC_PROVIDERS_FILE`) have no `Provider` member.
+        if provider_cd in Provider._value2member_map_:
+            return Provider(provider_cd).name
+        return str(provider_cd)
+
+    @classmethod
+    def _provider_mismatch(cls, email: str, stored: int, requested: int) -> ProviderMismatchError:
+        return ProviderMismatchError(
+            f"Email '{email}' is already registered with provider "
+            f"'{cls._provider_name(stored)}'. "
+            f"Cannot register with '{cls._provider_name(requested)}'."
+        )
+
+    # Records the rejected login in the audit log, then raises the mismatch error.
+    async def _reject_provider_mismatch(self, email: str, stored: int, requested: int):
+        error = self._provider_mismatch(email, stored, requested)
+        await audit_log.record(
+            AuditEventType.PROVIDER_MISMATCH, email=email, provider_cd=requested, detail=str(error)
+        )
+        raise error
+
+    def _build_upsert_statement(
+        self,
+        user_info: UserInfo,
+        token_data: TokenData,
+        provider: int,
+        expires_at: datetime.datetime,
+        notify: bool = False,
+    ):
+        # One statement: upsert the account, then upsert its token from the account CTE.
+        # The account upsert only matches rows with the same provider, so a provider mismatch
+        # returns no row and leaves both tables untouched.
+        # With `notify`, the statement also publishes the change to the other nodes' caches.
+        accounts = UserMailAccount.__table__
+        tokens = OAuthToken.__table__
+
+        account_insert = pg_insert(accounts).values(
+            user_mail_account_id=uuid.uuid4(),
+            email_address_txt=user_info.email,
+            provider_cd=provider,
+            is_active_flg=True,
+        )
+        account_cte = (
+            account_insert.on_conflict_do_update(
+                index_elements=[accounts.c.email_address_txt],
+                set_={"modified_at_utc": func.now()},
+                where=accounts.c.provider_cd == account_insert.excluded.provider_cd,
+            )
+            .returning(*accounts.c)
+            .cte("account")
+        )
+
+        token_insert = pg_insert(tokens).from_select(
+            [
+                tokens.c.oauth_token_id,
+                tokens.c.user_mail_account_id,
+                tokens.c.access_token_txt,
+                tokens.c.refresh_token_txt,
+                tokens.c.expires_at_utc,
+            ],
+            select(
+                literal(uuid.uuid4(), tokens.c.oauth_token_id.type),
+                account_cte.c.user_mail_account_id,
+                literal(token_data.access_token, tokens.c.access_token_txt.type),
+                literal(token_data.refresh_token, tokens.c.refresh_token_txt.type),
+                literal(expires_at, tokens.c.expires_at_utc.type),
+            ),
+        )
+        token_cte = (
+            token_insert.on_conflict_do_update(
+                index_elements=[tokens.c.user_mail_account_id],
+                set_={
+                    "access_token_txt": token_insert.excluded.access_token_txt,
+                    # Keep the stored refresh token when the provider did not send a new one.
+                    "refresh_token_txt": func.coalesce(
+                        token_insert.excluded.refresh_token_txt, tokens.c.refresh_token_txt
+                    ),
+                    "expires_at_utc": token_insert.excluded.expires_at_utc,
+                    "modified_at_utc": func.now(),
+                    # A new refresh token ends any refresh failures of the old one.
+                    **{
+                        name: case(
+                            (token_insert.excluded.refresh_token_txt.is_not(None), value),
+                            else_=tokens.c[name],
+                        )
+                        for name, value in REFRESH_SUCCEEDED.items()
+                    },
+                },
+            )
+            .returning(tokens.c.oauth_token_id)
+            .cte("token")
+        )
+
+        account = aliased(UserMailAccount, account_cte)
+        stmt = select(account)
+        if notify:
+            stmt = stmt.add_columns(
+                account_change_notification(
+                    account_cte.c.user_mail_account_id, account_cte.c.email_address_txt
+                )
+            )
+        return stmt.add_cte(token_cte).execution_options(populate_existing=True)
+
+    async def _upsert_postgresql(
+        self,
+        user_info: UserInfo,
+        token_data: TokenData,
+        provider: int,
+        expires_at: datetime.datetime,
+    ) -> UserMailAccount:
+        stmt = self._build_upsert_statement(
+            user_info, token_data, provider, expires_at, publishes_invalidations(self.session)
+        )
+        user = (await self.session.execute(stmt)).scalars().first()
+
+        if user is None:
+            await self.session.rollback()
+            stored = await self.session.scalar(
+                select(UserMailAccount.provider_cd).where(
+                    UserMailAccount.email_address_txt == user_info.email
+                )
+            )
+            await self._reject_provider_mismatch(user_info.email, stored, provider)
+
+        # Detach the row so the values loaded from RETURNING survive the commit
+        # instead of being expired and reloaded with another query.
+        self.session.expunge(user)
+        with timed_commit("account_upsert"):
+            await self.session.commit()
+        return user
+
+    async def _upsert_generic(
+        self,
+        user_info: UserInfo,
+        token_data: TokenData,
+        provider: int,
+        expires_at: datetime.datetime,
+    ) -> UserMailAccount:
+        user = await self.get_by_email(user_info.email)
+
         if user:
-            # Convert stored provider code to enum
-            user_provider = Provider(user.provider_cd)
-            req_provider = Provider(provider)
-
-            # Ensure `provider` is also a Provider enum
-            # (if it's coming in as a string or int, normalize it first)
-            if user_provider.name != req_provider.name:
-                raise ValueError(
-                    f"Email '{user_info.email}' is already registered with provider "
-                    f"'{user_provider.name}'. Cannot register with '{req_provider.name}'."
+            if user.provider_cd != provider:
+                await self._reject_provider_mismatch(
+                    user_info.email, user.provider_cd, provider
                 )
 
             # Update existing user's token
@@ -53,7 +379,10 @@ class UserMailAccountRepository(BaseRepository):
 
             token.access_token_txt = token_data.access_token
             if token_data.refresh_token:
+                # A new refresh token ends any refresh failures of the old one.
                 token.refresh_token_txt = token_data.refresh_token
+                for name, value in REFRESH_SUCCEEDED.items():
+                    setattr(token, name, value)
             token.expires_at_utc = expires_at
 
         else:
@@ -72,6 +401,7 @@ class UserMailAccountRepository(BaseRepository):
             self.session.add(user)
             self.session.add(token)
 
-        await self.session.commit()
+        with timed_commit("account_upsert"):
+            await self.session.commit()
         await self.session.refresh(user)
         return user
@@ -0,0 +1,262 @@
+import asyncio
+import datetime
+import logging
+from typing import Callable
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.auth.base import BaseOAuth2
+from api.auth.registry import get_oauth_client_for_provider
+from api.core.config import settings
+from api.core.database import SessionLocal
+from api.core.ratelimit import Priority, call_context
+from api.core.singleflight import SingleFlight
+from api.repositories.oauth_token import OAuthTokenRepository, StoredToken
+from api.tokens.write_behind import token_write_behind
+
+logger = logging.getLogger(__name__)
+
+
+# Refreshes `token` with its provider and returns the `oauth_tokens` column values to write back.
+# The values are guarded with the row version that was read, so they are not written over a
+# login that rewrote the token meanwhile (see `OAuthTokenRepository.bulk_update_tokens`).
+# Raises if the provider call fails or returns an unusable payload.
+async def refresh_token_values(oauth_client: BaseOAuth2, token: StoredToken) -> dict:
+    payload = await oauth_client.refresh_access_token(token.refresh_token)
+
+    access_token = payload.get("access_token")
+    expires_in = payload.get("expires_in")
+    if not access_token or not expires_in:
+        raise ValueError("Provider returned an invalid refresh response")
+
+    values = {
+        "oauth_token_id": token.oauth_token_id,
+        "access_token_txt": access_token,
+        "expires_at_utc": (
+            datetime.datetime.now(datetime.timezone.utc)
+            + datetime.timedelta(seconds=int(expires_in))
+        ).replace(tzinfo=None),
+        "if_unmodified_since": token.modified_at_utc,
+    }
+    # Providers that rotate refresh tokens (e.g. Microsoft) return a new one.
+    if payload.get("refresh_token"):
+        values["refresh_token_txt"] = payload["refresh_token"]
+    return values
+
+
+# Whether a refresh failed because the provider rejected the refresh token itself
+# (`invalid_grant`: consent revoked, token expired or already rotated away). Retrying cannot
+# succeed until the user logs in again.
+def refresh_token_revoked(error: Exception) -> bool:
+    if not isinstance(error, httpx.HTTPStatusError) or error.response.status_code != 400:
+        return False
+    try:
+        body = error.response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("error") == "invalid_grant"
+
+
+# Returns the `OAuthTokenRepository.record_refresh_failures` entry for a failed refresh of
+# `token`: marked revoked, or backing off exponentially with the number of failures so far.
+def refresh_failure(token: StoredToken, error: Exception) -> dict:
+    failure = {
+        "oauth_token_id": token.oauth_token_id,
+        "if_unmodified_since": token.modified_at_utc,
+        "refresh_revoked_flg": refresh_token_revoked(error),
+    }
+    if not failure["refresh_revoked_flg"]:
+        delay = min(
+            settings.TOKEN_REFRESH_RETRY_MAX_SECONDS,
+            settings.TOKEN_REFRESH_RETRY_BASE_SECONDS * 2**token.refresh_failure_cnt,
+        )
+        failure["next_refresh_at_utc"] = (
+            datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=delay)
+        ).replace(tzinfo=None)
+    return failure
+
+
+# Process-wide single-flight group for provider refreshes, keyed by `user_mail_account_id`.
+# Concurrent refreshes of one account share a single token endpoint call, which saves quota
+# and keeps rotating refresh tokens (Microsoft) from being redeemed twice.
+refresh_flights = SingleFlight()
+
+
+# Refreshes `token` with its provider, writes the result back and returns the column values.
+# Concurrent callers for the same account in this process await one shared refresh.
+# With `TOKEN_REFRESH_ADVISORY_LOCK` on PostgreSQL the refresh also holds an advisory lock on the
+# account, so other processes queue behind it; a token refreshed elsewhere while waiting is
+# returned as stored, without another provider call.
+async def refresh_stored_token(
+    session_factory: async_sessionmaker[AsyncSession],
+    oauth_client: BaseOAuth2,
+    token: StoredToken,
+) -> dict:
+    return await refresh_flights.do(
+        token.user_mail_account_id,
+        lambda: _refresh_and_store(session_factory, oauth_client, token),
+    )
+
+
+# Whether refreshes through `session` take the cross-process advisory lock on the account.
+def _locks_accounts(session: AsyncSession) -> bool:
+    return (
+        settings.TOKEN_REFRESH_ADVISORY_LOCK and session.get_bind().dialect.name == "postgresql"
+    )
+
+
+async def _refresh_and_store(
+    session_factory: async_sessionmaker[AsyncSession],
+    oauth_client: BaseOAuth2,
+    token: StoredToken,
+) -> dict:
+    if settings.TOKEN_WRITE_BEHIND_ENABLED and not settings.TOKEN_REFRESH_ADVISORY_LOCK:
+        values = await refresh_token_values(oauth_client, token)
+        await token_write_behind.submit(values)
+        return values
+
+    async with session_factory() as session:
+        repo = OAuthTokenRepository(session)
+        if _locks_accounts(session):
+            await repo.lock_account(token.user_mail_account_id)
+            current = await repo.get_stored(token.oauth_token_id)
+            if current is not None and current.expires_at_utc > token.expires_at_utc:
+                return {
+                    "oauth_token_id": current.oauth_token_id,
+                    "access_token_txt": current.access_token,
+                    "expires_at_utc": current.expires_at_utc,
+                }
+            # Use the latest refresh token in case the provider rotated it.
+            token = current or token
+
+        values = await refresh_token_values(oauth_client, token)
+        # Commits, which also releases the advisory lock.
+        await repo.bulk_update_tokens([values])
+        return values
+
+
+# Background engine that keeps stored access tokens fresh.
+# Each sweep pages through `oauth_tokens` rows expiring within the configured horizon,
+# refreshes them against the provider token endpoint with bounded concurrency,
+# and writes each page of results back in a single batched UPDATE. Failed refreshes are
+# recorded too: the token is skipped by later sweeps until its backoff has passed
+# (`TOKEN_REFRESH_RETRY_*_SECONDS`), or until the next login if the provider rejected its
+# refresh token, so dead accounts do not spend the rate limit of live ones. With
+# `TOKEN_WRITE_BEHIND_ENABLED` the results go through the write-behind buffer instead, which
+# is flushed when the sweep ends. With `TOKEN_REFRESH_ADVISORY_LOCK` on PostgreSQL each token is
+# refreshed and written under its account's advisory lock like an on-demand refresh, so a sweep
+# never redeems a refresh token that another process has just rotated.
+class TokenRefreshEngine:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = SessionLocal,
+        client_for_provider: Callable[[int], BaseOAuth2] = get_oauth_client_for_provider,
+        horizon_seconds: int | None = None,
+        interval_seconds: float | None = None,
+        concurrency: int | None = None,
+        batch_size: int | None = None,
+    ):
+        self.session_factory = session_factory
+        self.client_for_provider = client_for_provider
+        self.horizon_seconds = horizon_seconds or settings.TOKEN_REFRESH_HORIZON_SECONDS
+        self.interval_seconds = interval_seconds or settings.TOKEN_REFRESH_INTERVAL_SECONDS
+        self.concurrency = concurrency or settings.TOKEN_REFRESH_CONCURRENCY
+        self.batch_size = batch_size or settings.TOKEN_REFRESH_BATCH_SIZE
+        self._task: asyncio.Task | None = None
+
+    # Refreshes a single token and returns its column values, or None if the provider call
+    # failed (the failure is appended to `failures` for the caller to record). With `locked` the
+    # token is re-read, refreshed and written back under the account's advisory lock (see
+    # `refresh_stored_token`); otherwise the caller writes the values back.
+    # Joins an in-flight refresh of the same account instead of starting a second one.
+    async def _refresh_one(
+        self,
+        token: StoredToken,
+        semaphore: asyncio.Semaphore,
+        failures: list[dict],
+        locked: bool = False,
+    ) -> dict | None:
+        async with semaphore:
+            try:
+                oauth_client = self.client_for_provider(token.provider_cd)
+                with call_context(Priority.BACKGROUND, str(token.user_mail_account_id)):
+                    if locked:
+                        return await refresh_stored_token(
+                            self.session_factory, oauth_client, token
+                        )
+                    return await refresh_flights.do(
+                        token.user_mail_account_id,
+                        lambda: refresh_token_values(oauth_client, token),
+                    )
+            except Exception as e:
+                failure = refresh_failure(token, e)
+                failures.append(failure)
+                logger.warning(
+                    "Token refresh failed for account %s (%s): %s",
+                    token.user_mail_account_id,
+                    "refresh token revoked"
+                    if failure["refresh_revoked_flg"]
+                    else f"retrying after {failure['next_refresh_at_utc']:%Y-%m-%d %H:%M:%S}",
+                    e,
+                )
+                return None
+
+    # Runs one full sweep and returns the number of tokens refreshed.
+    async def run_once(self) -> int:
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        expires_before = now + datetime.timedelta(seconds=self.horizon_seconds)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        refreshed = 0
+
+        async with self.session_factory() as session:
+            repo = OAuthTokenRepository(session)
+            locked = _locks_accounts(session)
+            async for rows in repo.iter_expiring(expires_before, self.batch_size, now=now):
+                failures = []
+                results = await asyncio.gather(
+                    *(self._refresh_one(token, semaphore, failures, locked) for token in rows)
+                )
+                updates = [values for values in results if values is not None]
+                # Locked refreshes were already written, each under its account's lock.
+                if not locked and settings.TOKEN_WRITE_BEHIND_ENABLED:
+                    await token_write_behind.submit(*updates)
+                elif not locked:
+                    await repo.bulk_update_tokens(updates)
+                await repo.record_refresh_failures(failures)
+                refreshed += len(updates)
+
+        if settings.TOKEN_WRITE_BEHIND_ENABLED:
+            await token_write_behind.flush()
+        return refreshed
+
+    # Sweeps forever, sleeping `interval_seconds` between sweeps.
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                refreshed = await self.run_once()
+                if refreshed:
+                    logger.info("Refreshed %d OAuth tokens", refreshed)
+            except Exception:
+                logger.exception("Token refresh sweep failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    # Starts the engine as a task on the running event loop (used by the app lifespan).
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+    # Cancels the background task and waits for it to finish.
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+# Shared engine instance used by the in-process lifespan task and the standalone worker.
+token_refresh_engine = TokenRefreshEngine()
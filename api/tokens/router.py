@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.core.database import get_session_factory
+from api.core.dependencies import require_api_key
+from api.tokens.schemas import AccessToken, TokenCacheStats
+from api.tokens.service import (
+    AccountNotFoundError,
+    TokenUnavailableError,
+    get_valid_access_token,
+    token_cache,
+)
+
+# Internal router used by mail workers to obtain access tokens.
+# Every route requires the internal API key.
+router = APIRouter(
+    prefix="/tokens", tags=["Tokens"], dependencies=[Depends(require_api_key)]
+)
+
+
+# Returns the token cache's size and hit/miss/eviction counters.
+@router.get("/cache/stats")
+async def cache_stats() -> TokenCacheStats:
+    return TokenCacheStats(**token_cache.stats())
+
+
+# Returns a currently valid access token for the given account email,
+# refreshing it with the provider if it is about to expire.
+@router.get("/{email}")
+async def get_access_token(
+    email: str,
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+) -> AccessToken:
+    try:
+        return await get_valid_access_token(session_factory, email)
+    except AccountNotFoundError:
+        raise HTTPException(status_code=404, detail="Account not found")
+    except TokenUnavailableError as e:
+        raise HTTPException(status_code=502, detail=str(e))
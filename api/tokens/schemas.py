@@ -0,0 +1,19 @@
+import datetime
+
+from pydantic import BaseModel, EmailStr
+
+
+class AccessToken(BaseModel):
+    email: EmailStr
+    provider_cd: int
+    access_token: str
+    expires_at: datetime.datetime
+
+
+class TokenCacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
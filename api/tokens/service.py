@@ -0,0 +1,102 @@
+import datetime
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.auth.base import BaseOAuth2
+from api.auth.registry import get_oauth_client_for_provider
+from api.core.cache import TTLCache
+from api.core.config import settings
+from api.core.invalidation import invalidation_bus
+from api.core.ratelimit import call_context
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens.refresh import refresh_stored_token
+from api.tokens.schemas import AccessToken
+
+
+# Raised when no active account with a stored token exists for the requested email.
+class AccountNotFoundError(LookupError):
+    pass
+
+
+# Raised when the stored token is (nearly) expired and cannot be refreshed.
+class TokenUnavailableError(RuntimeError):
+    pass
+
+
+# Process-wide cache of valid access tokens keyed by account email.
+# Entries are also evicted when another node changes the account (`CACHE_INVALIDATION_ENABLED`).
+token_cache = TTLCache(settings.TOKEN_CACHE_MAX_SIZE)
+invalidation_bus.watch(token_cache)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+# Expiry times are compared as naive UTC. PostgreSQL returns `expires_at_utc` timezone-aware,
+# SQLite and the refresh path naive.
+def _to_naive_utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc)
+    return value.replace(tzinfo=None)
+
+
+# Caches a token until it enters the near-expiry window.
+def _cache_token(token: AccessToken) -> None:
+    expires_at = _to_naive_utc(token.expires_at)
+    ttl = (expires_at - _utcnow()).total_seconds() - settings.TOKEN_MIN_TTL_SECONDS
+    token_cache.set(token.email, token, ttl)
+
+
+# Returns a currently valid access token for `email`.
+# Served from the in-process cache when possible; on a miss the stored token is read from the
+# database (a read replica, if configured) and refreshed with the provider first if it expires
+# within `TOKEN_MIN_TTL_SECONDS`.
+# Concurrent misses for the same account share one provider refresh (see `refresh_stored_token`).
+async def get_valid_access_token(
+    session_factory: async_sessionmaker[AsyncSession],
+    email: str,
+    client_for_provider: Callable[[int], BaseOAuth2] | None = None,
+) -> AccessToken:
+    cached = token_cache.get(email)
+    if cached is not None:
+        return cached
+
+    async with session_factory() as session:
+        token = await UserMailAccountRepository(session, read_replica=True).get_active_token(
+            email
+        )
+    if token is None:
+        raise AccountNotFoundError(email)
+
+    access_token = token.access_token
+    expires_at = _to_naive_utc(token.expires_at_utc)
+
+    remaining = (expires_at - _utcnow()).total_seconds()
+    if remaining < settings.TOKEN_MIN_TTL_SECONDS:
+        if not token.refresh_token:
+            raise TokenUnavailableError(f"Token for '{email}' expired and has no refresh token")
+        if token.refresh_revoked:
+            raise TokenUnavailableError(
+                f"Refresh token for '{email}' was rejected by the provider; log in again"
+            )
+        client_for_provider = client_for_provider or get_oauth_client_for_provider
+        try:
+            with call_context(account=email):
+                values = await refresh_stored_token(
+                    session_factory, client_for_provider(token.provider_cd), token
+                )
+        except Exception as e:
+            raise TokenUnavailableError(f"Token refresh for '{email}' failed: {e}") from e
+        access_token = values["access_token_txt"]
+        expires_at = _to_naive_utc(values["expires_at_utc"])
+
+    result = AccessToken(
+        email=email,
+        provider_cd=token.provider_cd,
+        access_token=access_token,
+        expires_at=expires_at,
+    )
+    _cache_token(result)
+    return result
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api.core.config import settings
+from api.core.database import SessionLocal
+from api.repositories.oauth_token import OAuthTokenRepository
+
+logger = logging.getLogger(__name__)
+
+
+# Write-behind buffer for token updates that no request waits on (refresh results).
+# Updates are held for up to `TOKEN_WRITE_BEHIND_WINDOW_SECONDS`, or until
+# `TOKEN_WRITE_BEHIND_MAX_ROWS` tokens are pending, and then written by one UPDATE and one
+# commit. Only the latest values per token are kept. A failed flush puts its rows back for
+# the next one, under any newer values. A buffered update keeps the `if_unmodified_since`
+# guard of the token it was derived from, so it never overwrites a token modified after that
+# read, e.g. by a login while the provider was called or while the update was buffered.
+# An update carrying a rotated refresh token is flushed right away and `submit` waits for it:
+# the old refresh token is already spent, so losing the new one in a crash would lock the
+# account out. Such updates submitted together (a sweep page, concurrent refreshes) share
+# one flush.
+# `aclose` flushes what is left; the app lifespan and the worker call it on shutdown.
+class TokenWriteBehind:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = SessionLocal,
+        window_seconds: float | None = None,
+        max_rows: int | None = None,
+    ):
+        self.session_factory = session_factory
+        self.window_seconds = window_seconds
+        self.max_rows = max_rows
+        self._pending: dict[uuid.UUID, dict] = {}
+        self._timer: asyncio.Task | None = None
+        # Flush that updates with rotated refresh tokens wait on.
+        self._urgent: asyncio.Task | None = None
+        # Flushes run one at a time, so a later flush never overwrites newer values.
+        self._lock = asyncio.Lock()
+        # Strong references to in-flight flushes, so they are not garbage collected.
+        self._flushing: set[asyncio.Task] = set()
+        self.submitted = 0
+        self.coalesced = 0
+        self.flushes = 0
+
+    # Queues `updates` (`oauth_token_id` plus plaintext columns, as for `bulk_update_tokens`).
+    # Returns without waiting for the database unless an update must be written at once.
+    async def submit(self, *updates: dict) -> None:
+        urgent = False
+        for values in updates:
+            self.submitted += 1
+            key = values["oauth_token_id"]
+            if key in self._pending:
+                self.coalesced += 1
+            merged = {**self._pending.pop(key, {}), **values}
+            self._pending[key] = merged
+            urgent = urgent or bool(merged.get("refresh_token_txt"))
+
+        if urgent:
+            if self._urgent is None:
+                self._urgent = self._start(self._flush_urgent())
+            await asyncio.shield(self._urgent)
+            return
+
+        max_rows = self.max_rows or settings.TOKEN_WRITE_BEHIND_MAX_ROWS
+        if len(self._pending) >= max_rows:
+            self._start(self.flush())
+        elif self._timer is None:
+            self._timer = self._start(self._flush_later())
+
+    def _start(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+        return task
+
+    async def _flush_later(self) -> None:
+        window = self.window_seconds
+        await asyncio.sleep(
+            settings.TOKEN_WRITE_BEHIND_WINDOW_SECONDS if window is None else window
+        )
+        self._timer = None
+        await self.flush()
+
+    async def _flush_urgent(self) -> None:
+        # Lets updates submitted in the same event loop iteration join this flush.
+        await asyncio.sleep(0)
+        self._urgent = None
+        await self.flush()
+
+    async def _write(self, updates: list[dict]) -> None:
+        async with self._lock:
+            async with self.session_factory() as session:
+                await OAuthTokenRepository(session).bulk_update_tokens(updates)
+
+    # Writes every pending update now; returns how many tokens were written.
+    async def flush(self) -> int:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            await self._write(list(batch.values()))
+        except Exception:
+            logger.exception("Token write-behind flush of %d rows failed", len(batch))
+            for key, values in batch.items():
+                self._pending[key] = {**values, **self._pending.get(key, {})}
+            if self._timer is None:
+                self._timer = self._start(self._flush_later())
+            return 0
+        self.flushes += 1
+        return len(batch)
+
+    # Waits for in-flight flushes and writes what is still pending (called on shutdown).
+    async def aclose(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await asyncio.gather(*self._flushing, return_exceptions=True)
+        await self.flush()
+        if self._pending:
+            logger.error("Token write-behind dropped %d unwritten updates", len(self._pending))
+            self._pending.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+# Process-wide buffer used by token refreshes when `TOKEN_WRITE_BEHIND_ENABLED` is set.
+token_write_behind = TokenWriteBehind()
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+
+from api.auth.oidc import jwks_cache
+from api.auth.registry import provider_registry
+from api.core.database import get_engine
+from api.core.http import http_clients
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_database() -> None:
+    async with get_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+# Builds the provider's HTTP client and, when it has a JWKS endpoint, fetches its signing keys:
+# that leaves a kept-alive connection to the provider and a filled key cache for the first
+# id_token check.
+async def _warm_provider(name: str) -> None:
+    client = provider_registry.get(name)
+    http = http_clients.get(name)
+    if client.jwks_uri:
+        await jwks_cache.prefetch(http, client.jwks_uri)
+
+
+# Opens, ahead of the first requests, the connections they would otherwise pay for: one
+# database connection (returned to the pool afterwards) and one per provider. Runs on startup
+# with `WARMUP_ON_STARTUP`, or on demand via `POST /admin/warmup`.
+# Failures are logged and reported, never raised: warming up is only an optimization.
+# Returns the seconds each target took ("database", "provider:<name>") and the failed targets.
+async def warm_up() -> dict:
+    targets = {"database": _warm_database()}
+    for name in provider_registry.names():
+        targets[f"provider:{name}"] = _warm_provider(name)
+
+    async def timed(coro) -> float:
+        started = time.perf_counter()
+        await coro
+        return time.perf_counter() - started
+
+    results = await asyncio.gather(
+        *(timed(coro) for coro in targets.values()), return_exceptions=True
+    )
+    report = {"seconds": {}, "failed": []}
+    for target, result in zip(targets, results):
+        if isinstance(result, BaseException):
+            logger.warning("Warm-up of %s failed: %s", target, result)
+            report["failed"].append(target)
+        else:
+            report["seconds"][target] = round(result, 6)
+    return report
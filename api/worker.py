@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+import logging
+
+from api.auth.registry import provider_registry
+from api.core.audit import audit_log
+from api.core.http import http_clients
+from api.mail.send_queue import mail_send_worker
+from api.tokens.refresh import token_refresh_engine
+from api.tokens.write_behind import token_write_behind
+
+# Background jobs a worker process can run, by command line name.
+JOBS = {
+    "refresh": token_refresh_engine,
+    "mail-send": mail_send_worker,
+}
+
+
+# Standalone entry point for background work: the token refresh engine and the outbound mail
+# send queue worker. Run with `python -m api.worker` to scale this load separately from the web
+# tier; in that setup leave TOKEN_REFRESH_ENABLED and MAIL_SEND_WORKER_ENABLED off for the API
+# processes. `python -m api.worker --only mail-send` runs just the send queue worker: start more
+# of those to add send throughput, as workers never claim the same job.
+async def main(jobs: list[str] | None = None) -> None:
+    await provider_registry.load()
+    try:
+        await asyncio.gather(*(JOBS[name].run_forever() for name in jobs or JOBS))
+    finally:
+        await token_write_behind.aclose()
+        await audit_log.aclose()
+        await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background token refresh and mail sending")
+    parser.add_argument(
+        "--only", action="append", choices=sorted(JOBS), help="job to run (default: all)"
+    )
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().only))
@@ -0,0 +1,157 @@
+"""Measure the cold-start latency of the app, as a fresh serverless instance pays it.
+
+Each run starts a new interpreter that imports `api.main`, runs the app's startup (lifespan)
+and serves one `GET /`, timing the three steps. One extra run under `python -X importtime`
+lists the modules with the highest self import time.
+
+    python -m benchmarks.bench_import_time --runs 10
+    python -m benchmarks.bench_import_time --env LAZY_INIT=true --output cold-start.json
+    python -m benchmarks.bench_import_time --baseline cold-start.json
+
+Prints (or writes) a JSON report with the median and minimum of each step in milliseconds.
+With `--baseline report.json`, the exit status is 1 if the median import or total cold-start
+time regressed by more than `--tolerance`.
+
+Settings come from the environment (and `.env`); placeholders are filled in for the required
+ones, and no database connection is opened unless `WARMUP_ON_STARTUP` is set.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+STEPS = ("import_ms", "startup_ms", "first_request_ms", "total_ms")
+
+PLACEHOLDERS = {
+    "DATABASE_URL": "sqlite+aiosqlite:///./bench.db",
+    "GOOGLE_CLIENT_ID": "bench-client-id",
+    "GOOGLE_CLIENT_SECRET": "bench-client-secret",
+    "GOOGLE_REDIRECT_URI": "http://bench/auth/google/callback",
+    "MICROSOFT_CLIENT_ID": "bench-client-id",
+    "MICROSOFT_CLIENT_SECRET": "bench-client-secret",
+    "MICROSOFT_REDIRECT_URI": "http://bench/auth/microsoft/callback",
+    "SECRET_KEY": "bench-secret-key",
+}
+
+# Runs in the fresh interpreter; prints the timings of one cold start as JSON.
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import api.main
+imported = time.perf_counter()
+
+async def boot():
+    import httpx
+    app = api.main.app
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            (await client.get("/")).raise_for_status()
+        return ready, time.perf_counter()
+
+ready, served = asyncio.run(boot())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (served - ready) * 1000,
+    "total_ms": (served - started) * 1000,
+}))
+"""
+
+
+def _environment(overrides: dict[str, str]) -> dict[str, str]:
+    env = {**PLACEHOLDERS, **os.environ, **overrides}
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def cold_start(env: dict[str, str]) -> dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+# Modules with the highest self import time, from `python -X importtime`.
+def slowest_imports(env: dict[str, str], top: int) -> list[dict]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.main"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        modules.append(
+            {
+                "module": name.strip(),
+                "self_ms": round(int(self_us) / 1000, 2),
+                "cumulative_ms": round(int(cumulative_us) / 1000, 2),
+            }
+        )
+    return sorted(modules, key=lambda m: m["self_ms"], reverse=True)[:top]
+
+
+def run(runs: int, overrides: dict[str, str], top: int) -> dict:
+    env = _environment(overrides)
+    # The first run compiles bytecode that later cold starts (and deployments) have cached.
+    cold_start(env)
+    samples = [cold_start(env) for _ in range(runs)]
+    report = {"runs": runs, "env": overrides}
+    for step in STEPS:
+        values = [sample[step] for sample in samples]
+        report[step] = {
+            "median": round(statistics.median(values), 1),
+            "min": round(min(values), 1),
+        }
+    if top:
+        report["slowest_imports"] = slowest_imports(env, top)
+    return report
+
+
+# Lists the cold-start steps whose median is worse than `baseline` by more than `tolerance`.
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for step in ("import_ms", "total_ms"):
+        current, previous = report[step]["median"], baseline[step]["median"]
+        if current > previous * (1 + tolerance):
+            regressions.append(f"{step}: median {current}ms > baseline {previous}ms")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="setting for the measured app, e.g. LAZY_INIT=true (repeatable)",
+    )
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list (0: none)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    options = parser.parse_args()
+
+    overrides = dict(item.split("=", 1) for item in options.env)
+    report = run(options.runs, overrides, options.top)
+    if options.baseline:
+        with open(options.baseline) as f:
+            report["regressions"] = find_regressions(report, json.load(f), options.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(1 if report.get("regressions") else 0)
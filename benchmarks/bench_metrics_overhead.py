@@ -0,0 +1,83 @@
+"""Measure the cost of recording metrics on the hot paths.
+
+Times a callback phase measurement (`callback_phase`) against an empty block, and an outbound
+request through `InstrumentedTransport` against the bare transport (an in-memory httpx
+MockTransport, so only the instrumentation differs).
+
+    python -m benchmarks.bench_metrics_overhead --iterations 200000
+
+Prints JSON; overheads are per measured operation.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import time
+
+import httpx
+
+from api.core.metrics import InstrumentedTransport, callback_phase
+
+
+def _per_op_ns(elapsed: float, iterations: int) -> float:
+    return round(elapsed / iterations * 1e9, 1)
+
+
+def bench_phase(iterations: int) -> dict:
+    empty = contextlib.nullcontext()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with empty:
+            pass
+    baseline = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with callback_phase("bench", "phase"):
+            pass
+    measured = time.perf_counter() - started
+
+    return {
+        "baseline_ns": _per_op_ns(baseline, iterations),
+        "instrumented_ns": _per_op_ns(measured, iterations),
+        "overhead_ns": _per_op_ns(measured - baseline, iterations),
+    }
+
+
+async def _time_requests(transport: httpx.AsyncBaseTransport, iterations: int) -> float:
+    async with httpx.AsyncClient(transport=transport) as client:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await client.get("http://provider.test/userinfo")
+        return time.perf_counter() - started
+
+
+async def bench_transport(iterations: int, rounds: int = 5) -> dict:
+    def mock():
+        return httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+
+    # Alternate the two variants and keep the best round of each, to filter out noise.
+    baseline = measured = float("inf")
+    for _ in range(rounds):
+        baseline = min(baseline, await _time_requests(mock(), iterations))
+        measured = min(
+            measured, await _time_requests(InstrumentedTransport(mock(), "bench"), iterations)
+        )
+    return {
+        "baseline_us": round(baseline / iterations * 1e6, 2),
+        "instrumented_us": round(measured / iterations * 1e6, 2),
+        "overhead_us": round((measured - baseline) / iterations * 1e6, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    options = parser.parse_args()
+    report = {
+        "callback_phase": bench_phase(options.iterations),
+        "provider_request": asyncio.run(bench_transport(options.requests)),
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,102 @@
+"""Count database round trips per OAuth callback upsert.
+
+Compares the generic read-modify-write path of
+`UserMailAccountRepository.create_or_update_user_with_token` with the single-statement
+PostgreSQL `INSERT ... ON CONFLICT ... RETURNING` path, for first logins and re-logins.
+
+    python -m benchmarks.bench_upsert_queries --database-url sqlite+aiosqlite:///./bench.db
+    python -m benchmarks.bench_upsert_queries --database-url postgresql+asyncpg://user:pw@localhost/db
+
+The PostgreSQL path is only measured against a PostgreSQL database. Prints JSON.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from api.auth.schemas import TokenData, UserInfo
+from api.models.base import Base
+from api.repositories.user_mail_account import UserMailAccountRepository
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+async def _measure(session_factory, counter, upsert, iterations: int) -> dict:
+    results = {}
+    emails = [f"bench-{uuid.uuid4().hex}@example.com" for _ in range(iterations)]
+    for phase in ("first_login", "re_login"):
+        counter.count = 0
+        started = time.perf_counter()
+        for email in emails:
+            async with session_factory() as session:
+                repo = UserMailAccountRepository(session)
+                await upsert(repo, email)
+        elapsed = time.perf_counter() - started
+        results[phase] = {
+            # COMMIT is issued by the driver, not as a cursor execute, so add one per call.
+            "queries_per_callback": counter.count / iterations + 1,
+            "mean_ms": elapsed / iterations * 1000,
+        }
+    return results
+
+
+async def main(database_url: str, iterations: int) -> dict:
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False)
+    counter = QueryCounter(engine)
+
+    def args(email):
+        return (
+            UserInfo(email=email),
+            TokenData(access_token="a" * 200, refresh_token="r" * 100, expires_at=3600),
+            0,
+        )
+
+    async def generic(repo, email):
+        user_info, token_data, provider = args(email)
+        await repo._upsert_generic(user_info, token_data, provider, _expires_at())
+
+    async def atomic(repo, email):
+        await repo.create_or_update_user_with_token(*args(email))
+
+    report = {
+        "dialect": engine.dialect.name,
+        "iterations": iterations,
+        "generic": await _measure(session_factory, counter, generic, iterations),
+    }
+    if engine.dialect.name == "postgresql":
+        report["postgresql_upsert"] = await _measure(
+            session_factory, counter, atomic, iterations
+        )
+
+    await engine.dispose()
+    return report
+
+
+def _expires_at():
+    return (
+        datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    ).replace(tzinfo=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench.db")
+    parser.add_argument("--iterations", type=int, default=200)
+    options = parser.parse_args()
+    print(json.dumps(asyncio.run(main(options.database_url, options.iterations)), indent=2))
@@ -0,0 +1,252 @@
+"""Load-test the OAuth login and callback flow against a local mock provider.
+
+Runs the real FastAPI app in-process (over httpx's ASGI transport, lifespan included) against
+the given database, with Google and Microsoft pointed at a local mock token/userinfo server.
+Each flow is `GET /auth/{provider}/login` followed by `GET /auth/{provider}/callback`. The run
+has two phases: first logins of `--accounts` new accounts, then `--iterations` re-logins
+spread over those accounts. Account emails are unique per run, so the database can be reused.
+
+    python -m benchmarks.load_callback --database-url sqlite+aiosqlite:///./bench.db
+    python -m benchmarks.load_callback --database-url postgresql+asyncpg://user:pw@localhost/bench \\
+        --iterations 5000 --concurrency 64 --output report.json
+
+Prints (or writes) a JSON report with, per phase: throughput, latency percentiles per endpoint
+and database queries per flow. With `--baseline report.json`, the run is compared against an
+earlier report and the exit status is 1 if throughput or callback p95 latency regressed by more
+than `--tolerance`, queries per flow went up, or any flow failed.
+
+The provider rate limiter is lifted for the run (use `--keep-rate-limits` to keep it).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from tests.mock_provider import MockOAuthProvider
+
+PROVIDERS = ("google", "microsoft")
+PHASES = ("first_login", "re_login")
+
+
+# Mock provider issuing one access token per authorization code, and answering userinfo
+# with the account encoded in that code ("<account>.<n>").
+class LoadTestProvider(MockOAuthProvider):
+    def handle(self, method: str, path: str, body: bytes):
+        if path.startswith("/token"):
+            code = parse_qs(body.decode())["code"][0]
+            return 200, {
+                "access_token": f"access-{code}",
+                "refresh_token": f"refresh-{code}",
+                "expires_in": 3600,
+                "token_type": "Bearer",
+            }
+        if path.startswith("/userinfo"):
+            code = self.request_headers["authorization"].removeprefix("Bearer access-")
+            email = f"{code.rsplit('.', 1)[0]}@example.com"
+            return 200, {"email": email, "mail": email}
+        return super().handle(method, path, body)
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": at(0.50),
+        "p90_ms": at(0.90),
+        "p95_ms": at(0.95),
+        "p99_ms": at(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+# Runs one login+callback flow per account name in `accounts`, `concurrency` at a time.
+async def run_phase(
+    client: httpx.AsyncClient, accounts: list[str], concurrency: int, query_counter
+) -> dict:
+    latencies: dict[str, list[float]] = {"login": [], "callback": []}
+    errors: dict[str, int] = {}
+    flows = iter(enumerate(accounts))
+
+    async def worker() -> None:
+        for n, account in flows:
+            provider = PROVIDERS[int(account.rsplit("-", 1)[1]) % len(PROVIDERS)]
+            started = time.perf_counter()
+            login = await client.get(f"/auth/{provider}/login")
+            latencies["login"].append(time.perf_counter() - started)
+            state = parse_qs(urlparse(login.headers["location"]).query)["state"][0]
+
+            started = time.perf_counter()
+            callback = await client.get(
+                f"/auth/{provider}/callback?code={account}.{n}&state={state}"
+            )
+            latencies["callback"].append(time.perf_counter() - started)
+            if callback.status_code != 200:
+                key = str(callback.status_code)
+                errors[key] = errors.get(key, 0) + 1
+
+    queries_before = query_counter()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "flows": len(accounts),
+        "seconds": round(elapsed, 3),
+        "flows_per_second": round(len(accounts) / elapsed, 1),
+        "login": percentiles(latencies["login"]),
+        "callback": percentiles(latencies["callback"]),
+        "queries_per_flow": round((query_counter() - queries_before) / len(accounts), 2),
+        "errors": errors,
+    }
+
+
+# Drives both phases through `app`, with the providers pointed at `provider_base_url`.
+# `query_counter` is a zero-argument callable returning the database statements run so far.
+async def run_load(
+    app,
+    provider_base_url: str,
+    iterations: int,
+    concurrency: int,
+    accounts: int,
+    query_counter,
+) -> dict:
+    from api.auth.base import BaseOAuth2
+    from api.auth.registry import provider_registry
+    from api.models.enums import Provider
+
+    run_id = uuid.uuid4().hex[:8]
+    names = [f"load-{run_id}-{i}" for i in range(accounts)]
+    report = {"iterations": iterations, "concurrency": concurrency, "accounts": accounts}
+
+    async with app.router.lifespan_context(app):
+        # The lifespan loads the configured providers; point them at the mock instead.
+        for name in PROVIDERS:
+            provider_registry.register(
+                BaseOAuth2(
+                    client_id="load-client-id",
+                    client_secret="load-client-secret",
+                    redirect_uri=f"http://testserver/auth/{name}/callback",
+                    authorization_url=f"{provider_base_url}/authorize",
+                    token_url=f"{provider_base_url}/token",
+                    userinfo_url=f"{provider_base_url}/userinfo",
+                    scopes=["openid", "email"],
+                    provider=name,
+                    provider_cd=Provider[name.upper()].value,
+                )
+            )
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            report["first_login"] = await run_phase(client, names, concurrency, query_counter)
+            report["re_login"] = await run_phase(
+                client,
+                [names[n % accounts] for n in range(iterations)],
+                concurrency,
+                query_counter,
+            )
+    return report
+
+
+# Lists the metrics of `report` that are worse than `baseline` by more than `tolerance`.
+def find_regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for phase in PHASES:
+        current, previous = report[phase], baseline[phase]
+        if current["flows_per_second"] < previous["flows_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{phase}: throughput {current['flows_per_second']}/s < baseline "
+                f"{previous['flows_per_second']}/s"
+            )
+        if current["callback"]["p95_ms"] > previous["callback"]["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{phase}: callback p95 {current['callback']['p95_ms']}ms > baseline "
+                f"{previous['callback']['p95_ms']}ms"
+            )
+        if current["queries_per_flow"] > previous["queries_per_flow"]:
+            regressions.append(
+                f"{phase}: queries per flow {current['queries_per_flow']} > baseline "
+                f"{previous['queries_per_flow']}"
+            )
+        if current["errors"]:
+            regressions.append(f"{phase}: errors {current['errors']}")
+    return regressions
+
+
+async def main(options) -> dict:
+    # Settings are read when the app is imported, so configure the environment first.
+    os.environ["DATABASE_URL"] = options.database_url
+    for name in PROVIDERS:
+        prefix = name.upper()
+        os.environ.setdefault(f"{prefix}_CLIENT_ID", "load-client-id")
+        os.environ.setdefault(f"{prefix}_CLIENT_SECRET", "load-client-secret")
+        os.environ.setdefault(f"{prefix}_REDIRECT_URI", f"http://testserver/auth/{name}/callback")
+    os.environ.setdefault("SECRET_KEY", "load-test-secret-key")
+    if not options.keep_rate_limits:
+        os.environ["RATE_LIMIT_DEFAULT_RATE"] = "1000000"
+
+    from sqlalchemy import event
+
+    from api.core.database import get_engine
+    from api.main import app
+    from api.models.base import Base
+
+    engine = get_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    queries = 0
+
+    def count_query(*args) -> None:
+        nonlocal queries
+        queries += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+
+    with LoadTestProvider() as provider:
+        report = await run_load(
+            app,
+            provider.base_url,
+            options.iterations,
+            options.concurrency,
+            options.accounts,
+            lambda: queries,
+        )
+    report["dialect"] = engine.dialect.name
+    await engine.dispose()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench.db")
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--keep-rate-limits", action="store_true")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    options = parser.parse_args()
+
+    report = asyncio.run(main(options))
+    if options.baseline:
+        with open(options.baseline) as f:
+            report["regressions"] = find_regressions(report, json.load(f), options.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(1 if report.get("regressions") else 0)
@@ -1,33 +1,70 @@
+import asyncio
+import datetime
+import os
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from dotenv import load_dotenv
-from app.main import app
-from app.core.database import get_db
-from app.models.base import Base
-
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+load_dotenv()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# Provide placeholder settings so the app can be imported without a real `.env`.
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+os.environ.setdefault("GOOGLE_CLIENT_ID", "test-google-client-id")
+os.environ.setdefault("GOOGLE_CLIENT_SECRET", "test-google-client-secret")
+os.environ.setdefault("GOOGLE_REDIRECT_URI", "http://testserver/auth/google/callback")
+os.environ.setdefault("MICROSOFT_CLIENT_ID", "test-microsoft-client-id")
+os.environ.setdefault("MICROSOFT_CLIENT_SECRET", "test-microsoft-client-secret")
+os.environ.setdefault(
+    "MICROSOFT_REDIRECT_URI", "http://testserver/auth/microsoft/callback"
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("INTERNAL_API_KEY", "test-internal-api-key")
+
+from api.main import app  # noqa: E402
+from api.core.audit import audit_log  # noqa: E402
+from api.auth.registry import provider_registry  # noqa: E402
+from api.core.database import get_db, get_session_factory  # noqa: E402
+from api.core.config import settings  # noqa: E402
+from api.models.base import Base  # noqa: E402
+from api.models.enums import Provider  # noqa: E402
+from api.models.schema import OAuthToken, UserMailAccount  # noqa: E402
+from tests.mock_provider import MockMailProvider  # noqa: E402
+
+
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+
+# NullPool keeps connections from leaking between the event loops used by different TestClients.
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+async def _reset_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
 
 
-Base.metadata.create_all(bind=engine)
+asyncio.run(_reset_schema())
 
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+async def override_get_db():
+    async with TestingSessionLocal() as session:
+        yield session
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+audit_log.session_factory = TestingSessionLocal
+
+
+# Async tests run on asyncio only (`@pytest.mark.anyio`), matching the app runtime.
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
 
 
 @pytest.fixture(scope="module")
@@ -35,4 +72,56 @@ def client():
     with TestClient(app) as c:
         yield c
 
-load_dotenv()
\ No newline at end of file
+
+# Yields the provider registry and restores its contents after the test,
+# so tests can register mock providers in place of the real ones.
+@pytest.fixture
+def providers(monkeypatch):
+    provider_registry.names()
+    monkeypatch.setattr(provider_registry, "_by_name", provider_registry._by_name)
+    monkeypatch.setattr(provider_registry, "_by_code", provider_registry._by_code)
+    return provider_registry
+
+
+# Adds an active mailbox account with one token expiring `expires_in` seconds from now
+# and returns the account id.
+async def add_account(
+    email: str,
+    provider: Provider = Provider.GOOGLE,
+    *,
+    access_token: str = "stale",
+    refresh_token: str | None = None,
+    expires_in: int = 3600,
+) -> uuid.UUID:
+    account_id = uuid.uuid4()
+    async with TestingSessionLocal() as session:
+        user = UserMailAccount(
+            user_mail_account_id=account_id,
+            email_address_txt=email,
+            provider_cd=provider.value,
+            is_active_flg=True,
+        )
+        session.add(user)
+        session.add(
+            OAuthToken(
+                access_token_txt=access_token,
+                refresh_token_txt=refresh_token,
+                expires_at_utc=(
+                    datetime.datetime.now(datetime.timezone.utc)
+                    + datetime.timedelta(seconds=expires_in)
+                ).replace(tzinfo=None),
+                user_mail_account=user,
+            )
+        )
+        await session.commit()
+    return account_id
+
+
+# Points the Gmail and Graph API settings at a mock mail provider for one test.
+@pytest.fixture
+def mail_provider(monkeypatch):
+    with MockMailProvider() as provider:
+        monkeypatch.setattr(settings, "GMAIL_API_URL", provider.base_url)
+        monkeypatch.setattr(settings, "GMAIL_BATCH_URL", f"{provider.base_url}/batch/gmail/v1")
+        monkeypatch.setattr(settings, "GRAPH_API_URL", f"{provider.base_url}/v1.0")
+        yield provider
@@ -0,0 +1,379 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64url_uint(value: int) -> str:
+    return _b64url(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+# A minimal local OAuth provider used by the tests.
+# It speaks just enough HTTP/1.1 (with keep-alive) to serve the token and userinfo endpoints,
+# runs on its own event loop in a background thread, and counts accepted TCP connections
+# so tests can assert that the app reuses pooled connections.
+class MockOAuthProvider:
+    def __init__(
+        self,
+        email: str = "user@example.com",
+        issue_id_tokens: bool = False,
+        client_id: str = "test-client-id",
+    ):
+        self.email = email
+        self.issue_id_tokens = issue_id_tokens
+        self.client_id = client_id
+        self.kid = "mock-key-1"
+        # Form fields of every token endpoint request, in arrival order.
+        self.token_forms: list[dict] = []
+        # Seconds to wait before answering, to hold requests in flight.
+        self.response_delay = 0.0
+        # Number of upcoming requests to answer with 429, and the Retry-After value they carry.
+        self.throttle_next = 0
+        self.retry_after: str | None = None
+        # Faults injected into upcoming requests, one per request in arrival order:
+        # ("delay", seconds) answers late, ("status", code) answers with that error status and
+        # ("drop",) closes the connection without answering.
+        self.faults: list[tuple] = []
+        # Refresh tokens answered with `invalid_grant`, as after the user revoked consent.
+        self.revoked_refresh_tokens: set[str] = set()
+        self.signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.connections = 0
+        self.requests: list[tuple[str, str]] = []
+        self.request_headers: dict[str, str] = {}
+        self.port: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._thread: threading.Thread | None = None
+        self._started = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def issuer(self) -> str:
+        return self.base_url
+
+    # Signs `claims` (merged over sensible defaults) as an RS256 id_token.
+    def make_id_token(self, kid: str | None = None, **claims) -> str:
+        now = int(time.time())
+        claims = {
+            "iss": self.issuer,
+            "aud": self.client_id,
+            "sub": "mock-subject",
+            "email": self.email,
+            "iat": now,
+            "exp": now + 3600,
+            **claims,
+        }
+        header = {"alg": "RS256", "typ": "JWT", "kid": kid or self.kid}
+        signing_input = (
+            f"{_b64url(json.dumps(header).encode())}.{_b64url(json.dumps(claims).encode())}"
+        )
+        signature = self.signing_key.sign(
+            signing_input.encode(), padding.PKCS1v15(), hashes.SHA256()
+        )
+        return f"{signing_input}.{_b64url(signature)}"
+
+    def jwks(self) -> dict:
+        numbers = self.signing_key.public_key().public_numbers()
+        return {
+            "keys": [
+                {
+                    "kty": "RSA",
+                    "kid": self.kid,
+                    "use": "sig",
+                    "alg": "RS256",
+                    "n": _b64url_uint(numbers.n),
+                    "e": _b64url_uint(numbers.e),
+                }
+            ]
+        }
+
+    # Returns the status code and JSON body for a request path.
+    def handle(self, method: str, path: str, body: bytes) -> tuple[int, dict]:
+        if path.startswith("/token"):
+            form = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+            self.token_forms.append(form)
+            if form.get("grant_type") == "refresh_token":
+                if form["refresh_token"] in self.revoked_refresh_tokens:
+                    return 400, {"error": "invalid_grant"}
+                return 200, {
+                    "access_token": f"refreshed-{form['refresh_token']}",
+                    "expires_in": 3600,
+                    "token_type": "Bearer",
+                }
+            payload = {
+                "access_token": "mock-access-token",
+                "refresh_token": "mock-refresh-token",
+                "expires_in": 3600,
+                "token_type": "Bearer",
+            }
+            if self.issue_id_tokens:
+                payload["id_token"] = self.make_id_token()
+            return 200, payload
+        if path.startswith("/.well-known/openid-configuration"):
+            return 200, {
+                "issuer": self.issuer,
+                "authorization_endpoint": f"{self.base_url}/authorize",
+                "token_endpoint": f"{self.base_url}/token",
+                "userinfo_endpoint": f"{self.base_url}/userinfo",
+                "jwks_uri": f"{self.base_url}/jwks",
+            }
+        if path.startswith("/jwks"):
+            return 200, self.jwks()
+        if path.startswith("/userinfo"):
+            return 200, {"email": self.email, "mail": self.email}
+        return 404, {"error": "not_found"}
+
+    async def _serve_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests.append((method, path))
+                fault = self.faults.pop(0) if self.faults else ("none",)
+                if fault[0] == "drop":
+                    break
+                if fault[0] == "delay":
+                    await asyncio.sleep(fault[1])
+                if self.response_delay:
+                    await asyncio.sleep(self.response_delay)
+
+                extra_headers = ""
+                if fault[0] == "status":
+                    status, payload, content_type = fault[1], {"error": "injected"}, []
+                elif self.throttle_next > 0:
+                    self.throttle_next -= 1
+                    status, payload, content_type = 429, {"error": "rate_limited"}, []
+                    if self.retry_after is not None:
+                        extra_headers = f"Retry-After: {self.retry_after}\r\n"
+                else:
+                    # Handlers return (status, JSON payload) or (status, raw bytes, content type).
+                    # The request headers are available to them as `self.request_headers`.
+                    self.request_headers = headers
+                    status, payload, *content_type = self.handle(method, path, body)
+                if content_type:
+                    data, content_type = payload, content_type[0]
+                else:
+                    data, content_type = json.dumps(payload).encode(), "application/json"
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"{extra_headers}"
+                    "Connection: keep-alive\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._serve_connection, "127.0.0.1", 0)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        self._loop.run_forever()
+
+        # Drop open keep-alive connections before closing the loop.
+        self._server.close()
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    def start(self) -> "MockOAuthProvider":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MockOAuthProvider":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+# Mock Gmail and Microsoft Graph APIs, answering batch requests.
+# Messages whose id starts with "missing" return 404; every other call succeeds.
+class MockMailProvider(MockOAuthProvider):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Number of inner calls received per batch request, in arrival order.
+        self.batch_sizes: list[int] = []
+        # Mailbox state for sync: message ids, plus a change log of (history id, kind, id).
+        # Change history before `oldest_history_id` is gone, so older cursors are expired.
+        self.mailbox = [f"m{i}" for i in range(5)]
+        self.history_id = 100
+        self.oldest_history_id = 100
+        self.changes: list[tuple[int, str, str]] = []
+        self.page_size = 2
+
+    def add_message(self, message_id: str) -> None:
+        self.history_id += 1
+        self.mailbox.append(message_id)
+        self.changes.append((self.history_id, "added", message_id))
+
+    def delete_message(self, message_id: str) -> None:
+        self.history_id += 1
+        self.mailbox.remove(message_id)
+        self.changes.append((self.history_id, "deleted", message_id))
+
+    def _page(self, items: list, offset: int) -> tuple[list, str | None]:
+        end = offset + self.page_size
+        return items[offset:end], str(end) if end < len(items) else None
+
+    def _changes_since(self, history_id: int) -> list[tuple[int, str, str]]:
+        return [change for change in self.changes if change[0] > history_id]
+
+    def sync_call(self, path: str, query: dict) -> tuple[int, dict] | None:
+        offset = int(query.get("pageToken", query.get("$skiptoken", ["0"]))[0])
+        if path == "/gmail/v1/users/me/profile":
+            return 200, {"emailAddress": self.email, "historyId": str(self.history_id)}
+        if path == "/gmail/v1/users/me/messages":
+            messages, token = self._page([{"id": m} for m in self.mailbox], offset)
+            return 200, {"messages": messages, **({"nextPageToken": token} if token else {})}
+        if path == "/gmail/v1/users/me/history":
+            start = int(query["startHistoryId"][0])
+            if start < self.oldest_history_id:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            records = [
+                {"id": str(hid), ("messagesAdded" if kind == "added" else "messagesDeleted"): [
+                    {"message": {"id": message_id}}
+                ]}
+                for hid, kind, message_id in self._changes_since(start)
+            ]
+            history, token = self._page(records, offset)
+            return 200, {
+                "history": history,
+                "historyId": str(self.history_id),
+                **({"nextPageToken": token} if token else {}),
+            }
+        if path == "/v1.0/me/mailFolders/inbox/messages/delta":
+            delta_url = f"{self.base_url}{path}"
+            if "$deltatoken" in query:
+                since = int(query["$deltatoken"][0])
+                if since < self.oldest_history_id:
+                    return 410, {"error": {"code": "SyncStateNotFound"}}
+                items = [
+                    {"id": message_id, "@removed": {"reason": "deleted"}}
+                    if kind == "deleted"
+                    else {"id": message_id}
+                    for _, kind, message_id in self._changes_since(since)
+                ]
+            else:
+                items = [{"id": m} for m in self.mailbox]
+            value, token = self._page(items, offset)
+            if token:
+                base = f"{delta_url}?" + "&".join(
+                    f"{k}={v[0]}" for k, v in query.items() if k != "$skiptoken"
+                )
+                return 200, {"value": value, "@odata.nextLink": f"{base}&$skiptoken={token}"}
+            return 200, {
+                "value": value,
+                "@odata.deltaLink": f"{delta_url}?$deltatoken={self.history_id}",
+            }
+        return None
+
+    def mail_call(self, method: str, path: str, body) -> tuple[int, dict | None]:
+        message_id = path.rsplit("/", 1)[-1]
+        if "/messages/" in path and not path.endswith("/send"):
+            if message_id.startswith("missing"):
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            return 200, {"id": message_id, "snippet": f"message {message_id}"}
+        if path.endswith("/labels"):
+            return 200, {"labels": [{"id": "INBOX", "name": "INBOX"}]}
+        if path.endswith("/mailFolders"):
+            return 200, {"value": [{"id": "inbox", "displayName": "Inbox"}]}
+        if path.endswith("/messages/send"):
+            return 200, {"id": "sent-message", "raw_length": len(body["raw"])}
+        if path.endswith("/sendMail"):
+            return 202, None
+        return 404, {"error": "unknown path"}
+
+    def handle(self, method: str, path: str, body: bytes):
+        url = urlsplit(path)
+        result = self.sync_call(url.path, parse_qs(url.query))
+        if result is not None:
+            return result
+        if path.startswith("/batch/gmail/v1"):
+            return self._gmail_batch(body)
+        if path.endswith("/$batch"):
+            requests = json.loads(body)["requests"]
+            self.batch_sizes.append(len(requests))
+            responses = []
+            for item in requests:
+                status, payload = self.mail_call(item["method"], item["url"], item.get("body"))
+                responses.append({"id": item["id"], "status": status, "body": payload})
+            return 200, {"responses": responses}
+        return super().handle(method, path, body)
+
+    def _gmail_batch(self, body: bytes):
+        boundary = body.split(b"\r\n", 1)[0][2:]
+        parts = [
+            part.strip(b"\r\n")
+            for part in body.split(b"--" + boundary)
+            if part.strip(b"\r\n") not in (b"", b"--")
+        ]
+        self.batch_sizes.append(len(parts))
+
+        out = []
+        for part in parts:
+            part_headers, _, http = part.partition(b"\r\n\r\n")
+            content_id = [
+                line.split(b":", 1)[1].strip().strip(b"<>")
+                for line in part_headers.split(b"\r\n")
+                if line.lower().startswith(b"content-id")
+            ][0]
+            request_line, _, rest = http.partition(b"\r\n")
+            method, path, _ = request_line.decode().split(" ", 2)
+            _, _, inner_body = rest.partition(b"\r\n\r\n")
+            status, payload = self.mail_call(
+                method, path, json.loads(inner_body) if inner_body.strip() else None
+            )
+            data = json.dumps(payload).encode() if payload is not None else b""
+            out.append(
+                b"--response_boundary\r\n"
+                b"Content-Type: application/http\r\n"
+                b"Content-ID: <response-" + content_id + b">\r\n\r\n"
+                + f"HTTP/1.1 {status} OK\r\n".encode()
+                + b"Content-Type: application/json\r\n\r\n"
+                + data
+                + b"\r\n"
+            )
+        out.append(b"--response_boundary--\r\n")
+        return 200, b"".join(out), "multipart/mixed; boundary=response_boundary"
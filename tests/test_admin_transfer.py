@@ -0,0 +1,70 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from api.core.config import settings
+
+API_KEY_HEADERS = {"X-API-Key": "test-internal-api-key"}
+
+
+def _record(i: int, provider_cd: int = 1) -> dict:
+    return {
+        "email": f"transfer-{i}@example.com",
+        "provider_cd": provider_cd,
+        "is_active": True,
+        "access_token": f"access-{i}",
+        "refresh_token": f"refresh-{i}",
+        "expires_at_utc": "2030-01-01T00:00:00",
+    }
+
+
+def test_import_upserts_in_batches_and_export_streams_them_back(
+    client: TestClient, monkeypatch
+):
+    monkeypatch.setattr(settings, "TRANSFER_BATCH_SIZE", 2)
+    records = [_record(i) for i in range(5)]
+    body = "".join(json.dumps(record) + "\n" for record in records)
+
+    def chunks():
+        # Split mid-line to exercise reassembly of lines across body chunks.
+        data = body.encode()
+        for start in range(0, len(data), 37):
+            yield data[start : start + 37]
+
+    response = client.post(
+        "/admin/accounts/import", content=chunks(), headers=API_KEY_HEADERS
+    )
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["total_rows"] == 5
+    assert [report["rows"] for report in summary["batches"]] == [2, 2, 1]
+    assert all("rows_per_second" in report for report in summary["batches"])
+
+    # Re-importing overwrites instead of duplicating.
+    updated = {**records[0], "access_token": "access-updated"}
+    client.post(
+        "/admin/accounts/import", content=json.dumps(updated), headers=API_KEY_HEADERS
+    )
+
+    exported = client.get("/admin/accounts/export", headers=API_KEY_HEADERS)
+    assert exported.headers["content-type"] == "application/x-ndjson"
+    by_email = {
+        row["email"]: row
+        for row in map(json.loads, exported.text.splitlines())
+        if row["email"].startswith("transfer-")
+    }
+    assert set(by_email) == {record["email"] for record in records}
+    assert by_email["transfer-0@example.com"]["access_token"] == "access-updated"
+    assert by_email["transfer-3@example.com"]["refresh_token"] == "refresh-3"
+
+
+def test_import_rejects_invalid_lines(client: TestClient):
+    response = client.post(
+        "/admin/accounts/import", content=b'{"email": "broken"}\n', headers=API_KEY_HEADERS
+    )
+    assert response.status_code == 422
+    assert "after 0 imported rows" in response.json()["detail"]
+
+
+def test_admin_endpoints_require_api_key(client: TestClient):
+    assert client.get("/admin/accounts/export").status_code == 401
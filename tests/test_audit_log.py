@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from api.auth.schemas import TokenData, UserInfo
+from api.core.audit import AuditLog
+from api.core.config import settings
+from api.models.enums import AuditEventType, Provider
+from api.models.schema import AuthEvent
+from api.repositories.auth_event import monthly_partition
+from api.repositories.user_mail_account import UserMailAccountRepository
+from tests.conftest import TestingSessionLocal
+from tests.test_http_pool import _login_and_callback, _mock_google_client
+from tests.mock_provider import MockOAuthProvider
+
+
+# Stands in for the audit log, keeping `(event type, email)` of each recorded event.
+class _Recorder:
+    def __init__(self):
+        self.events = []
+
+    async def record(self, event_type, email=None, provider_cd=None, detail=None):
+        self.events.append((event_type, email))
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = _Recorder()
+    monkeypatch.setattr("api.auth.router.audit_log", recorder)
+    monkeypatch.setattr("api.repositories.user_mail_account.audit_log", recorder)
+    return recorder
+
+
+async def _written_emails(prefix: str) -> list[str]:
+    async with TestingSessionLocal() as session:
+        return list(
+            await session.scalars(
+                select(AuthEvent.email_address_txt)
+                .where(AuthEvent.email_address_txt.startswith(prefix))
+                .order_by(AuthEvent.occurred_at_utc)
+            )
+        )
+
+
+@pytest.mark.anyio
+async def test_queued_events_are_written_in_one_batch_on_close(monkeypatch):
+    monkeypatch.setattr(settings, "AUDIT_FLUSH_INTERVAL_SECONDS", 60)
+    audit = AuditLog(TestingSessionLocal)
+
+    for n in range(3):
+        await audit.record(AuditEventType.LOGIN, email=f"batch-{n}@example.com")
+    assert await _written_emails("batch-") == []
+
+    await audit.aclose()
+    assert await _written_emails("batch-") == [f"batch-{n}@example.com" for n in range(3)]
+    assert (audit.recorded, audit.written, audit.dropped) == (3, 3, 0)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "policy, kept", [("drop_newest", ["0", "1"]), ("drop_oldest", ["1", "2"])]
+)
+async def test_full_queue_drops_events_without_waiting(monkeypatch, policy, kept):
+    monkeypatch.setattr(settings, "AUDIT_QUEUE_MAX_SIZE", 2)
+    monkeypatch.setattr(settings, "AUDIT_QUEUE_POLICY", policy)
+    audit = AuditLog(TestingSessionLocal)
+
+    # The writer cannot drain the queue until this coroutine yields.
+    for n in range(3):
+        await audit.record(AuditEventType.LOGIN, email=f"{policy}-{n}@example.com")
+    assert audit.dropped == 1
+
+    await audit.aclose()
+    assert await _written_emails(f"{policy}-") == [f"{policy}-{n}@example.com" for n in kept]
+
+
+def test_callback_records_exchange_login_and_failures(client: TestClient, providers, recorder):
+    with MockOAuthProvider(email="audited@example.com") as provider:
+        providers.register(_mock_google_client(provider))
+        assert _login_and_callback(client, "code-1").status_code == 200
+
+    response = client.get("/auth/google/callback?code=c&state=forged")
+    assert response.status_code == 400
+    assert recorder.events == [
+        (AuditEventType.TOKEN_EXCHANGE, None),
+        (AuditEventType.LOGIN, "audited@example.com"),
+        (AuditEventType.LOGIN_FAILED, None),
+    ]
+
+
+def test_provider_mismatch_is_recorded_once_and_answered_with_409(
+    client: TestClient, providers, recorder
+):
+    email = "audit-mismatch@example.com"
+
+    async def register_with_microsoft() -> None:
+        async with TestingSessionLocal() as session:
+            await UserMailAccountRepository(session).create_or_update_user_with_token(
+                UserInfo(email=email),
+                TokenData(access_token="token", expires_at=3600),
+                Provider.MICROSOFT.value,
+            )
+
+    asyncio.run(register_with_microsoft())
+    with MockOAuthProvider(email=email) as provider:
+        providers.register(_mock_google_client(provider))
+        response = _login_and_callback(client, "code-1")
+
+    assert response.status_code == 409
+    assert "already registered with provider 'MICROSOFT'" in response.json()["detail"]
+    assert recorder.events == [
+        (AuditEventType.TOKEN_EXCHANGE, None),
+        (AuditEventType.PROVIDER_MISMATCH, email),
+    ]
+
+
+def test_postgresql_table_is_partitioned_by_month():
+    ddl = str(CreateTable(AuthEvent.__table__).compile(dialect=postgresql.dialect()))
+    assert "PARTITION BY RANGE (occurred_at_utc)" in ddl
+    assert monthly_partition(datetime.date(2026, 12, 15)) == (
+        "auth_events_p2026_12",
+        datetime.date(2026, 12, 1),
+        datetime.date(2027, 1, 1),
+    )
@@ -0,0 +1,168 @@
+import asyncio
+import datetime
+import json
+import uuid
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from api.auth.schemas import TokenData, UserInfo
+from api.core.cache import TTLCache
+from api.core.config import settings
+from api.core.invalidation import InvalidationBus
+from api.models.enums import Provider
+from api.repositories.oauth_token import OAuthTokenRepository
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens.service import token_cache
+from tests.conftest import TestingSessionLocal
+
+CHANNEL = settings.CACHE_INVALIDATION_CHANNEL
+
+
+# Stands in for an asyncpg connection: keeps the LISTEN callbacks and can be dropped.
+class _FakeConnection:
+    def __init__(self):
+        self.listeners = {}
+        self.on_terminate = None
+        self.closed = False
+
+    def add_termination_listener(self, callback) -> None:
+        self.on_terminate = callback
+
+    async def add_listener(self, channel: str, callback) -> None:
+        self.listeners[channel] = callback
+
+    async def fetchval(self, query: str):
+        return 1
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    def terminate(self) -> None:
+        self.closed = True
+
+    def notify(self, payload: str) -> None:
+        self.listeners[CHANNEL](self, 1, CHANNEL, payload)
+
+    def drop(self) -> None:
+        self.closed = True
+        self.on_terminate(self)
+
+
+def _bus_with_cache() -> tuple[InvalidationBus, TTLCache]:
+    bus, cache = InvalidationBus(), TTLCache(10)
+    bus.watch(cache)
+    for key in ("a@example.com", "b@example.com", "account-b"):
+        cache.set(key, "token", 60)
+    return bus, cache
+
+
+def test_notifications_evict_the_account_or_flush():
+    bus, cache = _bus_with_cache()
+
+    # As sent by PostgreSQL's json_build_object.
+    change = '{"account_id" : "account-b", "email" : "b@example.com"}'
+    bus._on_notification(None, 1, CHANNEL, change)
+    assert (cache.get("a@example.com"), cache.get("b@example.com"), cache.get("account-b")) == (
+        "token",
+        None,
+        None,
+    )
+
+    bus._on_notification(None, 1, CHANNEL, "not json")
+    assert len(cache) == 0
+
+
+@pytest.mark.anyio
+async def test_listener_reconnects_and_flushes_after_a_gap(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_INVALIDATION_RECONNECT_MAX_SECONDS", 0.01)
+    bus, cache = _bus_with_cache()
+    connections = []
+
+    async def connect(dsn: str):
+        if not connections:
+            connections.append(None)
+            raise OSError("database unavailable")
+        connections.append(_FakeConnection())
+        return connections[-1]
+
+    async def until(condition) -> None:
+        for _ in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("condition not reached")
+
+    task = asyncio.create_task(bus.run_forever(connect))
+    try:
+        await until(lambda: bus.connected)
+        assert len(connections) == 2 and len(cache) == 0
+
+        cache.set("a@example.com", "token", 60)
+        cache.set("b@example.com", "token", 60)
+        connections[-1].notify(json.dumps({"account_id": "x", "email": "b@example.com"}))
+        assert cache.get("a@example.com") == "token" and cache.get("b@example.com") is None
+
+        # Changes made while disconnected are never announced: the cache is flushed.
+        connections[-1].drop()
+        assert len(cache) == 0
+        await until(lambda: len(connections) == 3 and bus.connected)
+        assert CHANNEL in connections[-1].listeners
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+@pytest.mark.anyio
+async def test_relogin_and_refresh_writes_evict_cached_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_INVALIDATION_ENABLED", True)
+    email = "invalidated@example.com"
+
+    async def login(access_token: str):
+        async with TestingSessionLocal() as session:
+            return await UserMailAccountRepository(session).create_or_update_user_with_token(
+                UserInfo(email=email),
+                TokenData(access_token=access_token, refresh_token="rt", expires_at=3600),
+                Provider.GOOGLE.value,
+            )
+
+    await login("first")
+    token_cache.set(email, "cached", 60)
+    await login("second")
+    assert token_cache.get(email) is None
+
+    token_cache.set(email, "cached", 60)
+    async with TestingSessionLocal() as session:
+        token = await UserMailAccountRepository(session).get_active_token(email)
+        await OAuthTokenRepository(session).bulk_update_tokens(
+            [{"oauth_token_id": token.oauth_token_id, "access_token_txt": "refreshed"}]
+        )
+    assert token_cache.get(email) is None
+
+
+def test_postgresql_refresh_update_publishes_each_updated_account():
+    updates = [{"oauth_token_id": uuid.uuid4(), "access_token_txt": "x"}]
+    dialect = postgresql.asyncpg.dialect()
+
+    build = OAuthTokenRepository._build_bulk_update_statement
+
+    assert "pg_notify" not in str(build(updates).compile(dialect=dialect))
+    sql = str(build(updates, notify=True).compile(dialect=dialect))
+    assert "user_mail_accounts.user_mail_account_id = oauth_tokens.user_mail_account_id" in sql
+    assert "pg_notify(" in sql.split("RETURNING")[1]
+
+
+def test_postgresql_upsert_publishes_in_the_same_statement():
+    repo = UserMailAccountRepository(session=None)
+    args = (
+        UserInfo(email="pg@example.com"),
+        TokenData(access_token="token", expires_at=3600),
+        Provider.GOOGLE.value,
+        datetime.datetime(2030, 1, 1),
+    )
+    dialect = postgresql.asyncpg.dialect()
+
+    assert "pg_notify" not in str(repo._build_upsert_statement(*args).compile(dialect=dialect))
+    sql = str(repo._build_upsert_statement(*args, notify=True).compile(dialect=dialect))
+    assert "pg_notify(" in sql
+    assert "json_build_object(" in sql
@@ -0,0 +1,69 @@
+import subprocess
+import sys
+
+import pytest
+
+from api.auth.base import BaseOAuth2
+from api.auth.oidc import jwks_cache
+from api.core.database import get_engine
+from api.core.http import http_clients
+from api.warmup import warm_up
+from benchmarks.bench_import_time import find_regressions
+from tests.mock_provider import MockOAuthProvider
+
+
+def test_importing_the_app_creates_no_engine_or_database_driver():
+    script = (
+        "import sys, api.main, api.core.database as database\n"
+        "assert database._engine is None\n"
+        "assert 'aiosqlite' not in sys.modules and 'asyncpg' not in sys.modules\n"
+        "database.SessionLocal()\n"
+        "assert database._engine is not None and 'aiosqlite' in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+
+def _client(name: str, provider_cd: int, jwks_uri: str) -> BaseOAuth2:
+    return BaseOAuth2(
+        client_id="warmup-client-id",
+        client_secret="warmup-client-secret",
+        redirect_uri=f"http://testserver/auth/{name}/callback",
+        authorization_url="http://127.0.0.1:9/authorize",
+        token_url="http://127.0.0.1:9/token",
+        userinfo_url="http://127.0.0.1:9/userinfo",
+        jwks_uri=jwks_uri,
+        scopes=["openid"],
+        provider=name,
+        provider_cd=provider_cd,
+    )
+
+
+@pytest.mark.anyio
+async def test_warm_up_opens_database_and_provider_connections(providers):
+    jwks_cache.clear()
+    try:
+        with MockOAuthProvider(issue_id_tokens=True) as provider:
+            providers._swap(
+                [
+                    _client("warm", 101, f"{provider.base_url}/jwks"),
+                    _client("unreachable", 102, "http://127.0.0.1:9/jwks"),
+                ]
+            )
+            report = await warm_up()
+
+        assert set(report["seconds"]) == {"database", "provider:warm"}
+        assert report["failed"] == ["provider:unreachable"]
+        assert [path for _, path in provider.requests] == ["/jwks"]
+        assert f"{provider.base_url}/jwks" in jwks_cache._entries
+    finally:
+        jwks_cache.clear()
+        await http_clients.aclose()
+        await get_engine().dispose()
+
+
+def test_cold_start_regressions_compare_medians():
+    baseline = {"import_ms": {"median": 500.0}, "total_ms": {"median": 600.0}}
+    report = {"import_ms": {"median": 520.0}, "total_ms": {"median": 900.0}}
+    assert find_regressions(report, baseline, tolerance=0.1) == [
+        "total_ms: median 900.0ms > baseline 600.0ms"
+    ]
@@ -0,0 +1,56 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from api.core.config import settings
+from api.core.database import engine_options
+
+PG_URL = "postgresql+asyncpg://user:pw@pgbouncer:6432/app"
+SQLITE_URL = "sqlite+aiosqlite:///./test.db"
+
+
+def test_queue_mode_passes_pool_sizing(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 3)
+    monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 2)
+    monkeypatch.setattr(settings, "DB_POOL_RECYCLE", 300)
+    monkeypatch.setattr(settings, "DB_POOL_PRE_PING", True)
+
+    options = engine_options(PG_URL)
+    assert issubclass(options["poolclass"], AsyncAdaptedQueuePool)
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 2
+    assert options["pool_recycle"] == 300
+    assert options["pool_pre_ping"] is True
+    assert "connect_args" not in options
+
+
+def test_pgbouncer_mode_disables_statement_caching_for_asyncpg_only(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_MODE", "null")
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+
+    options = engine_options(PG_URL)
+    assert issubclass(options["poolclass"], NullPool)
+    assert "pool_size" not in options
+    connect_args = options["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    name = connect_args["prepared_statement_name_func"]
+    assert name() != name()
+
+    assert "connect_args" not in engine_options(SQLITE_URL)
+
+
+@pytest.mark.anyio
+async def test_null_mode_times_each_connection(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_MODE", "null")
+    engine = create_async_engine(SQLITE_URL, **engine_options(SQLITE_URL))
+    before = REGISTRY.get_sample_value("db_pool_checkout_seconds_count") or 0.0
+    try:
+        for _ in range(2):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    finally:
+        await engine.dispose()
+    assert REGISTRY.get_sample_value("db_pool_checkout_seconds_count") == before + 2
@@ -0,0 +1,42 @@
+from urllib.parse import parse_qs, urlparse
+
+from fastapi.testclient import TestClient
+
+from api.auth.base import BaseOAuth2
+from api.models.enums import Provider
+from tests.mock_provider import MockOAuthProvider
+
+
+def _mock_google_client(provider: MockOAuthProvider) -> BaseOAuth2:
+    return BaseOAuth2(
+        client_id="test-client-id",
+        client_secret="test-client-secret",
+        redirect_uri="http://testserver/auth/google/callback",
+        authorization_url=f"{provider.base_url}/authorize",
+        token_url=f"{provider.base_url}/token",
+        userinfo_url=f"{provider.base_url}/userinfo",
+        scopes=["openid", "email"],
+        provider="google",
+        provider_cd=Provider.GOOGLE.value,
+    )
+
+
+def _login_and_callback(client: TestClient, code: str):
+    response = client.get("/auth/google/login", follow_redirects=False)
+    state = parse_qs(urlparse(response.headers["location"]).query)["state"][0]
+    return client.get(f"/auth/google/callback?code={code}&state={state}")
+
+
+def test_callbacks_reuse_pooled_provider_connections(client: TestClient, providers):
+    with MockOAuthProvider(email="pooled@example.com") as provider:
+        providers.register(_mock_google_client(provider))
+
+        first = _login_and_callback(client, "code-1")
+        second = _login_and_callback(client, "code-2")
+
+    assert first.status_code == 200, first.text
+    assert second.status_code == 200, second.text
+    assert first.json()["user"]["email"] == "pooled@example.com"
+    # Two callbacks made four provider requests (token + userinfo each) over one connection.
+    assert len(provider.requests) == 4
+    assert provider.connections == 1
@@ -0,0 +1,38 @@
+import copy
+
+import pytest
+
+from api.core.http import http_clients
+from api.main import app
+from benchmarks.load_callback import LoadTestProvider, find_regressions, run_load
+
+
+@pytest.mark.anyio
+async def test_load_run_reports_both_phases_and_flags_regressions(providers):
+    try:
+        with LoadTestProvider() as provider:
+            report = await run_load(
+                app,
+                provider.base_url,
+                iterations=12,
+                concurrency=3,
+                accounts=4,
+                query_counter=lambda: 0,
+            )
+    finally:
+        await http_clients.aclose()
+
+    assert report["first_login"]["flows"] == 4
+    assert report["re_login"]["flows"] == 12
+    for phase in ("first_login", "re_login"):
+        assert report[phase]["errors"] == {}
+        assert report[phase]["callback"]["count"] == report[phase]["flows"]
+    # Re-logins of the same accounts made one token + one userinfo call per flow.
+    assert len([path for _, path in provider.requests if path == "/token"]) == 16
+
+    assert find_regressions(report, report, tolerance=0.1) == []
+    slower = copy.deepcopy(report)
+    slower["re_login"]["callback"]["p95_ms"] = report["re_login"]["callback"]["p95_ms"] * 2
+    slower["re_login"]["errors"] = {"500": 1}
+    regressions = find_regressions(slower, report, tolerance=0.1)
+    assert [r.split(":")[0] for r in regressions] == ["re_login", "re_login"]
@@ -0,0 +1,85 @@
+import asyncio
+import base64
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.core.http import http_clients
+from api.mail.batcher import MailBatcher, mail_batcher
+from api.mail.transports import MailRequestError
+from api.models.enums import Provider
+from tests.conftest import TestingSessionLocal, add_account
+
+API_KEY_HEADERS = {"X-API-Key": "test-internal-api-key"}
+GMAIL_EMAIL = "batch-gmail@example.com"
+GRAPH_EMAIL = "batch-graph@example.com"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def mail_accounts():
+    async def add():
+        await add_account(GMAIL_EMAIL, Provider.GOOGLE)
+        await add_account(GRAPH_EMAIL, Provider.MICROSOFT)
+
+    asyncio.run(add())
+
+
+@pytest.mark.anyio
+async def test_gmail_calls_are_multiplexed_into_batches(mail_provider):
+    batcher = MailBatcher(TestingSessionLocal, window_seconds=0.05)
+    try:
+        transport = await batcher.transport_for(GMAIL_EMAIL)
+        results = await asyncio.gather(
+            *(
+                batcher.submit(GMAIL_EMAIL, transport.get_message(f"m{i}"), transport)
+                for i in range(120)
+            )
+        )
+    finally:
+        await http_clients.aclose()
+
+    assert [result["id"] for result in results] == [f"m{i}" for i in range(120)]
+    # 120 calls went out as three batch requests of at most GMAIL_BATCH_SIZE calls.
+    assert sorted(mail_provider.batch_sizes) == [20, 50, 50]
+    assert len(mail_provider.requests) == 3
+    assert batcher.stats() == {"calls": 120, "batches": 3}
+
+
+@pytest.mark.anyio
+async def test_graph_partial_failures_reach_only_their_callers(mail_provider):
+    batcher = MailBatcher(TestingSessionLocal, window_seconds=0.05)
+    try:
+        transport = await batcher.transport_for(GRAPH_EMAIL)
+        ids = [f"m{i}" for i in range(44)] + ["missing-1"]
+        results = await asyncio.gather(
+            *(batcher.submit(GRAPH_EMAIL, transport.get_message(i), transport) for i in ids),
+            return_exceptions=True,
+        )
+    finally:
+        await http_clients.aclose()
+
+    assert sorted(mail_provider.batch_sizes) == [5, 20, 20]
+    assert isinstance(results[-1], MailRequestError)
+    assert results[-1].status == 404
+    assert [result["id"] for result in results[:-1]] == ids[:-1]
+
+
+def test_mail_endpoints(client: TestClient, mail_provider, monkeypatch):
+    monkeypatch.setattr(mail_batcher, "session_factory", TestingSessionLocal)
+    raw = base64.urlsafe_b64encode(b"Subject: hi\r\n\r\nhello").decode().rstrip("=")
+
+    labels = client.get(f"/mail/{GMAIL_EMAIL}/labels", headers=API_KEY_HEADERS)
+    assert labels.status_code == 200, labels.text
+    assert labels.json()["labels"][0]["id"] == "INBOX"
+
+    folders = client.get(f"/mail/{GRAPH_EMAIL}/labels", headers=API_KEY_HEADERS)
+    assert folders.json()["value"][0]["displayName"] == "Inbox"
+
+    sent = client.post(f"/mail/{GRAPH_EMAIL}/send", json={"raw": raw}, headers=API_KEY_HEADERS)
+    assert sent.status_code == 202, sent.text
+
+    missing = client.get(f"/mail/{GMAIL_EMAIL}/messages/missing-2", headers=API_KEY_HEADERS)
+    assert missing.status_code == 404
+
+    unknown = client.get("/mail/nobody@example.com/labels", headers=API_KEY_HEADERS)
+    assert unknown.status_code == 404
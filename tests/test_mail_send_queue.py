@@ -0,0 +1,177 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql
+
+from api.core.config import settings
+from api.core.http import http_clients
+from api.mail.send_queue import MailSendWorker
+from api.models.enums import MailSendStatus
+from api.models.schema import MailSendJob
+from api.repositories.mail_send_job import MailSendJobRepository
+from tests.conftest import TestingSessionLocal, add_account
+
+API_KEY_HEADERS = {"X-API-Key": "test-internal-api-key"}
+LEASE = 300
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+async def _enqueue(account_id: uuid.UUID, count: int = 1) -> list[int]:
+    async with TestingSessionLocal() as session:
+        repo = MailSendJobRepository(session)
+        return [(await repo.enqueue(account_id, "cmF3")).mail_send_job_id for _ in range(count)]
+
+
+async def _claim(now: datetime.datetime, limit: int, account_concurrency: int = 1) -> list[int]:
+    async with TestingSessionLocal() as session:
+        jobs = await MailSendJobRepository(session).claim(now, limit, LEASE, account_concurrency)
+    return [job.mail_send_job_id for job in jobs]
+
+
+async def _job(job_id: int) -> MailSendJob:
+    async with TestingSessionLocal() as session:
+        return await session.get(MailSendJob, job_id)
+
+
+async def _all_job_ids() -> list[int]:
+    async with TestingSessionLocal() as session:
+        return list(await session.scalars(select(MailSendJob.mail_send_job_id)))
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    async def clear():
+        async with TestingSessionLocal() as session:
+            await session.execute(delete(MailSendJob))
+            await session.commit()
+
+    asyncio.run(clear())
+
+
+@pytest.mark.anyio
+async def test_concurrent_workers_claim_disjoint_jobs():
+    for n in range(20):
+        await _enqueue(await add_account(f"claim-{n}@example.com"))
+
+    claims = await asyncio.gather(*(_claim(_utcnow(), limit=3) for _ in range(5)))
+    claimed = [job_id for jobs in claims for job_id in jobs]
+    assert all(len(jobs) == 3 for jobs in claims)
+    assert len(set(claimed)) == 15
+
+    # The rest go to the next claims, and nothing is handed out twice.
+    rest = await _claim(_utcnow(), limit=10)
+    assert sorted(rest + claimed) == sorted(await _all_job_ids())
+    assert await _claim(_utcnow(), limit=10) == []
+
+
+@pytest.mark.anyio
+async def test_account_jobs_are_claimed_in_order_up_to_the_concurrency_cap():
+    first, second, third, fourth = await _enqueue(await add_account("capped@example.com"), 4)
+
+    assert await _claim(_utcnow(), limit=10, account_concurrency=2) == [first, second]
+    assert await _claim(_utcnow(), limit=10, account_concurrency=2) == []
+
+    async with TestingSessionLocal() as session:
+        await MailSendJobRepository(session).finish(
+            [{"mail_send_job_id": second, "attempt": 1, "status_txt": "sent"}]
+        )
+    assert await _claim(_utcnow(), limit=10, account_concurrency=2) == [third]
+
+    # A job whose worker went away is claimed again once its lease runs out.
+    later = _utcnow() + datetime.timedelta(seconds=LEASE + 1)
+    assert await _claim(later, limit=10, account_concurrency=2) == [first, third]
+    assert (await _job(first)).attempt_cnt == 2
+    assert (await _job(fourth)).status_txt == MailSendStatus.QUEUED.value
+
+
+@pytest.mark.anyio
+async def test_failing_sends_back_off_then_dead_letter(mail_provider, monkeypatch):
+    monkeypatch.setattr(settings, "MAIL_SEND_MAX_ATTEMPTS", 2)
+    (job_id,) = await _enqueue(await add_account("dead-letter@example.com"))
+    worker = MailSendWorker(TestingSessionLocal)
+    try:
+        mail_provider.faults = [("status", 503)]
+        assert await worker.run_once() == 1
+        job = await _job(job_id)
+        assert (job.status_txt, job.attempt_cnt) == (MailSendStatus.QUEUED.value, 1)
+        assert "503" in job.last_error_txt
+        assert job.next_attempt_at_utc >= _utcnow() + datetime.timedelta(
+            seconds=settings.MAIL_SEND_RETRY_BASE_SECONDS / 2 - 1
+        )
+        # Not due again until the backoff has passed.
+        assert await worker.run_once() == 0
+
+        async with TestingSessionLocal() as session:
+            await session.execute(
+                update(MailSendJob)
+                .where(MailSendJob.mail_send_job_id == job_id)
+                .values(next_attempt_at_utc=_utcnow())
+            )
+            await session.commit()
+        mail_provider.faults = [("status", 503)]
+        assert await worker.run_once() == 1
+    finally:
+        await http_clients.aclose()
+
+    job = await _job(job_id)
+    assert (job.status_txt, job.attempt_cnt) == (MailSendStatus.DEAD.value, 2)
+    assert job.raw_message_txt == "cmF3"
+
+
+@pytest.mark.anyio
+async def test_rejected_messages_are_dead_lettered_at_once(mail_provider):
+    (job_id,) = await _enqueue(await add_account("rejected@example.com"))
+    mail_provider.faults = [("status", 400)]
+    try:
+        assert await MailSendWorker(TestingSessionLocal).run_once() == 1
+    finally:
+        await http_clients.aclose()
+
+    job = await _job(job_id)
+    assert (job.status_txt, job.attempt_cnt) == (MailSendStatus.DEAD.value, 1)
+
+
+def test_outbox_queues_messages_for_the_workers(client: TestClient, mail_provider):
+    email = "outbox@example.com"
+    asyncio.run(add_account(email))
+
+    response = client.post(f"/mail/{email}/outbox", json={"raw": "cmF3"}, headers=API_KEY_HEADERS)
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued" and job["attempts"] == 0
+    assert mail_provider.requests == []
+
+    async def work() -> int:
+        try:
+            return await MailSendWorker(TestingSessionLocal).run_once()
+        finally:
+            await http_clients.aclose()
+
+    assert asyncio.run(work()) == 1
+    sent = client.get(f"/mail/{email}/outbox/{job['job_id']}", headers=API_KEY_HEADERS).json()
+    assert sent["status"] == "sent" and sent["attempts"] == 1 and sent["sent_at"]
+    assert mail_provider.batch_sizes == [1]
+
+    stats = client.get("/admin/mail-send-queue", headers=API_KEY_HEADERS).json()
+    assert stats == {"queued": 0, "sending": 0, "sent": 1, "dead": 0}
+    assert (
+        client.post(
+            "/mail/nobody@example.com/outbox", json={"raw": "cmF3"}, headers=API_KEY_HEADERS
+        ).status_code
+        == 404
+    )
+    assert client.get(f"/mail/{email}/outbox/0", headers=API_KEY_HEADERS).status_code == 404
+
+
+def test_postgresql_claims_skip_locked_jobs():
+    stmt = MailSendJobRepository._build_claim_statement(datetime.datetime(2030, 1, 1), 10, 60, 1)
+    sql = str(stmt.compile(dialect=postgresql.asyncpg.dialect()))
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert sql.startswith("UPDATE mail_send_jobs") and "RETURNING" in sql
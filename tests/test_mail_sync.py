@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.core.http import http_clients
+from api.mail.sync import sync_mailbox
+from api.models.enums import Provider
+from api.repositories.mail_sync_cursor import MailSyncCursorRepository
+from api.repositories.user_mail_account import UserMailAccountRepository
+from tests.conftest import TestingSessionLocal, add_account
+
+API_KEY_HEADERS = {"X-API-Key": "test-internal-api-key"}
+
+
+async def _cursor(email: str) -> str | None:
+    async with TestingSessionLocal() as session:
+        account = await UserMailAccountRepository(session).get_by_email(email)
+        return await MailSyncCursorRepository(session).get_cursor(account.user_mail_account_id)
+
+
+async def _sync(email: str) -> list[tuple[str, str | None]]:
+    return [
+        (change.kind, change.message_id)
+        async for change in sync_mailbox(TestingSessionLocal, email)
+    ]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "email, provider",
+    [("sync-gmail@example.com", Provider.GOOGLE), ("sync-graph@example.com", Provider.MICROSOFT)],
+)
+async def test_incremental_sync_fetches_only_changes_and_resyncs_expired_cursors(
+    mail_provider, email, provider
+):
+    await add_account(email, provider)
+    full_listing = [("resync", None)] + [("upserted", f"m{i}") for i in range(5)]
+    try:
+        # No cursor yet: the whole mailbox, paged.
+        assert await _sync(email) == full_listing
+        assert await _cursor(email) is not None
+
+        # Only the churn since the stored cursor, in one request.
+        mail_provider.add_message("m5")
+        mail_provider.delete_message("m0")
+        mail_provider.requests.clear()
+        assert await _sync(email) == [("upserted", "m5"), ("deleted", "m0")]
+        assert len(mail_provider.requests) == 1
+
+        # Nothing changed: nothing streamed, but the pass still completes.
+        assert await _sync(email) == []
+
+        # The provider has dropped the history behind the cursor: full resync.
+        mail_provider.oldest_history_id = mail_provider.history_id + 1
+        mail_provider.history_id += 1
+        assert await _sync(email) == [("resync", None)] + [
+            ("upserted", f"m{i}") for i in range(1, 6)
+        ]
+    finally:
+        await http_clients.aclose()
+
+
+@pytest.mark.anyio
+async def test_interrupted_sync_keeps_previous_cursor(mail_provider):
+    email = "sync-interrupted@example.com"
+    await add_account(email, Provider.GOOGLE)
+    try:
+        await _sync(email)
+        cursor = await _cursor(email)
+
+        mail_provider.add_message("m5")
+        mail_provider.add_message("m6")
+        stream = sync_mailbox(TestingSessionLocal, email)
+        assert (await anext(stream)).message_id == "m5"
+        await stream.aclose()
+        assert await _cursor(email) == cursor
+
+        # The next pass replays everything since the old cursor.
+        assert await _sync(email) == [("upserted", "m5"), ("upserted", "m6")]
+    finally:
+        await http_clients.aclose()
+
+
+def test_changes_endpoint_streams_ndjson(client: TestClient, mail_provider):
+    email = "sync-endpoint@example.com"
+    asyncio.run(add_account(email, Provider.MICROSOFT))
+
+    response = client.get(f"/mail/{email}/changes", headers=API_KEY_HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["kind"] == "resync"
+    assert [line["message_id"] for line in lines[1:]] == [f"m{i}" for i in range(5)]
+
+    missing = client.get("/mail/nobody@example.com/changes", headers=API_KEY_HEADERS)
+    assert missing.status_code == 404
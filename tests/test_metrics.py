@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from api.core.metrics import render_metrics
+from tests.mock_provider import MockOAuthProvider
+from tests.test_http_pool import _login_and_callback, _mock_google_client
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_callback_phases_and_provider_calls_are_recorded(client: TestClient, providers):
+    phases = ("token_exchange", "userinfo", "upsert", "total")
+    before = {
+        phase: _sample("oauth_callback_phase_seconds_count", provider="google", phase=phase)
+        for phase in phases
+    }
+    responses = _sample("provider_responses_total", provider="google", status="200")
+
+    with MockOAuthProvider(email="metrics@example.com") as provider:
+        providers.register(_mock_google_client(provider))
+        assert _login_and_callback(client, "metrics-code").status_code == 200
+
+    for phase in phases:
+        after = _sample("oauth_callback_phase_seconds_count", provider="google", phase=phase)
+        assert after == before[phase] + 1, phase
+    assert _sample("provider_responses_total", provider="google", status="200") == responses + 2
+    assert _sample("oauth_callbacks_in_progress", provider="google") == 0
+    assert _sample("db_commit_seconds_count", operation="account_upsert") >= 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'oauth_callback_phase_seconds_bucket{le="0.005",phase="upsert",provider="google"}' in (
+        response.text
+    )
+
+
+def test_multiprocess_mode_aggregates_from_the_metrics_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    body, content_type = render_metrics()
+    assert content_type.startswith("text/plain")
+    assert b"oauth_callback_phase_seconds" not in body
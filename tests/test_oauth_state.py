@@ -0,0 +1,122 @@
+import datetime
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from api.auth.base import BaseOAuth2
+from api.auth.state import CLOCK_SKEW_SECONDS, StateError, StateManager, pkce_challenge
+from api.core.security import derive_fernet_key
+from api.models.enums import Provider
+from api.models.schema import OAuthStateNonce
+from tests.conftest import TestingSessionLocal
+from tests.mock_provider import MockOAuthProvider
+
+
+def _manager(ttl_seconds: int = 600) -> StateManager:
+    return StateManager(derive_fernet_key("state-test"), ttl_seconds)
+
+
+async def _consume(manager: StateManager, state: str, provider: str):
+    async with TestingSessionLocal() as session:
+        return await manager.consume(state, provider, session)
+
+
+@pytest.mark.anyio
+async def test_state_round_trip_is_single_use_and_provider_bound():
+    manager = _manager()
+    state = manager.issue("google", code_verifier="verifier")
+    assert "verifier" not in state
+
+    with pytest.raises(StateError):
+        await _consume(manager, state, "microsoft")
+    assert (await _consume(manager, state, "google")).code_verifier == "verifier"
+    with pytest.raises(StateError, match="already been used"):
+        await _consume(manager, state, "google")
+    # Another process (its own manager, same key) rejects the replay too.
+    with pytest.raises(StateError, match="already been used"):
+        await _consume(_manager(), state, "google")
+
+
+@pytest.mark.anyio
+async def test_state_rejects_tampered_foreign_and_expired_tokens(monkeypatch):
+    manager = _manager(ttl_seconds=60)
+    state = manager.issue("google")
+
+    with pytest.raises(StateError):
+        await _consume(manager, state[:-4] + "AAAA", "google")
+    with pytest.raises(StateError):
+        foreign = StateManager(derive_fernet_key("other"), 60).issue("google")
+        await _consume(_manager(), foreign, "google")
+
+    issued_at = time.time()
+    monkeypatch.setattr(time, "time", lambda: issued_at + 120)
+    with pytest.raises(StateError):
+        await _consume(manager, state, "google")
+
+
+async def _nonce_expiries() -> dict[str, datetime.datetime]:
+    async with TestingSessionLocal() as session:
+        rows = await session.execute(
+            select(OAuthStateNonce.nonce_txt, OAuthStateNonce.expires_at_utc)
+        )
+        return dict(rows.all())
+
+
+@pytest.mark.anyio
+async def test_used_nonces_are_kept_until_their_state_expires(monkeypatch):
+    monkeypatch.setattr("api.auth.state.PURGE_EVERY", 1)
+    async with TestingSessionLocal() as session:
+        session.add(
+            OAuthStateNonce(nonce_txt="expired", expires_at_utc=datetime.datetime(2000, 1, 1))
+        )
+        await session.commit()
+
+    manager = _manager(ttl_seconds=60)
+    issued_at = time.time()
+    nonce = (await _consume(manager, manager.issue("google"), "google")).nonce
+
+    # Consuming a state purges the nonces whose states can no longer be accepted anyway.
+    expiries = await _nonce_expiries()
+    assert "expired" not in expiries
+    expected = datetime.datetime.fromtimestamp(
+        issued_at + 60 + CLOCK_SKEW_SECONDS, datetime.timezone.utc
+    ).replace(tzinfo=None)
+    assert abs(expiries[nonce] - expected) < datetime.timedelta(seconds=2)
+
+
+def test_login_flow_uses_no_cookies_and_sends_pkce_verifier(client: TestClient, providers):
+    assert "set-cookie" not in client.get("/").headers
+
+    with MockOAuthProvider(email="stateless@example.com") as provider:
+        providers.register(
+            BaseOAuth2(
+                client_id="test-client-id",
+                client_secret="test-client-secret",
+                redirect_uri="http://testserver/auth/google/callback",
+                authorization_url=f"{provider.base_url}/authorize",
+                token_url=f"{provider.base_url}/token",
+                userinfo_url=f"{provider.base_url}/userinfo",
+                scopes=["openid", "email"],
+                provider="google",
+                provider_cd=Provider.GOOGLE.value,
+            )
+        )
+        login = client.get("/auth/google/login", follow_redirects=False)
+        assert "set-cookie" not in login.headers
+        query = parse_qs(urlparse(login.headers["location"]).query)
+        state = query["state"][0]
+        assert query["code_challenge_method"] == ["S256"]
+
+        # The callback needs nothing but the state, e.g. when it lands in another browser.
+        client.cookies.clear()
+        first = client.get(f"/auth/google/callback?code=c1&state={state}")
+        replay = client.get(f"/auth/google/callback?code=c2&state={state}")
+
+    assert first.status_code == 200, first.text
+    assert replay.status_code == 400
+    verifier = provider.token_forms[0]["code_verifier"]
+    assert pkce_challenge(verifier) == query["code_challenge"][0]
+    assert len(provider.token_forms) == 1
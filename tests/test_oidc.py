@@ -0,0 +1,81 @@
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.auth.base import BaseOAuth2
+from api.auth.oidc import IdTokenError, jwks_cache
+from api.core.http import http_clients
+from api.models.enums import Provider
+from tests.mock_provider import MockOAuthProvider
+
+
+def _oidc_client(provider: MockOAuthProvider) -> BaseOAuth2:
+    return BaseOAuth2(
+        client_id=provider.client_id,
+        client_secret="test-client-secret",
+        redirect_uri="http://testserver/auth/google/callback",
+        authorization_url=f"{provider.base_url}/authorize",
+        token_url=f"{provider.base_url}/token",
+        userinfo_url=f"{provider.base_url}/userinfo",
+        jwks_uri=f"{provider.base_url}/jwks",
+        issuers=[provider.issuer],
+        scopes=["openid", "email"],
+        provider="google",
+        provider_cd=Provider.GOOGLE.value,
+    )
+
+
+@pytest.fixture
+def oidc_provider():
+    jwks_cache.clear()
+    with MockOAuthProvider(email="oidc@example.com", issue_id_tokens=True) as provider:
+        yield provider
+    jwks_cache.clear()
+
+
+def test_callback_reads_email_from_id_token_without_userinfo_call(
+    client: TestClient, providers, oidc_provider
+):
+    providers.register(_oidc_client(oidc_provider))
+
+    for code in ("code-1", "code-2"):
+        login = client.get("/auth/google/login", follow_redirects=False)
+        state = parse_qs(urlparse(login.headers["location"]).query)["state"][0]
+        response = client.get(f"/auth/google/callback?code={code}&state={state}")
+        assert response.status_code == 200, response.text
+        assert response.json()["user"]["email"] == "oidc@example.com"
+
+    paths = [path for _, path in oidc_provider.requests]
+    assert not any(path.startswith("/userinfo") for path in paths)
+    # The key set was fetched once and served from cache for the second login.
+    assert paths.count("/jwks") == 1
+
+
+@pytest.mark.anyio
+async def test_verify_id_token_rejects_bad_claims_and_refetches_unknown_kid(
+    oidc_provider, monkeypatch
+):
+    oauth_client = _oidc_client(oidc_provider)
+    try:
+        claims = await oauth_client.verify_id_token(oidc_provider.make_id_token())
+        assert claims["email"] == "oidc@example.com"
+
+        for bad_token in (
+            oidc_provider.make_id_token(aud="someone-else"),
+            oidc_provider.make_id_token(iss="https://evil.example.com"),
+            oidc_provider.make_id_token(exp=int(time.time()) - 3600),
+            oidc_provider.make_id_token()[:-4] + "AAAA",
+        ):
+            with pytest.raises(IdTokenError):
+                await oauth_client.verify_id_token(bad_token)
+
+        # The provider rotates its key: an unknown kid triggers one refetch of the key set.
+        monkeypatch.setattr("api.auth.oidc.settings.OIDC_JWKS_MIN_REFETCH_SECONDS", 0)
+        oidc_provider.kid = "mock-key-2"
+        claims = await oauth_client.verify_id_token(oidc_provider.make_id_token())
+        assert claims["sub"] == "mock-subject"
+        assert [path for _, path in oidc_provider.requests].count("/jwks") == 2
+    finally:
+        await http_clients.aclose()
@@ -0,0 +1,84 @@
+import asyncio
+import collections
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.core.config import settings
+from api.core.profiler import AWAITING, SlowRequestProfiler, profile_store
+
+API_KEY_HEADER = {"X-API-Key": "test-internal-api-key"}
+
+
+def _blocking_work():
+    time.sleep(0.1)
+
+
+def _profiled_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(SlowRequestProfiler)
+
+    @app.get("/slow")
+    async def slow():
+        _blocking_work()
+        return {}
+
+    @app.get("/fast")
+    async def fast():
+        return {}
+
+    @app.get("/waiting")
+    async def waiting():
+        await asyncio.sleep(0.2)
+        return {}
+
+    return app
+
+
+def test_slow_requests_are_profiled_into_a_bounded_buffer(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILER_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "PROFILER_SLOW_THRESHOLD_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "PROFILER_INTERVAL_SECONDS", 0.002)
+    monkeypatch.setattr(profile_store, "_profiles", collections.deque(maxlen=2))
+
+    with TestClient(_profiled_app()) as profiled:
+        assert profiled.get("/fast").status_code == 200
+        for _ in range(3):
+            assert profiled.get("/slow").status_code == 200
+
+    profiles = client.get("/admin/profiles", headers=API_KEY_HEADER).json()
+    assert [profile["path"] for profile in profiles] == ["/slow", "/slow"]
+    assert profiles[0]["profile_id"] > profiles[1]["profile_id"]
+    assert profiles[0]["duration_seconds"] >= 0.1
+    assert profiles[0]["samples"] > 5
+
+    folded = client.get(f"/admin/profiles/{profiles[0]['profile_id']}", headers=API_KEY_HEADER)
+    assert folded.status_code == 200
+    stack, count = folded.text.splitlines()[0].rsplit(" ", 1)
+    assert "tests.test_profiler:_blocking_work" in stack.split(";")
+    assert int(count) > 0
+
+    missing = client.get("/admin/profiles/0", headers=API_KEY_HEADER)
+    assert missing.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_only_get_their_own_samples(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILER_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "PROFILER_SLOW_THRESHOLD_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "PROFILER_INTERVAL_SECONDS", 0.002)
+    monkeypatch.setattr(profile_store, "_profiles", collections.deque(maxlen=2))
+
+    transport = httpx.ASGITransport(app=_profiled_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as profiled:
+        await asyncio.gather(profiled.get("/waiting"), profiled.get("/slow"))
+
+    profiles = {profile.path: profile for profile in profile_store.list()}
+    slow, waiting = profiles["/slow"].samples, profiles["/waiting"].samples
+    assert any("tests.test_profiler:_blocking_work" in stack for stack in slow)
+    # The blocking work ran on the loop while the other request waited: it is not in its profile.
+    assert not any("_blocking_work" in stack for stack in waiting)
+    assert any(stack.endswith(f"asyncio.tasks:sleep;{AWAITING}") for stack in waiting)
@@ -0,0 +1,111 @@
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.auth.base import GoogleOAuth2
+from api.auth.oidc import discovery_cache, jwks_cache
+from api.auth.registry import ProviderRegistry
+from api.core.config import settings
+from api.core.http import http_clients
+from api.repositories.user_mail_account import UserMailAccountRepository
+from tests.conftest import TestingSessionLocal
+from tests.mock_provider import MockOAuthProvider
+
+API_KEY_HEADER = {"X-API-Key": "test-internal-api-key"}
+
+
+@pytest.fixture
+def oidc_provider(tmp_path, monkeypatch):
+    discovery_cache.clear()
+    jwks_cache.clear()
+    with MockOAuthProvider(
+        email="tenant@example.com", issue_id_tokens=True, client_id="acme-client"
+    ) as provider:
+        providers_file = tmp_path / "providers.json"
+        providers_file.write_text(
+            json.dumps(
+                [
+                    {
+                        "name": "acme",
+                        "provider_cd": 7,
+                        "issuer": provider.issuer,
+                        "client_id": "acme-client",
+                        "client_secret": "acme-secret",
+                        "redirect_uri": "http://testserver/auth/acme/callback",
+                        "login_params": {"prompt": "select_account"},
+                    }
+                ]
+            )
+        )
+        monkeypatch.setattr(settings, "OIDC_PROVIDERS_FILE", str(providers_file))
+        yield provider
+    discovery_cache.clear()
+    jwks_cache.clear()
+
+
+def test_builtin_clients_are_cached_with_encoded_login_url():
+    registry = ProviderRegistry()
+    google = registry.get("google")
+
+    assert isinstance(google, GoogleOAuth2)
+    assert registry.get("google") is google
+    assert registry.get_by_code(google.provider_cd) is google
+
+    query = parse_qs(urlparse(google.login_url_base).query)
+    assert query["redirect_uri"] == [settings.GOOGLE_REDIRECT_URI]
+    assert "https://www.googleapis.com/auth/gmail.send" in query["scope"][0].split(" ")
+    assert query["access_type"] == ["offline"]
+    assert " " not in google.login_url_base
+
+    with pytest.raises(ValueError):
+        registry.get_by_code(99)
+
+
+@pytest.mark.anyio
+async def test_oidc_providers_resolve_endpoints_from_cached_discovery(oidc_provider):
+    registry = ProviderRegistry()
+    try:
+        assert await registry.load() == ["google", "microsoft", "acme"]
+        acme = registry.get("acme")
+        assert acme.token_url == f"{oidc_provider.base_url}/token"
+        assert acme.jwks_uri == f"{oidc_provider.base_url}/jwks"
+        assert registry.get_by_code(7) is acme
+        assert "prompt=select_account" in acme.login_url_base
+
+        # Reloading reuses the cached discovery document.
+        await registry.load()
+        discovery = [
+            path for _, path in oidc_provider.requests if path.startswith("/.well-known")
+        ]
+        assert len(discovery) == 1
+    finally:
+        await http_clients.aclose()
+
+
+def test_reloaded_oidc_provider_serves_login_and_callback(
+    client: TestClient, providers, oidc_provider
+):
+    response = client.post("/admin/providers/reload", headers=API_KEY_HEADER)
+    assert response.status_code == 200, response.text
+    assert "acme" in response.json()["providers"]
+
+    # The second login updates the account linked by the first.
+    for code in ("abc", "def"):
+        login = client.get("/auth/acme/login", follow_redirects=False)
+        assert login.headers["location"].startswith(f"{oidc_provider.base_url}/authorize?")
+        state = parse_qs(urlparse(login.headers["location"]).query)["state"][0]
+
+        callback = client.get(f"/auth/acme/callback?code={code}&state={state}")
+        assert callback.status_code == 200, callback.text
+        assert callback.json()["user"]["email"] == "tenant@example.com"
+
+    async def stored_provider_cd():
+        async with TestingSessionLocal() as session:
+            account = await UserMailAccountRepository(session).get_by_email(
+                "tenant@example.com"
+            )
+            return account.provider_cd
+
+    assert client.portal.call(stored_provider_cd) == 7
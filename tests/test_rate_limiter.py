@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from api.core.config import Settings, settings
+from api.core.http import http_clients
+from api.core.ratelimit import Priority, TokenBucket, call_context, rate_limiter
+from tests.mock_provider import MockOAuthProvider
+from tests.test_http_pool import _login_and_callback, _mock_google_client
+
+API_KEY_HEADER = {"X-API-Key": "test-internal-api-key"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limiter():
+    rate_limiter.reset()
+    yield
+    rate_limiter.reset()
+
+
+@pytest.mark.anyio
+async def test_queued_callers_are_released_by_priority():
+    bucket = TokenBucket("test", rate=50.0, burst=1.0, min_rate=1.0)
+    assert await bucket.acquire() == 0.0
+
+    released = []
+
+    async def call(name: str, priority: Priority):
+        await bucket.acquire(priority)
+        released.append(name)
+
+    tasks = [asyncio.create_task(call(f"sync-{i}", Priority.BACKGROUND)) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call("login", Priority.INTERACTIVE)))
+    await asyncio.sleep(0)
+    assert bucket.stats()["queue_depth"] == 4
+
+    await asyncio.gather(*tasks)
+    assert released == ["login", "sync-0", "sync-1", "sync-2"]
+    stats = bucket.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["calls"] == 5
+    assert stats["queued"] == 4
+    assert stats["max_wait_seconds"] > 0
+
+
+@pytest.mark.anyio
+async def test_throttled_requests_are_retried_after_retry_after_at_a_lower_rate(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMITS", {"throttled": 40.0})
+    monkeypatch.setattr(settings, "RATE_LIMIT_ACCOUNT_RATE", 5.0)
+    try:
+        with MockOAuthProvider() as provider:
+            provider.throttle_next = 1
+            provider.retry_after = "0.2"
+            client = http_clients.get("throttled")
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with call_context(account="someone@example.com"):
+                response = await client.get(f"{provider.base_url}/userinfo")
+            elapsed = loop.time() - started
+
+            assert response.status_code == 200
+            assert len(provider.requests) == 2
+            assert elapsed >= 0.2
+
+            (stats,) = rate_limiter.stats()
+            assert stats["name"] == "throttled"
+            assert stats["throttled"] == 1
+            assert stats["max_rate"] == 40.0
+            assert stats["rate"] < 40.0
+            account = rate_limiter.account_bucket("throttled", "someone@example.com")
+            assert account.throttled == 1
+
+            # A Retry-After beyond the configured maximum is returned to the caller.
+            provider.throttle_next = 1
+            provider.retry_after = str(settings.RATE_LIMIT_MAX_RETRY_AFTER_SECONDS + 1)
+            rate_limiter.reset()
+            response = await client.get(f"{provider.base_url}/userinfo")
+            assert response.status_code == 429
+    finally:
+        await http_clients.aclose()
+
+
+@pytest.mark.anyio
+async def test_unavailable_answers_are_only_resent_for_idempotent_requests(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMITS", {"unavailable": 40.0})
+    try:
+        with MockOAuthProvider() as provider:
+            client = http_clients.get("unavailable")
+
+            # A 503 to a token request may come after the code or refresh token was redeemed.
+            provider.faults = [("status", 503)]
+            response = await client.post(f"{provider.base_url}/token", data={"code": "c"})
+            assert response.status_code == 503
+            assert len(provider.requests) == 1
+
+            provider.faults = [("status", 503)]
+            response = await client.get(f"{provider.base_url}/userinfo")
+            assert response.status_code == 200
+            assert len(provider.requests) == 3
+    finally:
+        await http_clients.aclose()
+
+
+def test_rates_must_be_positive():
+    with pytest.raises(ValueError):
+        TokenBucket("zero", rate=0.0, burst=1.0, min_rate=1.0)
+    for name in ("RATE_LIMIT_DEFAULT_RATE", "RATE_LIMIT_MIN_RATE", "RATE_LIMIT_ACCOUNT_RATE"):
+        with pytest.raises(ValidationError):
+            Settings(**{name: 0})
+    with pytest.raises(ValidationError):
+        Settings(RATE_LIMITS={"google": 0})
+
+
+def test_throttled_callback_answers_503_and_reports_limits(
+    client: TestClient, providers, monkeypatch
+):
+    monkeypatch.setattr(settings, "RATE_LIMIT_THROTTLE_RETRIES", 0)
+    with MockOAuthProvider(email="throttled@example.com") as provider:
+        providers.register(_mock_google_client(provider))
+        provider.throttle_next = 1
+        provider.retry_after = "7"
+
+        response = _login_and_callback(client, "throttled-code")
+
+    assert response.status_code == 503, response.text
+    assert response.headers["retry-after"] == "7"
+
+    limits = client.get("/admin/rate-limits", headers=API_KEY_HEADER)
+    assert limits.status_code == 200
+    (google,) = [stats for stats in limits.json() if stats["name"] == "google"]
+    assert google["throttled"] == 1
+    assert google["rate"] < google["max_rate"]
@@ -0,0 +1,124 @@
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from api.auth.schemas import TokenData, UserInfo
+from api.core import database
+from api.core.config import settings
+from api.core.replica import read_router
+from api.models.base import Base
+from api.models.enums import Provider
+from api.repositories.oauth_token import OAuthTokenRepository
+from api.repositories.user_mail_account import UserMailAccountRepository
+from tests.conftest import TestingSessionLocal
+
+REPLICA_URL = "sqlite+aiosqlite:///./test-replica.db"
+
+
+async def _upsert(session_factory, email: str, access_token: str) -> None:
+    async with session_factory() as session:
+        await UserMailAccountRepository(session).create_or_update_user_with_token(
+            UserInfo(email=email),
+            TokenData(access_token=access_token, expires_at=3600),
+            Provider.GOOGLE.value,
+        )
+
+
+async def _read_token(email: str, read_replica: bool = True) -> str:
+    async with TestingSessionLocal() as session:
+        repo = UserMailAccountRepository(session, read_replica=read_replica)
+        return (await repo.get_active_token(email)).access_token
+
+
+# Points the replica at `url` with the background health check held off, and restores the
+# unconfigured replica afterwards.
+@pytest.fixture
+def replica(monkeypatch):
+    def configure(url: str) -> None:
+        monkeypatch.setattr(settings, "DATABASE_REPLICA_URL", url)
+        read_router._checked_at = time.monotonic()
+
+    monkeypatch.setattr(settings, "REPLICA_HEALTH_CHECK_SECONDS", 3600)
+    monkeypatch.setattr(database, "_replica_engine", None)
+    read_router.reset()
+    yield configure
+    read_router.reset()
+    database.ReplicaSessionLocal.configure(bind=None)
+
+
+@pytest.mark.anyio
+async def test_reads_use_the_replica_except_right_after_a_write(replica):
+    engine = create_async_engine(REPLICA_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    replica(REPLICA_URL)
+    email = "replica@example.com"
+    try:
+        # The replica lags: it still has the token from before the primary's latest login.
+        await _upsert(async_sessionmaker(engine), email, "old-token")
+        await _upsert(TestingSessionLocal, email, "new-token")
+        read_router.reset()
+        read_router._checked_at = time.monotonic()
+
+        assert await _read_token(email) == "old-token"
+        assert await _read_token(email, read_replica=False) == "new-token"
+
+        await _upsert(TestingSessionLocal, email, "newest-token")
+        assert await _read_token(email) == "newest-token"
+    finally:
+        await engine.dispose()
+        await database.dispose_engine()
+
+
+@pytest.mark.anyio
+async def test_refreshed_tokens_are_read_from_the_primary(replica):
+    engine = create_async_engine(REPLICA_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    replica(REPLICA_URL)
+    email = "replica-refresh@example.com"
+    try:
+        await _upsert(async_sessionmaker(engine), email, "before-refresh")
+        await _upsert(TestingSessionLocal, email, "before-refresh")
+        read_router.reset()
+        read_router._checked_at = time.monotonic()
+        assert await _read_token(email) == "before-refresh"
+
+        # A refresh on the primary that the lagging replica has not replayed yet.
+        async with TestingSessionLocal() as session:
+            token = await UserMailAccountRepository(session).get_active_token(email)
+            await OAuthTokenRepository(session).bulk_update_tokens(
+                [{"oauth_token_id": token.oauth_token_id, "access_token_txt": "refreshed"}]
+            )
+        assert await _read_token(email) == "refreshed"
+    finally:
+        await engine.dispose()
+        await database.dispose_engine()
+
+
+@pytest.mark.anyio
+async def test_failed_replica_falls_back_to_the_primary_until_healthy(replica, monkeypatch):
+    replica("sqlite+aiosqlite:////nonexistent-directory/replica.db")
+    email = "failover@example.com"
+    await _upsert(TestingSessionLocal, email, "primary-token")
+    read_router.reset()
+    read_router._checked_at = time.monotonic()
+    try:
+        assert await _read_token(email) == "primary-token"
+        assert read_router.healthy is False
+        assert read_router.use_replica(email) is False
+
+        async def lag() -> float:
+            return 0.5
+
+        monkeypatch.setattr(read_router, "_lag", lag)
+        monkeypatch.setattr(settings, "REPLICA_MAX_LAG_SECONDS", 0.1)
+        assert await read_router.check() is False
+        monkeypatch.setattr(settings, "REPLICA_MAX_LAG_SECONDS", 1.0)
+        assert await read_router.check() is True
+        assert read_router.use_replica(email) is True
+    finally:
+        await database.dispose_engine()
@@ -0,0 +1,147 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from api.core.config import settings
+from api.core.http import http_clients
+from api.core.resilience import CircuitOpenError, backoff_delays, resilience
+from tests.mock_provider import MockOAuthProvider
+from tests.test_http_pool import _login_and_callback, _mock_google_client
+
+API_KEY_HEADER = {"X-API-Key": "test-internal-api-key"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_resilience(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_RETRY_BASE_DELAY_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "HTTP_RETRY_MAX_DELAY_SECONDS", 0.05)
+    resilience.reset()
+    yield
+    resilience.reset()
+
+
+def _endpoint_stats(provider: str) -> dict:
+    (stats,) = [stats for stats in resilience.stats() if stats["provider"] == provider]
+    return stats
+
+
+def test_backoff_delays_are_jittered_and_capped():
+    delays = backoff_delays(0.1, 1.0)
+    samples = [next(delays) for _ in range(50)]
+    assert all(0.1 <= delay <= 1.0 for delay in samples)
+    assert len(set(samples)) > 1
+
+
+@pytest.mark.anyio
+async def test_idempotent_calls_are_retried_but_token_exchanges_are_not():
+    try:
+        with MockOAuthProvider() as provider:
+            client = http_clients.get("faulty")
+
+            provider.faults = [("status", 502), ("drop",)]
+            response = await client.get(f"{provider.base_url}/userinfo")
+            assert response.status_code == 200
+            assert len(provider.requests) == 3
+            assert _endpoint_stats("faulty")["retries"] == 2
+
+            # The provider may already have redeemed the code: answer as is, or raise.
+            provider.faults = [("status", 502)]
+            response = await client.post(f"{provider.base_url}/token", data={"code": "x"})
+            assert response.status_code == 502
+            provider.faults = [("drop",)]
+            with pytest.raises(httpx.RemoteProtocolError):
+                await client.post(f"{provider.base_url}/token", data={"code": "x"})
+            assert len(provider.requests) == 5
+    finally:
+        await http_clients.aclose()
+
+
+@pytest.mark.anyio
+async def test_slow_idempotent_calls_are_hedged(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "HTTP_RESILIENCE",
+        {"hedged": {"hedge_percentile": 0.9, "hedge_min_delay_seconds": 0.05}},
+    )
+    try:
+        with MockOAuthProvider() as provider:
+            client = http_clients.get("hedged")
+            for _ in range(20):
+                assert (await client.get(f"{provider.base_url}/userinfo")).status_code == 200
+
+            provider.faults = [("delay", 2.0)]
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            response = await client.get(f"{provider.base_url}/userinfo")
+            elapsed = loop.time() - started
+
+            assert response.status_code == 200
+            assert elapsed < 1.0
+            assert len(provider.requests) == 22
+            assert _endpoint_stats("hedged")["hedges"] == 1
+    finally:
+        await http_clients.aclose()
+
+
+@pytest.mark.anyio
+async def test_circuit_opens_after_failures_and_recovers(monkeypatch):
+    monkeypatch.setattr(
+        settings,
+        "HTTP_RESILIENCE",
+        {
+            "breaker": {
+                "retry_max_attempts": 1,
+                "circuit_breaker_failure_threshold": 2,
+                "circuit_breaker_reset_seconds": 0.2,
+            }
+        },
+    )
+    try:
+        with MockOAuthProvider() as provider:
+            client = http_clients.get("breaker")
+            url = f"{provider.base_url}/userinfo"
+
+            provider.faults = [("status", 500), ("status", 500)]
+            assert (await client.get(url)).status_code == 500
+            assert (await client.get(url)).status_code == 500
+            with pytest.raises(CircuitOpenError):
+                await client.get(url)
+            assert len(provider.requests) == 2
+            assert _endpoint_stats("breaker")["state"] == "open"
+
+            # After the reset period a trial call closes the circuit again.
+            await asyncio.sleep(0.25)
+            assert (await client.get(url)).status_code == 200
+            stats = _endpoint_stats("breaker")
+            assert stats["state"] == "closed"
+            assert stats["short_circuited"] == 1
+    finally:
+        await http_clients.aclose()
+
+
+def test_callback_maps_provider_failures_to_gateway_errors(
+    client: TestClient, providers, monkeypatch
+):
+    monkeypatch.setattr(
+        settings,
+        "HTTP_RESILIENCE",
+        {"google": {"circuit_breaker_failure_threshold": 1, "circuit_breaker_reset_seconds": 60}},
+    )
+    with MockOAuthProvider(email="degraded@example.com") as provider:
+        providers.register(_mock_google_client(provider))
+        provider.faults = [("drop",)]
+
+        dropped = _login_and_callback(client, "dropped-code")
+        short_circuited = _login_and_callback(client, "short-circuited-code")
+
+    assert dropped.status_code == 502, dropped.text
+    assert short_circuited.status_code == 503, short_circuited.text
+    assert int(short_circuited.headers["retry-after"]) > 0
+    assert len(provider.requests) == 1
+
+    health = client.get("/admin/circuit-breakers", headers=API_KEY_HEADER)
+    assert health.status_code == 200
+    (token,) = [stats for stats in health.json() if stats["endpoint"].endswith("/token")]
+    assert token["state"] == "open"
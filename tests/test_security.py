@@ -0,0 +1,88 @@
+import datetime
+import json
+
+import pytest
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from api.admin import reencrypt
+from api.core.security import EncryptionHelper
+from api.models.base import Base
+from api.models.schema import OAuthToken, UserMailAccount
+
+
+def test_encryption_helper_decrypts_with_old_keys_and_passes_plaintext_through():
+    old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+    old_ciphertext = EncryptionHelper([old_key]).encrypt("token")
+    helper = EncryptionHelper([new_key, old_key])
+
+    assert helper.decrypt(old_ciphertext) == "token"
+    assert helper.decrypt("ya29.legacy-plaintext") == "ya29.legacy-plaintext"
+    rotated = helper.rotate(old_ciphertext)
+    assert Fernet(new_key).decrypt(rotated.encode()) == b"token"
+    assert helper.rotate(rotated) is None
+
+
+@pytest.mark.anyio
+async def test_batch_crypto_runs_off_loop_for_large_batches(monkeypatch):
+    monkeypatch.setattr("api.core.security.settings.CRYPTO_THREAD_THRESHOLD", 2)
+    helper = EncryptionHelper([Fernet.generate_key()])
+
+    encrypted = await helper.encrypt_many(["a", None, "c"])
+    assert encrypted[1] is None
+    assert await helper.decrypt_many(encrypted) == ["a", None, "c"]
+
+
+@pytest.mark.anyio
+async def test_reencrypt_job_resumes_from_checkpoint_and_moves_rows_to_newest_key(
+    tmp_path, monkeypatch
+):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/reencrypt.db", poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False)
+
+    old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+    old_helper = EncryptionHelper([old_key])
+    async with session_factory() as session:
+        for i in range(5):
+            user = UserMailAccount(email_address_txt=f"re-{i}@example.com", provider_cd=0)
+            session.add(
+                OAuthToken(
+                    # One legacy plaintext row, the rest encrypted with the old key.
+                    access_token_txt=old_helper.encrypt(f"a-{i}") if i else "a-0",
+                    refresh_token_txt=old_helper.encrypt(f"r-{i}") if i % 2 else None,
+                    expires_at_utc=datetime.datetime(2030, 1, 1),
+                    user_mail_account=user,
+                )
+            )
+        await session.commit()
+        token_ids = sorted((await session.scalars(select(OAuthToken.oauth_token_id))).all())
+
+    monkeypatch.setattr(reencrypt, "encryption_helper", EncryptionHelper([new_key, old_key]))
+    checkpoint_path = tmp_path / "checkpoint.json"
+    # Pretend an earlier run already handled the first row.
+    checkpoint_path.write_text(
+        json.dumps({"after": str(token_ids[0]), "scanned": 1, "rewritten": 1})
+    )
+
+    result = await reencrypt.reencrypt_tokens(session_factory, 2, str(checkpoint_path))
+
+    assert result["scanned"] == 5
+    assert not checkpoint_path.exists()
+    async with session_factory() as session:
+        rows = (
+            await session.execute(select(OAuthToken).order_by(OAuthToken.oauth_token_id))
+        ).scalars().all()
+    new_fernet = Fernet(new_key)
+    skipped, *processed = rows
+    assert skipped.oauth_token_id == token_ids[0]
+    with pytest.raises(InvalidToken):
+        new_fernet.decrypt(skipped.access_token_txt.encode())
+    for row in processed:
+        new_fernet.decrypt(row.access_token_txt.encode())
+        if row.refresh_token_txt is not None:
+            new_fernet.decrypt(row.refresh_token_txt.encode())
+    await engine.dispose()
@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+
+import pytest
+
+from api.auth.base import BaseOAuth2
+from api.core.http import http_clients
+from api.core.singleflight import SingleFlight
+from api.repositories.oauth_token import advisory_lock_key
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens.refresh import refresh_flights
+from api.tokens.service import get_valid_access_token, token_cache
+from tests.conftest import TestingSessionLocal, add_account
+from tests.mock_provider import MockOAuthProvider
+
+
+@pytest.mark.anyio
+async def test_single_flight_coalesces_calls_and_shares_errors():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    results = await asyncio.gather(*(flights.do("key", work) for _ in range(500)))
+    assert calls == 1
+    assert set(results) == {1}
+    assert len(flights) == 0
+
+    # The key is free again once the flight lands.
+    assert await flights.do("key", work) == 2
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    outcomes = await asyncio.gather(
+        *(flights.do("key", fail) for _ in range(10)), return_exceptions=True
+    )
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+
+@pytest.mark.anyio
+async def test_concurrent_token_requests_trigger_exactly_one_refresh():
+    email = "single-flight@example.com"
+    await add_account(
+        email,
+        access_token="expiring-access-token",
+        refresh_token="single-flight-rt",
+        expires_in=5,
+    )
+    token_cache.pop(email)
+
+    with MockOAuthProvider() as provider:
+        provider.response_delay = 0.2
+        oauth_client = BaseOAuth2(
+            client_id="id",
+            client_secret="secret",
+            redirect_uri="http://testserver/cb",
+            authorization_url=f"{provider.base_url}/authorize",
+            token_url=f"{provider.base_url}/token",
+            userinfo_url=f"{provider.base_url}/userinfo",
+            scopes=["openid"],
+            provider="single-flight-test",
+        )
+        try:
+            results = await asyncio.gather(
+                *(
+                    get_valid_access_token(
+                        TestingSessionLocal, email, client_for_provider=lambda _: oauth_client
+                    )
+                    for _ in range(200)
+                )
+            )
+        finally:
+            await http_clients.aclose()
+
+    assert [path for _, path in provider.requests] == ["/token"]
+    assert {result.access_token for result in results} == {"refreshed-single-flight-rt"}
+    assert len(refresh_flights) == 0
+
+    async with TestingSessionLocal() as session:
+        stored = await UserMailAccountRepository(session).get_active_token(email)
+    assert stored.access_token == "refreshed-single-flight-rt"
+
+
+def test_advisory_lock_key_fits_signed_bigint():
+    for _ in range(100):
+        key = advisory_lock_key(uuid.uuid4())
+        assert -(2**63) <= key < 2**63
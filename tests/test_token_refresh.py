@@ -0,0 +1,203 @@
+import datetime
+
+import pytest
+from sqlalchemy import select, update
+
+from api.auth.base import BaseOAuth2
+from api.auth.schemas import TokenData, UserInfo
+from api.core.http import http_clients
+from api.models.schema import OAuthToken, UserMailAccount
+from api.repositories.oauth_token import OAuthTokenRepository
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens.refresh import TokenRefreshEngine
+from api.tokens.service import TokenUnavailableError, get_valid_access_token
+from tests.conftest import TestingSessionLocal, add_account
+from tests.mock_provider import MockOAuthProvider
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+async def _access_token(email: str) -> str:
+    async with TestingSessionLocal() as session:
+        token = await UserMailAccountRepository(session).get_active_token(email)
+        return token.access_token
+
+
+@pytest.mark.anyio
+async def test_refresh_engine_refreshes_only_tokens_within_horizon():
+    await add_account("expiring-1@example.com", refresh_token="rt-1", expires_in=60)
+    await add_account("expiring-2@example.com", refresh_token="rt-2", expires_in=120)
+    await add_account("no-refresh@example.com", expires_in=60)
+    await add_account("fresh@example.com", refresh_token="rt-fresh", expires_in=7200)
+
+    with MockOAuthProvider() as provider:
+        client = BaseOAuth2(
+            client_id="id",
+            client_secret="secret",
+            redirect_uri="http://testserver/cb",
+            authorization_url=f"{provider.base_url}/authorize",
+            token_url=f"{provider.base_url}/token",
+            userinfo_url=f"{provider.base_url}/userinfo",
+            scopes=["openid"],
+            provider="refresh-test",
+        )
+        engine = TokenRefreshEngine(
+            session_factory=TestingSessionLocal,
+            client_for_provider=lambda provider_cd: client,
+            horizon_seconds=600,
+            concurrency=2,
+            batch_size=1,
+        )
+        try:
+            refreshed = await engine.run_once()
+        finally:
+            # The pooled client belongs to this test's event loop; don't leak it to later tests.
+            await http_clients.aclose()
+
+    assert refreshed == 2
+    assert await _access_token("expiring-1@example.com") == "refreshed-rt-1"
+    assert await _access_token("expiring-2@example.com") == "refreshed-rt-2"
+    assert await _access_token("no-refresh@example.com") == "stale"
+    assert await _access_token("fresh@example.com") == "stale"
+
+
+@pytest.mark.anyio
+async def test_locked_sweep_rereads_each_token_under_its_account_lock(monkeypatch):
+    await add_account("locked-1@example.com", refresh_token="rt-locked-1", expires_in=60)
+    await add_account("locked-2@example.com", refresh_token="rt-locked-2", expires_in=60)
+    locked = []
+
+    # Stands in for the advisory lock; another process refreshes locked-2 while we wait on it.
+    async def lock_account(self, user_mail_account_id):
+        locked.append(user_mail_account_id)
+        async with TestingSessionLocal() as session:
+            token = await session.scalar(
+                select(OAuthToken)
+                .join(OAuthToken.user_mail_account)
+                .where(UserMailAccount.email_address_txt == "locked-2@example.com")
+            )
+            if token.user_mail_account_id == user_mail_account_id:
+                await OAuthTokenRepository(session).bulk_update_tokens(
+                    [
+                        {
+                            "oauth_token_id": token.oauth_token_id,
+                            "access_token_txt": "refreshed-elsewhere",
+                            "expires_at_utc": _utcnow() + datetime.timedelta(hours=1),
+                        }
+                    ]
+                )
+
+    monkeypatch.setattr("api.tokens.refresh._locks_accounts", lambda session: True)
+    monkeypatch.setattr(OAuthTokenRepository, "lock_account", lock_account)
+
+    with MockOAuthProvider() as provider:
+        client = BaseOAuth2(
+            client_id="id",
+            client_secret="secret",
+            redirect_uri="http://testserver/cb",
+            authorization_url=f"{provider.base_url}/authorize",
+            token_url=f"{provider.base_url}/token",
+            userinfo_url=f"{provider.base_url}/userinfo",
+            scopes=["openid"],
+            provider="locked-refresh-test",
+        )
+        engine = TokenRefreshEngine(
+            session_factory=TestingSessionLocal,
+            client_for_provider=lambda provider_cd: client,
+            horizon_seconds=600,
+            concurrency=1,
+        )
+        try:
+            await engine.run_once()
+        finally:
+            await http_clients.aclose()
+
+    assert len(locked) >= 2
+    assert [path for _, path in provider.requests].count("/token") == len(locked) - 1
+    assert await _access_token("locked-1@example.com") == "refreshed-rt-locked-1"
+    assert await _access_token("locked-2@example.com") == "refreshed-elsewhere"
+
+
+async def _token(email: str) -> OAuthToken:
+    async with TestingSessionLocal() as session:
+        return await session.scalar(
+            select(OAuthToken)
+            .join(OAuthToken.user_mail_account)
+            .where(UserMailAccount.email_address_txt == email)
+        )
+
+
+@pytest.mark.anyio
+async def test_failed_refreshes_back_off_and_revoked_tokens_wait_for_a_login():
+    await add_account("flaky@example.com", refresh_token="rt-flaky", expires_in=30)
+    await add_account("revoked@example.com", refresh_token="rt-revoked", expires_in=60)
+
+    with MockOAuthProvider() as provider:
+        provider.revoked_refresh_tokens = {"rt-revoked"}
+        client = BaseOAuth2(
+            client_id="id",
+            client_secret="secret",
+            redirect_uri="http://testserver/cb",
+            authorization_url=f"{provider.base_url}/authorize",
+            token_url=f"{provider.base_url}/token",
+            userinfo_url=f"{provider.base_url}/userinfo",
+            scopes=["openid"],
+            provider="failing-refresh-test",
+        )
+        engine = TokenRefreshEngine(
+            session_factory=TestingSessionLocal,
+            client_for_provider=lambda provider_cd: client,
+            horizon_seconds=600,
+            concurrency=1,
+        )
+
+        def token_calls() -> int:
+            return [path for _, path in provider.requests].count("/token")
+
+        try:
+            # Tokens are refreshed soonest expiry first: the flaky account gets the outage.
+            provider.faults = [("status", 503)]
+            assert await engine.run_once() == 0
+            assert token_calls() == 2
+
+            flaky, revoked = await _token("flaky@example.com"), await _token("revoked@example.com")
+            assert (flaky.refresh_failure_cnt, flaky.refresh_revoked_flg) == (1, False)
+            assert flaky.next_refresh_at_utc > _utcnow() + datetime.timedelta(seconds=30)
+            assert (revoked.refresh_failure_cnt, revoked.refresh_revoked_flg) == (1, True)
+
+            # Neither is tried again while backing off or revoked, on demand neither for the
+            # revoked one.
+            assert await engine.run_once() == 0
+            with pytest.raises(TokenUnavailableError, match="log in again"):
+                await get_valid_access_token(
+                    TestingSessionLocal, "revoked@example.com", lambda provider_cd: client
+                )
+            assert token_calls() == 2
+
+            async with TestingSessionLocal() as session:
+                await session.execute(
+                    update(OAuthToken)
+                    .where(OAuthToken.oauth_token_id == flaky.oauth_token_id)
+                    .values(next_refresh_at_utc=_utcnow())
+                )
+                await session.commit()
+            assert await engine.run_once() == 1
+            assert token_calls() == 3
+        finally:
+            await http_clients.aclose()
+
+    flaky = await _token("flaky@example.com")
+    assert (flaky.refresh_failure_cnt, flaky.next_refresh_at_utc) == (0, None)
+    assert await _access_token("flaky@example.com") == "refreshed-rt-flaky"
+
+    # A login with a new refresh token makes the revoked account refreshable again.
+    async with TestingSessionLocal() as session:
+        await UserMailAccountRepository(session).create_or_update_user_with_token(
+            UserInfo(email="revoked@example.com"),
+            TokenData(access_token="login", refresh_token="rt-new", expires_at=60),
+            0,
+        )
+    revoked = await _token("revoked@example.com")
+    assert (revoked.refresh_failure_cnt, revoked.refresh_revoked_flg) == (0, False)
@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql
+
+from api.auth.schemas import TokenData, UserInfo
+from api.models.enums import Provider
+from api.models.schema import OAuthToken, UserMailAccount
+from api.repositories.oauth_token import OAuthTokenRepository
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens.refresh import refresh_token_values
+from api.tokens.write_behind import TokenWriteBehind
+from tests.conftest import TestingSessionLocal, add_account
+from tests.test_token_refresh import _access_token, _utcnow
+
+
+async def _token_id(email: str) -> uuid.UUID:
+    async with TestingSessionLocal() as session:
+        return await session.scalar(
+            select(OAuthToken.oauth_token_id)
+            .join(OAuthToken.user_mail_account)
+            .where(UserMailAccount.email_address_txt == email)
+        )
+
+
+def _update(token_id: uuid.UUID, access_token: str, **values) -> dict:
+    expires_at = _utcnow() + datetime.timedelta(hours=1)
+    return {
+        "oauth_token_id": token_id,
+        "access_token_txt": access_token,
+        "expires_at_utc": expires_at,
+        **values,
+    }
+
+
+@pytest.mark.anyio
+async def test_updates_are_coalesced_and_written_after_the_window():
+    await add_account("wb-a@example.com", refresh_token="rt-a", expires_in=30)
+    await add_account("wb-b@example.com", refresh_token="rt-b", expires_in=30)
+    a, b = await _token_id("wb-a@example.com"), await _token_id("wb-b@example.com")
+    buffer = TokenWriteBehind(TestingSessionLocal, window_seconds=0.05, max_rows=100)
+
+    await buffer.submit(_update(a, "a-1"))
+    await buffer.submit(_update(b, "b-1"))
+    await buffer.submit(_update(a, "a-2"))
+    assert await _access_token("wb-a@example.com") == "stale"
+
+    await asyncio.sleep(0.2)
+    assert await _access_token("wb-a@example.com") == "a-2"
+    assert await _access_token("wb-b@example.com") == "b-1"
+    assert (buffer.submitted, buffer.coalesced, buffer.flushes) == (3, 1, 1)
+    await buffer.aclose()
+
+
+@pytest.mark.anyio
+async def test_full_buffer_flushes_early_and_rotated_refresh_tokens_are_written_at_once():
+    await add_account("wb-c@example.com", refresh_token="rt-c", expires_in=30)
+    await add_account("wb-d@example.com", refresh_token="rt-d", expires_in=30)
+    c, d = await _token_id("wb-c@example.com"), await _token_id("wb-d@example.com")
+    buffer = TokenWriteBehind(TestingSessionLocal, window_seconds=60, max_rows=2)
+
+    await buffer.submit(_update(c, "c-1", refresh_token_txt="rt-c-2"))
+    assert await _access_token("wb-c@example.com") == "c-1"
+
+    await buffer.submit(_update(c, "c-2"))
+    await buffer.submit(_update(d, "d-1"))
+    await asyncio.sleep(0.05)
+    assert await _access_token("wb-c@example.com") == "c-2"
+    assert await _access_token("wb-d@example.com") == "d-1"
+    await buffer.aclose()
+
+
+@pytest.mark.anyio
+async def test_close_writes_pending_updates():
+    await add_account("wb-e@example.com", refresh_token="rt-e", expires_in=30)
+    e = await _token_id("wb-e@example.com")
+    buffer = TokenWriteBehind(TestingSessionLocal, window_seconds=60, max_rows=100)
+
+    await buffer.submit(_update(e, "e-1"))
+    await buffer.aclose()
+    assert await _access_token("wb-e@example.com") == "e-1"
+
+
+@pytest.mark.anyio
+async def test_rotated_refresh_tokens_submitted_together_share_one_write():
+    emails = [f"wb-rot-{n}@example.com" for n in range(3)]
+    for email in emails:
+        await add_account(email, refresh_token=f"rt-{email}", expires_in=30)
+    ids = [await _token_id(email) for email in emails]
+    buffer = TokenWriteBehind(TestingSessionLocal, window_seconds=60, max_rows=100)
+
+    # A sweep page, and then concurrent on-demand refreshes.
+    await buffer.submit(*(_update(i, "page", refresh_token_txt="rt-new") for i in ids))
+    await asyncio.gather(
+        *(buffer.submit(_update(i, "concurrent", refresh_token_txt="rt-newer")) for i in ids)
+    )
+    assert buffer.flushes == 2
+    assert [await _access_token(email) for email in emails] == ["concurrent"] * 3
+    await buffer.aclose()
+
+
+# Stands in for a provider client whose refreshes rotate the refresh token.
+class _RotatingClient:
+    async def refresh_access_token(self, refresh_token: str) -> dict:
+        return {"access_token": "refreshed", "expires_in": 3600, "refresh_token": "rt-rotated"}
+
+
+async def _refresh_token(email: str) -> str:
+    async with TestingSessionLocal() as session:
+        token = await UserMailAccountRepository(session).get_active_token(email)
+        return token.refresh_token
+
+
+@pytest.mark.anyio
+async def test_refresh_result_does_not_overwrite_a_login_after_the_read():
+    email = "wb-login@example.com"
+    await add_account(email, refresh_token="rt-login", expires_in=30)
+    token_id = await _token_id(email)
+    buffer = TokenWriteBehind(TestingSessionLocal, window_seconds=60, max_rows=100)
+    async with TestingSessionLocal() as session:
+        await session.execute(
+            update(OAuthToken)
+            .where(OAuthToken.oauth_token_id == token_id)
+            .values(modified_at_utc=_utcnow() - datetime.timedelta(hours=1))
+        )
+        await session.commit()
+
+    async def read():
+        async with TestingSessionLocal() as session:
+            return await OAuthTokenRepository(session).get_stored(token_id)
+
+    token = await read()
+    # A login rewrites the token while the provider is refreshing the one that was read.
+    async with TestingSessionLocal() as session:
+        await UserMailAccountRepository(session).create_or_update_user_with_token(
+            UserInfo(email=email),
+            TokenData(access_token="new-login", refresh_token="rt-new-login", expires_at=3600),
+            Provider.GOOGLE.value,
+        )
+    await buffer.submit(await refresh_token_values(_RotatingClient(), token))
+    assert (await _access_token(email), await _refresh_token(email)) == (
+        "new-login",
+        "rt-new-login",
+    )
+
+    # A refresh of the token as the login left it is written.
+    await buffer.submit(await refresh_token_values(_RotatingClient(), await read()))
+    assert (await _access_token(email), await _refresh_token(email)) == (
+        "refreshed",
+        "rt-rotated",
+    )
+    await buffer.aclose()
+
+
+def test_postgresql_bulk_update_is_one_statement_keeping_unsent_refresh_tokens():
+    stmt = OAuthTokenRepository._build_bulk_update_statement(
+        [_update(uuid.uuid4(), "x"), _update(uuid.uuid4(), "y", refresh_token_txt="rt")]
+    )
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE oauth_tokens SET")
+    assert "FROM (VALUES" in sql
+    assert "coalesce(updates.refresh_token_txt, oauth_tokens.refresh_token_txt)" in sql
+
+    guarded = OAuthTokenRepository._build_bulk_update_statement(
+        [{**_update(uuid.uuid4(), "x"), "if_unmodified_since": _utcnow()}]
+    )
+    sql = str(guarded.compile(dialect=postgresql.dialect()))
+    assert "oauth_tokens.modified_at_utc <= updates.if_unmodified_since" in sql
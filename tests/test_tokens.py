@@ -0,0 +1,136 @@
+import asyncio
+import datetime
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.auth.base import BaseOAuth2
+from api.core.cache import TTLCache
+from api.repositories.oauth_token import StoredToken
+from api.repositories.user_mail_account import UserMailAccountRepository
+from api.tokens import service as token_service
+from tests.conftest import TestingSessionLocal, add_account
+from tests.mock_provider import MockOAuthProvider
+
+API_KEY_HEADERS = {"X-API-Key": "test-internal-api-key"}
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired_entries():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1, ttl_seconds=60)
+    cache.set("b", 2, ttl_seconds=60)
+    assert cache.get("a") == 1
+    cache.set("c", 3, ttl_seconds=60)  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    cache.set("a", 1, ttl_seconds=0)  # non-positive TTL drops the entry
+    assert cache.get("a") is None
+    assert cache.stats() == {
+        "size": 1,
+        "max_size": 2,
+        "hits": 2,
+        "misses": 2,
+        "evictions": 1,
+        "expirations": 0,
+    }
+
+
+def test_token_endpoint_requires_api_key(client: TestClient):
+    assert client.get("/tokens/anyone@example.com").status_code == 401
+
+
+def test_token_endpoint_serves_repeat_requests_from_cache(client: TestClient):
+    asyncio.run(
+        add_account(
+            "vend-cached@example.com",
+            access_token="cached-access-token",
+            refresh_token="vending-rt",
+        )
+    )
+    before = client.get("/tokens/cache/stats", headers=API_KEY_HEADERS).json()
+
+    first = client.get("/tokens/vend-cached@example.com", headers=API_KEY_HEADERS)
+    second = client.get("/tokens/vend-cached@example.com", headers=API_KEY_HEADERS)
+
+    after = client.get("/tokens/cache/stats", headers=API_KEY_HEADERS).json()
+    assert first.status_code == 200
+    assert first.json()["access_token"] == "cached-access-token"
+    assert second.json() == first.json()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_token_endpoint_refreshes_near_expiry_tokens(client: TestClient, monkeypatch):
+    asyncio.run(
+        add_account(
+            "vend-expiring@example.com",
+            access_token="old-access-token",
+            refresh_token="vending-rt",
+            expires_in=10,
+        )
+    )
+
+    with MockOAuthProvider() as provider:
+        oauth_client = BaseOAuth2(
+            client_id="id",
+            client_secret="secret",
+            redirect_uri="http://testserver/cb",
+            authorization_url=f"{provider.base_url}/authorize",
+            token_url=f"{provider.base_url}/token",
+            userinfo_url=f"{provider.base_url}/userinfo",
+            scopes=["openid"],
+            provider="vending-test",
+        )
+        monkeypatch.setattr(
+            token_service, "get_oauth_client_for_provider", lambda provider_cd: oauth_client
+        )
+        response = client.get("/tokens/vend-expiring@example.com", headers=API_KEY_HEADERS)
+
+    assert response.status_code == 200
+    assert response.json()["access_token"] == "refreshed-vending-rt"
+
+
+def test_token_endpoint_returns_404_for_unknown_account(client: TestClient):
+    response = client.get("/tokens/missing@example.com", headers=API_KEY_HEADERS)
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_timezone_aware_expiry_times_are_served_and_cached(monkeypatch):
+    # PostgreSQL returns `expires_at_utc` timezone-aware.
+    now = datetime.datetime.now(datetime.timezone.utc)
+    stored = {
+        "aware-valid@example.com": now + datetime.timedelta(hours=1),
+        "aware-expiring@example.com": now + datetime.timedelta(seconds=10),
+    }
+
+    async def get_active_token(self, email):
+        return StoredToken(
+            oauth_token_id=uuid.uuid4(),
+            user_mail_account_id=uuid.uuid4(),
+            provider_cd=0,
+            access_token="stored",
+            refresh_token="rt",
+            expires_at_utc=stored[email],
+        )
+
+    async def refresh_stored_token(session_factory, oauth_client, token):
+        return {
+            "access_token_txt": "refreshed",
+            "expires_at_utc": now + datetime.timedelta(hours=1),
+        }
+
+    monkeypatch.setattr(UserMailAccountRepository, "get_active_token", get_active_token)
+    monkeypatch.setattr(token_service, "refresh_stored_token", refresh_stored_token)
+    monkeypatch.setattr(token_service, "get_oauth_client_for_provider", lambda provider_cd: None)
+
+    for email, access_token in (
+        ("aware-valid@example.com", "stored"),
+        ("aware-expiring@example.com", "refreshed"),
+    ):
+        token = await token_service.get_valid_access_token(TestingSessionLocal, email)
+        assert token.access_token == access_token
+        assert token.expires_at == (now + datetime.timedelta(hours=1)).replace(tzinfo=None)
+        assert token_service.token_cache.get(email) == token
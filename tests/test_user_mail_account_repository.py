@@ -0,0 +1,88 @@
+import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from api.auth.schemas import TokenData, UserInfo
+from api.core.security import FERNET_PREFIX
+from api.models.enums import Provider
+from api.repositories.user_mail_account import UserMailAccountRepository
+from tests.conftest import TestingSessionLocal
+
+
+async def _upsert(email: str, provider: Provider, access_token: str, refresh_token=None):
+    async with TestingSessionLocal() as session:
+        await UserMailAccountRepository(session).create_or_update_user_with_token(
+            UserInfo(email=email),
+            TokenData(access_token=access_token, refresh_token=refresh_token, expires_at=3600),
+            provider.value,
+        )
+
+
+async def _get(email: str):
+    async with TestingSessionLocal() as session:
+        return await UserMailAccountRepository(session).get_by_email(email)
+
+
+async def _get_token(email: str):
+    async with TestingSessionLocal() as session:
+        return await UserMailAccountRepository(session).get_active_token(email)
+
+
+@pytest.mark.anyio
+async def test_upsert_creates_then_updates_token_keeping_refresh_token():
+    await _upsert("upsert@example.com", Provider.GOOGLE, "first", refresh_token="rt")
+    await _upsert("upsert@example.com", Provider.GOOGLE, "second")
+
+    user = await _get("upsert@example.com")
+    assert user.provider_cd == Provider.GOOGLE.value
+    # Stored encrypted, returned decrypted.
+    assert user.oauth_token.access_token_txt.startswith(FERNET_PREFIX)
+    token = await _get_token("upsert@example.com")
+    assert token.access_token == "second"
+    assert token.refresh_token == "rt"
+
+
+@pytest.mark.anyio
+async def test_upsert_rejects_provider_mismatch():
+    await _upsert("mismatch@example.com", Provider.GOOGLE, "google-token")
+
+    with pytest.raises(ValueError, match="already registered with provider 'GOOGLE'"):
+        await _upsert("mismatch@example.com", Provider.MICROSOFT, "microsoft-token")
+
+    token = await _get_token("mismatch@example.com")
+    assert token.access_token == "google-token"
+
+
+def test_postgresql_upsert_is_a_single_guarded_statement():
+    repo = UserMailAccountRepository(session=None)
+    stmt = repo._build_upsert_statement(
+        UserInfo(email="pg@example.com"),
+        TokenData(access_token="token", expires_at=3600),
+        Provider.GOOGLE.value,
+        datetime.datetime(2030, 1, 1),
+    )
+    sql = str(stmt.compile(dialect=postgresql.asyncpg.dialect()))
+
+    assert sql.count("ON CONFLICT") == 2
+    assert "WHERE user_mail_accounts.provider_cd = excluded.provider_cd" in sql
+    assert "coalesce(excluded.refresh_token_txt, oauth_tokens.refresh_token_txt)" in sql
+
+
+@pytest.mark.anyio
+async def test_iter_active_by_provider_pages_through_every_active_account():
+    emails = {f"keyset-{i}@example.com" for i in range(5)}
+    for email in emails:
+        await _upsert(email, Provider.MICROSOFT, "token")
+
+    async with TestingSessionLocal() as session:
+        repo = UserMailAccountRepository(session)
+        pages = [
+            page
+            async for page in repo.iter_active_by_provider(Provider.MICROSOFT.value, page_size=2)
+        ]
+
+    seen = [user.email_address_txt for page in pages for user in page]
+    assert emails <= set(seen)
+    assert len(seen) == len(set(seen))
+    assert all(len(page) <= 2 for page in pages)